@@ -0,0 +1,99 @@
+"""
+Benchmark of the LCOV and JaCoCo coverage parsers (`get_coverage_stats`) on large synthetic files.
+
+Both parsers read their input in a single streaming pass: time depends on the file size, but peak memory should not.
+Use `--details` to also compute the per-package and per-file stats.
+
+    python benchmarks/bench_coverage_formats.py [--size-mb 200] [--details]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from genbadge.utils_coverage import get_coverage_stats
+
+
+LCOV_RECORD = ("TN:\nSF:src/pkg%(p)s/mod%(i)s.js\nFN:1,f%(i)s\nFNF:1\nFNH:1\nFNDA:1,f%(i)s\n%(lines)sLF:100\nLH:50\n"
+               "BRDA:2,0,0,1\nBRDA:2,0,1,0\nBRF:2\nBRH:1\nend_of_record\n")
+LCOV_LINE = "DA:%s,%s\n"
+
+JACOCO_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?><!DOCTYPE report PUBLIC '
+               '"-//JACOCO//DTD Report 1.1//EN" "report.dtd"><report name="bench">'
+               '<sessioninfo id="bench" start="0" dump="1"/>')
+JACOCO_COUNTERS = ('<counter type="INSTRUCTION" missed="%(lm)s" covered="%(lc)s"/>'
+                   '<counter type="BRANCH" missed="%(bm)s" covered="%(bc)s"/>'
+                   '<counter type="LINE" missed="%(lm)s" covered="%(lc)s"/>'
+                   '<counter type="COMPLEXITY" missed="%(bm)s" covered="%(bc)s"/>')
+JACOCO_SOURCEFILE = '<sourcefile name="Mod%(i)s.java">%(lines)s%(counters)s</sourcefile>'
+JACOCO_LINE = '<line nr="%s" mi="%s" ci="%s" mb="0" cb="0"/>'
+
+
+def write_synthetic_lcov(path, size_mb, nb_packages=300):
+    """Writes a synthetic lcov.info file of approximately `size_mb` megabytes. Returns the number of source files"""
+    lines = "".join(LCOV_LINE % (i, i % 2) for i in range(100))
+    nb_files = size_mb * 1024 * 1024 // len(LCOV_RECORD % dict(p=0, i=0, lines=lines))
+    with open(path, "wt") as f:
+        for i in range(nb_files):
+            f.write(LCOV_RECORD % dict(p=i % nb_packages, i=i, lines=lines))
+    return nb_files
+
+
+def write_synthetic_jacoco(path, size_mb, nb_packages=300):
+    """Writes a synthetic jacoco.xml file of approximately `size_mb` megabytes. Returns the number of source files"""
+    lines = "".join(JACOCO_LINE % (i, i % 2, 1 - i % 2) for i in range(100))
+    file_counters = JACOCO_COUNTERS % dict(lm=50, lc=50, bm=1, bc=1)
+    sourcefile_size = len(JACOCO_SOURCEFILE % dict(i=0, lines=lines, counters=file_counters))
+    nb_files = size_mb * 1024 * 1024 // sourcefile_size
+    files_per_package = nb_files // nb_packages + 1
+    with open(path, "wt") as f:
+        f.write(JACOCO_HEAD)
+        for i in range(nb_files):
+            if i % files_per_package == 0:
+                f.write('<package name="org/pkg%s">' % i)
+            f.write(JACOCO_SOURCEFILE % dict(i=i, lines=lines, counters=file_counters))
+            if (i + 1) % files_per_package == 0 or i + 1 == nb_files:
+                nb = min(files_per_package, i % files_per_package + 1)
+                f.write(JACOCO_COUNTERS % dict(lm=50 * nb, lc=50 * nb, bm=nb, bc=nb) + '</package>')
+        f.write(JACOCO_COUNTERS % dict(lm=50 * nb_files, lc=50 * nb_files, bm=nb_files, bc=nb_files) + '</report>')
+    return nb_files
+
+
+def measure(fun, *args, **kwargs):
+    """Returns the result, duration and peak memory. The duration is measured without `tracemalloc`, that is slow"""
+    start = time.perf_counter()
+    res = fun(*args, **kwargs)
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    fun(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return res, duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200, help="Size of the synthetic coverage files, in MB")
+    parser.add_argument("--details", action="store_true", help="Also compute the per-package and per-file stats")
+    args = parser.parse_args()
+
+    for input_format, write_synthetic in (("lcov", write_synthetic_lcov), ("jacoco", write_synthetic_jacoco)):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            nb_files = write_synthetic(path, args.size_mb)
+            print("Synthetic %s file: %.0f MB, %s source files"
+                  % (input_format, os.path.getsize(path) / 1024 / 1024, nb_files))
+
+            res, duration, peak = measure(get_coverage_stats, path, details=args.details)
+            print(" - %s parse: %.2f s (%.0f MB/s), peak memory %.1f kB (lines: %s/%s, branches: %s/%s)"
+                  % (input_format, duration, os.path.getsize(path) / 1024 / 1024 / duration, peak / 1024,
+                     res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid))
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark of the coverage.xml parsing (`get_coverage_stats`) on a large synthetic Cobertura file.
+
+Since all the needed information is in the attributes of the root <coverage> element, the parser stops right after its
+start tag: time and peak memory should not depend on the file size. Use `--legacy` to compare with a full parse of the
+document, as done in previous versions (warning: this requires several times the file size in memory).
+
+Use `--details` to also measure the single streaming pass computing the per-package and per-file stats: its time
+depends on the file size, but its peak memory should not.
+
+    python benchmarks/bench_coverage_root.py [--size-mb 500] [--legacy] [--details]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import defusedxml.ElementTree as defused_etree
+
+from genbadge.utils_coverage import get_coverage_stats, CovParser
+
+
+ROOT = ('<?xml version="1.0" ?>\n<coverage branch-rate="0" branches-covered="%(bc)s" branches-valid="%(bv)s" '
+        'complexity="0" line-rate="0.5" lines-covered="%(lc)s" lines-valid="%(lv)s" timestamp="1618319767206" '
+        'version="5.5">\n\t<sources><source>/src</source></sources>\n\t<packages>\n')
+CLASS = ('\t\t\t\t<class branch-rate="0" complexity="0" filename="pkg%(i)s/mod.py" line-rate="0.5" name="mod.py">'
+         '<methods/><lines>%(lines)s</lines></class>\n')
+LINE = '<line hits="%s" number="%s"/>'
+
+
+PACKAGE = '\t\t<package branch-rate="0" complexity="0" line-rate="0.5" name="pkg%s"><classes>\n'
+
+
+def write_synthetic_coverage(path, size_mb, nb_packages=300):
+    """
+    Writes a synthetic coverage.xml file of approximately `size_mb` megabytes, with its classes spread over
+    `nb_packages` packages. Returns the number of classes
+    """
+    lines = "".join(LINE % (i % 2, i) for i in range(100))
+    nb_classes = size_mb * 1024 * 1024 // len(CLASS % dict(i=0, lines=lines))
+    with open(path, "wt") as f:
+        f.write(ROOT % dict(bc=0, bv=0, lc=nb_classes * 50, lv=nb_classes * 100))
+        for i in range(nb_classes):
+            if i % (nb_classes // nb_packages + 1) == 0:
+                if i > 0:
+                    f.write('\t\t</classes></package>\n')
+                f.write(PACKAGE % i)
+            f.write(CLASS % dict(i=i, lines=lines))
+        f.write('\t\t</classes></package>\n\t</packages>\n</coverage>\n')
+    return nb_classes
+
+
+def legacy_parse(path):
+    """The legacy implementation: full parse of the document"""
+    with open(path, "rb") as f:
+        root = defused_etree.parse(f).getroot()
+    return CovParser().parse_root(root)
+
+
+def measure(fun, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = fun(*args)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return res, duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=500, help="Size of the synthetic coverage.xml file, in MB")
+    parser.add_argument("--legacy", action="store_true", help="Also measure the legacy full parse")
+    parser.add_argument("--details", action="store_true", help="Also measure the per-package and per-file parse")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".xml")
+    os.close(fd)
+    try:
+        nb_classes = write_synthetic_coverage(path, args.size_mb)
+        print("Synthetic coverage.xml: %.0f MB, %s classes" % (os.path.getsize(path) / 1024 / 1024, nb_classes))
+
+        res, duration, peak = measure(get_coverage_stats, path)
+        print(" - root-only parse: %.4f s, peak memory %.1f kB (lines: %s/%s)"
+              % (duration, peak / 1024, res.lines_covered, res.lines_valid))
+
+        if args.details:
+            res, duration, peak = measure(get_coverage_stats, path, True)
+            print(" - per-package parse: %.4f s, peak memory %.1f kB (%s packages, %s files)"
+                  % (duration, peak / 1024, len(res.packages), len(res.files)))
+
+        if args.legacy:
+            res, duration, peak = measure(legacy_parse, path)
+            print(" - legacy full parse: %.4f s, peak memory %.1f kB" % (duration, peak / 1024))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
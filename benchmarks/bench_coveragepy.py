@@ -0,0 +1,115 @@
+"""
+Benchmark of `get_coveragepy_stats`, reading the coverage.py data files directly, against the usual
+`coverage combine` + `coverage xml` + `get_coverage_stats` on the generated coverage.xml.
+
+Synthetic source files are generated, together with several parallel data files (e.g. from test shards) written with
+the coverage.py data API. Both approaches are run in-process, with the same configuration.
+
+    python benchmarks/bench_coveragepy.py [--nb-files 300] [--nb-shards 8] [--branch]
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+import coverage
+
+from genbadge.utils_coverage import get_coverage_stats
+from genbadge.utils_coveragepy import get_coveragepy_stats
+
+
+FUNCTION = '''
+def func_%(i)s(x):
+    if x > %(i)s:
+        y = x - 1
+    else:
+        y = x + 1
+    for _ in range(3):
+        y += 1
+    return y
+'''
+NB_FUNCTIONS = 20
+FUNCTION_LINES = (2, 3, 4, 6, 7, 8, 9)  # the statements of FUNCTION, relative to its first line
+
+
+def write_sources_and_data(folder, nb_files, nb_shards, branch):
+    """Writes `nb_files` source files and `nb_shards` data files, each shard covering a part of the functions"""
+    src_dir = os.path.join(folder, "src")
+    os.makedirs(src_dir)
+    func_len = FUNCTION.count("\n")
+    paths = []
+    for i in range(nb_files):
+        path = os.path.join(src_dir, "mod%s.py" % i)
+        with open(path, "wt") as f:
+            f.write("".join(FUNCTION % dict(i=j) for j in range(NB_FUNCTIONS)))
+        paths.append(path)
+
+    for shard in range(nb_shards):
+        data = coverage.CoverageData(basename=os.path.join(folder, ".coverage"), suffix="shard%s" % shard)
+        executed = dict()
+        for path in paths:
+            # each shard runs one function out of `nb_shards`, taking the first branch
+            starts = [j * func_len + 1 for j in range(shard, NB_FUNCTIONS, nb_shards)]
+            if branch:
+                executed[path] = {(s + 1, s + 2) for s in starts} | {(s + 2, s + 3) for s in starts} \
+                                 | {(s + 3, s + 6) for s in starts} | {(-s, s + 1) for s in starts}
+            else:
+                executed[path] = {s + d for s in starts for d in (1, 2, 3, 6, 7, 8)}
+        if branch:
+            data.add_arcs(executed)
+        else:
+            data.add_lines(executed)
+        data.write()
+
+    rcfile = os.path.join(folder, ".coveragerc")
+    with open(rcfile, "wt") as f:
+        f.write("[run]\nbranch = %s\n" % branch)
+    return sorted(glob.glob(os.path.join(folder, ".coverage.*"))), rcfile
+
+
+def combine_and_xml(data_files, rcfile, folder):
+    """`coverage combine --keep` + `coverage xml` + `get_coverage_stats`"""
+    cov = coverage.Coverage(data_file=os.path.join(folder, ".coverage"), config_file=rcfile)
+    cov.combine(data_paths=data_files, keep=True)
+    coverage_xml = os.path.join(folder, "coverage.xml")
+    cov.xml_report(outfile=coverage_xml)
+    return get_coverage_stats(coverage_xml)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nb-files", type=int, default=300, help="Number of source files")
+    parser.add_argument("--nb-shards", type=int, default=8, help="Number of parallel data files")
+    parser.add_argument("--branch", action="store_true", help="Measure branch coverage")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each approach (the best is kept)")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        data_files, rcfile = write_sources_and_data(folder, args.nb_files, args.nb_shards, args.branch)
+        os.chdir(folder)
+        print("%s source files, %s data files, branch=%s" % (args.nb_files, args.nb_shards, args.branch))
+
+        results = []
+        for title, func in (("coverage combine + xml", lambda: combine_and_xml(data_files, rcfile, folder)),
+                            ("get_coveragepy_stats", lambda: get_coveragepy_stats(data_files, config_file=rcfile))):
+            durations = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                stats = func()
+                durations.append(time.perf_counter() - start)
+            results.append(min(durations))
+            print(" - %-24s %8.3f s  (%.2f%% lines, %s/%s branches)"
+                  % (title + ":", min(durations), stats.line_rate * 100, stats.branches_covered,
+                     stats.branches_valid))
+        print("get_coveragepy_stats is %.1fx faster" % (results[0] / results[1]))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Memory benchmark of the test case objects created by `xunitparser_copy`, on a large synthetic junit xml file.
+
+The peak memory during parsing, and the memory retained by the parsed results, are compared between the
+`unittest`-based objects (`Parser`), the lightweight `__slots__` records (`CompactParser`, which also parses the file
+incrementally) and the lightweight records without the captured output (`keep_output=False`). Note that the
+`unittest.TestSuite` releases its test cases once run, so only the failed, errored and skipped ones are retained in
+the first case.
+
+    python benchmarks/bench_junit_records.py [--nb-cases 100000]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from genbadge.xunitparser_copy import parse
+
+from synthetic_reports import write_junit
+
+
+def measure(path, **kwargs):
+    """Returns the parse duration, the peak memory and the memory retained by the results"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    ts, tr = parse(path, **kwargs)
+    duration = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak, retained, tr.testsRun
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nb-cases", type=int, default=100000, help="Number of test cases in the synthetic file")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".xml")
+    os.close(fd)
+    try:
+        write_junit(path, args.nb_cases)
+        print("Synthetic junit xml: %.1f MB, %s test cases" % (os.path.getsize(path) / 1024 / 1024, args.nb_cases))
+
+        ref_peak = ref_retained = None
+        for title, kwargs in (("unittest objects", dict()),
+                              ("compact records", dict(compact=True)),
+                              ("compact records, no output", dict(compact=True, keep_output=False))):
+            duration, peak, retained, nb_run = measure(path, **kwargs)
+            ref_peak, ref_retained = ref_peak or peak, ref_retained or retained
+            print(" - %-28s %.2f s, peak memory %8.1f kB (%.1fx less), retained memory %8.1f kB (%.1fx less), "
+                  "%s tests" % (title + ":", duration, peak / 1024, ref_peak / peak, retained / 1024,
+                                ref_retained / retained, nb_run))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark of the local SVG badge rendering (`get_svg_badge`).
+
+It compares the per-badge render cost of the compiled template with the legacy implementation, that read the
+template from the package resources and performed one `str.replace` pass per placeholder for every badge.
+
+    python benchmarks/bench_render.py [-n 20000]
+"""
+import argparse
+import timeit
+
+from genbadge import utils_badge
+
+
+class LegacyTemplate(object):
+    """Emulates the legacy rendering: one full-string replace pass per placeholder."""
+    def __init__(self, template):
+        self.template = template
+
+    def render(self, values):
+        template = self.template
+        for k, v in values.items():
+            template = template.replace("{{ %s }}" % k, str(v))
+        return template
+
+
+def render_badge():
+    return utils_badge.get_svg_badge(label_txt="coverage", msg_txt="98.12%", color="brightgreen")
+
+
+def bench(number):
+    # compiled template (current implementation)
+    expected = render_badge()  # also warms up the caches
+    new_cost = min(timeit.repeat(render_badge, number=number, repeat=5)) / number
+
+    # legacy implementation: template re-read and str.replace on every call
+    compile_template = utils_badge.compile_template
+    get_local_badge_template = utils_badge.get_local_badge_template
+    try:
+        utils_badge.compile_template = LegacyTemplate
+        utils_badge.get_local_badge_template = get_local_badge_template.__wrapped__
+        assert render_badge() == expected
+        old_cost = min(timeit.repeat(render_badge, number=number, repeat=5)) / number
+    finally:
+        utils_badge.compile_template = compile_template
+        utils_badge.get_local_badge_template = get_local_badge_template
+
+    return old_cost, new_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=20000, help="Number of badges rendered per repetition")
+    args = parser.parse_args()
+
+    old_cost, new_cost = bench(args.number)
+    print("Per-badge render cost (best of 5 x %s badges)" % args.number)
+    print(" - before (re-read template + str.replace passes): %.2f us" % (old_cost * 1e6))
+    print(" - after (compiled template):                      %.2f us" % (new_cost * 1e6))
+    print(" - speedup: x%.1f" % (old_cost / new_cost))
+
+
+if __name__ == "__main__":
+    main()
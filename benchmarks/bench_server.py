@@ -0,0 +1,117 @@
+"""
+Load test of the badge server (`genbadge serve`), with a local asyncio client using keep-alive connections.
+
+The requests per second and the latency percentiles are measured for a static badge, for the badge of a coverage
+report, for conditional requests answered with `304 Not Modified`, and for the report badge without the render cache
+(i.e. the report is parsed for each request).
+
+    python benchmarks/bench_server.py [--nb-requests 20000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from genbadge.utils_server import BadgeServer
+
+
+COVERAGE_XML = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "reports", "coverage", "coverage.xml")
+
+
+def start_server(root, cache_size):
+    """Starts a `BadgeServer` in a background thread, and returns its (host, port) socket address"""
+    started = threading.Event()
+    address = []
+
+    def _run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(BadgeServer(root, cache_size=cache_size).start("127.0.0.1", 0))
+        address.extend(server.sockets[0].getsockname()[:2])
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=_run, daemon=True).start()
+    started.wait()
+    return address
+
+
+async def load(host, port, path, nb_requests, concurrency, headers=""):
+    """Sends `nb_requests` GET requests for `path` over `concurrency` connections. Returns the latencies and statuses"""
+    request = ("GET %s HTTP/1.1\r\nHost: %s\r\n%s\r\n" % (path, host, headers)).encode("latin-1")
+    latencies = []
+    statuses = set()
+    counter = iter(range(nb_requests))
+
+    async def _client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in counter:
+            start = time.perf_counter()
+            writer.write(request)
+            status_line = await reader.readline()
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    content_length = int(line.split(b":")[1])
+            await reader.readexactly(content_length)
+            latencies.append(time.perf_counter() - start)
+            statuses.add(int(status_line.split()[1]))
+        writer.close()
+
+    await asyncio.gather(*(_client() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+def get_etag(host, port, path):
+    """Returns the ETag of the badge at `path`"""
+    import http.client
+    conn = http.client.HTTPConnection(host, port)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.getheader("ETag")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nb-requests", type=int, default=20000, help="Number of requests of each scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Number of concurrent client connections")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, "repo", "reports", "coverage"))
+        shutil.copy(COVERAGE_XML, os.path.join(root, "repo", "reports", "coverage", "coverage.xml"))
+
+        host, port = start_server(root, cache_size=1024)
+        no_cache_host, no_cache_port = start_server(root, cache_size=0)
+        etag = get_etag(host, port, "/coverage/repo")
+
+        scenarios = (
+            ("static badge", host, port, "/badge/build/passing/green", "", args.nb_requests),
+            ("coverage badge", host, port, "/coverage/repo", "", args.nb_requests),
+            ("coverage badge, 304", host, port, "/coverage/repo", "If-None-Match: %s\r\n" % etag, args.nb_requests),
+            ("coverage badge, no cache", no_cache_host, no_cache_port, "/coverage/repo", "", args.nb_requests // 10),
+        )
+        print("%s requests per scenario (%s for the last one), %s concurrent connections"
+              % (args.nb_requests, args.nb_requests // 10, args.concurrency))
+        for title, host_, port_, path, headers, nb_requests in scenarios:
+            start = time.perf_counter()
+            latencies, statuses = asyncio.run(load(host_, port_, path, nb_requests, args.concurrency, headers))
+            duration = time.perf_counter() - start
+            latencies.sort()
+            print(" - %-26s %7.0f requests/s, latency p50 %6.2f ms, p99 %6.2f ms (HTTP %s)"
+                  % (title + ":", nb_requests / duration, latencies[len(latencies) // 2] * 1000,
+                     latencies[int(len(latencies) * 0.99)] * 1000, "/".join(map(str, sorted(statuses)))))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark suite of genbadge, on synthetic reports of configurable size (see `synthetic_reports.py`).
+
+The duration (best of `--repeat` runs), the throughput and the peak memory (measured with `tracemalloc`, in a separate
+run) are measured for `get_test_stats`, `get_coverage_stats`, `get_flake8_stats`, `get_svg_badge`, and for the full
+command line (`genbadge tests/coverage/flake8/all --local`) invoked with click's `CliRunner`.
+
+The results can be saved as JSON with `--output`, and compared with the results of a previous run with `--compare`:
+the exit code is 1 if a benchmark is more than `--threshold` (relative) slower or uses more memory than before.
+This is what `nox -s benchmarks -- <baseline.json>` does.
+
+    python benchmarks/bench_suite.py [--nb-cases 10000] [--nb-classes 1000] [--nb-codes 500] [--nb-badges 2000]
+                                     [--repeat 3] [--output results.json] [--compare baseline.json] [--threshold 0.2]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from click.testing import CliRunner
+
+from genbadge import __version__
+from genbadge.main import genbadge
+from genbadge.utils_badge import get_svg_badge
+from genbadge.utils_coverage import get_coverage_stats
+from genbadge.utils_flake8 import get_flake8_stats
+from genbadge.utils_junit import get_test_stats
+
+from synthetic_reports import write_coverage, write_flake8_stats, write_junit
+
+
+# Peak memory increases below this amount, in bytes, are considered as noise when comparing with a baseline
+PEAK_MEMORY_NOISE = 64 * 1024
+
+
+def measure(func, repeat):
+    """Returns the best duration of `repeat` calls to `func`, and the peak memory of a separate call"""
+    func()  # warm up (imports, caches)
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    # tracemalloc slows the code down, so the peak memory is measured separately
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(durations), peak
+
+
+def run_cli(*args):
+    """Runs `genbadge <args>` with click's `CliRunner`, and fails if the command fails"""
+    result = CliRunner().invoke(genbadge, args, catch_exceptions=False)
+    if result.exit_code != 0:
+        raise ValueError("genbadge %s failed: %s" % (" ".join(args), result.output))
+
+
+def get_benchmarks(folder, nb_cases, nb_classes, nb_codes, nb_badges):
+    """Writes the synthetic reports in `folder`, and returns the (name, function, number of items, unit) benchmarks"""
+    junit_xml = os.path.join(folder, "junit.xml")
+    coverage_xml = os.path.join(folder, "coverage.xml")
+    flake8_txt = os.path.join(folder, "flake8stats.txt")
+    write_junit(junit_xml, nb_cases)
+    write_coverage(coverage_xml, nb_classes)
+    write_flake8_stats(flake8_txt, nb_codes)
+
+    def _render_badges():
+        for i in range(nb_badges):
+            get_svg_badge(label_txt="coverage", msg_txt="%.2f%%" % (i * 100. / nb_badges), color="brightgreen")
+
+    badge = os.path.join(folder, "badge.svg")
+    return (
+        ("get_test_stats", lambda: get_test_stats(junit_xml), nb_cases, "cases"),
+        ("get_coverage_stats", lambda: get_coverage_stats(coverage_xml), nb_classes, "classes"),
+        ("get_coverage_stats(details)", lambda: get_coverage_stats(coverage_xml, details=True), nb_classes, "classes"),
+        ("get_flake8_stats", lambda: get_flake8_stats(flake8_txt), nb_codes, "codes"),
+        ("get_svg_badge", _render_badges, nb_badges, "badges"),
+        ("cli tests", lambda: run_cli("tests", "-l", "-s", "-i", junit_xml, "-o", badge), nb_cases, "cases"),
+        ("cli coverage", lambda: run_cli("coverage", "-l", "-s", "-i", coverage_xml, "-o", badge), nb_classes,
+         "classes"),
+        ("cli flake8", lambda: run_cli("flake8", "-l", "-s", "-i", flake8_txt, "-o", badge), nb_codes, "codes"),
+        ("cli all", lambda: run_cli("all", "-l", "-s", "--tests-input", junit_xml, "--coverage-input", coverage_xml,
+                                    "--flake8-input", flake8_txt, "-o", folder), 1, "runs"),
+    )
+
+
+def run(params, repeat):
+    """Runs all benchmarks and returns the results, as a json-able dictionary"""
+    folder = tempfile.mkdtemp()
+    try:
+        results = dict()
+        for name, func, nb_items, unit in get_benchmarks(folder, **params):
+            duration, peak = measure(func, repeat)
+            results[name] = dict(duration=duration, throughput=nb_items / duration, unit="%s/s" % unit,
+                                 peak_memory=peak)
+            print(" - %-28s %9.2f ms %12.0f %-10s peak %8.1f KiB"
+                  % (name + ":", duration * 1000, nb_items / duration, unit + "/s", peak / 1024.))
+    finally:
+        shutil.rmtree(folder)
+
+    return dict(python=platform.python_version(), platform=platform.platform(), genbadge=__version__,
+                params=params, repeat=repeat, results=results)
+
+
+def compare(results, baseline, threshold):
+    """Prints the comparison of `results` with `baseline`, and returns the names of the regressed benchmarks"""
+    if baseline["params"] != results["params"]:
+        print("WARNING - the baseline was obtained with different parameters: %r" % baseline["params"])
+
+    regressions = []
+    print("Comparison with the baseline (genbadge %s, python %s), threshold %+.0f%%"
+          % (baseline["genbadge"], baseline["python"], threshold * 100))
+    for name, res in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(" - %-28s (new)" % (name + ":"))
+            continue
+
+        duration_ratio = res["duration"] / base["duration"] - 1
+        peak_ratio = res["peak_memory"] / max(base["peak_memory"], 1) - 1
+        slower = duration_ratio > threshold
+        bigger = peak_ratio > threshold and res["peak_memory"] - base["peak_memory"] > PEAK_MEMORY_NOISE
+        if slower or bigger:
+            regressions.append(name)
+        print(" - %-28s duration %+7.1f%%  peak memory %+7.1f%%%s"
+              % (name + ":", duration_ratio * 100, peak_ratio * 100, "  REGRESSION" if slower or bigger else ""))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nb-cases", type=int, default=10000, help="Number of test cases of the junit report")
+    parser.add_argument("--nb-classes", type=int, default=1000, help="Number of classes of the coverage report")
+    parser.add_argument("--nb-codes", type=int, default=500, help="Number of error codes of the flake8 statistics")
+    parser.add_argument("--nb-badges", type=int, default=2000, help="Number of badges rendered with get_svg_badge")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each benchmark (the best is kept)")
+    parser.add_argument("--output", help="JSON file where the results should be saved")
+    parser.add_argument("--compare", help="JSON file with the results of a previous run, to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative increase of duration or peak memory considered as a regression")
+    args = parser.parse_args()
+
+    params = dict(nb_cases=args.nb_cases, nb_classes=args.nb_classes, nb_codes=args.nb_codes,
+                  nb_badges=args.nb_badges)
+    print("genbadge %s, python %s, %r" % (__version__, platform.python_version(), params))
+    results = run(params, args.repeat)
+
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        with open(args.output, "wt") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Results saved to %r" % args.output)
+
+    if args.compare:
+        with open(args.compare, "rt") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("FAILURE - %s benchmark(s) regressed: %s" % (len(regressions), ", ".join(regressions)))
+            sys.exit(1)
+        print("SUCCESS - no regression")
+
+
+if __name__ == "__main__":
+    main()
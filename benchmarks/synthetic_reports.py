@@ -0,0 +1,71 @@
+"""
+Generators of synthetic reports of configurable size, for the benchmarks: junit xml files with N test cases,
+coverage.xml files with N classes and flake8 statistics with N error codes.
+"""
+
+TESTCASE = '<testcase classname="tests.test_mod%(m)s" name="test_%(i)s" time="0.001">%(child)s</testcase>\n'
+# one test case out of 4 fails, is skipped or has a captured output
+TESTCASE_CHILDREN = (
+    '',
+    '<system-out>some captured output of test %(i)s</system-out>',
+    '<failure message="assert 1 == 2" type="AssertionError">def test():\n&gt;    assert 1 == 2\nE   assert 1 == 2'
+    '</failure>',
+    '<skipped message="not supported" type="pytest.skip"/>',
+)
+
+COVERAGE_ROOT = ('<?xml version="1.0" ?>\n<coverage branch-rate="%(br)s" branches-covered="%(bc)s" '
+                 'branches-valid="%(bv)s" complexity="0" line-rate="%(lr)s" lines-covered="%(lc)s" '
+                 'lines-valid="%(lv)s" timestamp="1618319767206" version="5.5">\n'
+                 '\t<sources><source>/src</source></sources>\n\t<packages>\n')
+COVERAGE_CLASS = ('\t\t\t\t<class branch-rate="0" complexity="0" filename="pkg%(p)s/mod%(i)s.py" line-rate="0.5" '
+                  'name="mod%(i)s.py"><methods/><lines>%(lines)s</lines></class>\n')
+COVERAGE_LINE = '<line hits="%s" number="%s"/>'
+COVERAGE_BRANCH_LINE = ('<line branch="true" condition-coverage="50%% (1/2)" hits="1" missing-branches="%s" '
+                        'number="%s"/>')
+
+# the prefixes of the flake8 error codes, with all severities
+FLAKE8_PREFIXES = ("B", "C", "E", "F", "I", "N", "S", "W")
+FLAKE8_STAT = "%s     %s%03d some message about this error\n"
+
+
+def write_junit(path, nb_cases):
+    """Writes a junit xml file with `nb_cases` test cases, some of them failed, skipped or with captured output"""
+    nb_failed = len(range(2, nb_cases, len(TESTCASE_CHILDREN)))
+    nb_skipped = len(range(3, nb_cases, len(TESTCASE_CHILDREN)))
+    with open(path, "wt") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites><testsuite errors="0" failures="%s" skipped="%s" '
+                'tests="%s" name="pytest">\n' % (nb_failed, nb_skipped, nb_cases))
+        for i in range(nb_cases):
+            child = TESTCASE_CHILDREN[i % len(TESTCASE_CHILDREN)] % dict(i=i)
+            f.write(TESTCASE % dict(m=i // 100, i=i, child=child))
+        f.write('</testsuite></testsuites>\n')
+
+
+def write_coverage(path, nb_classes, nb_lines=50, nb_packages=100):
+    """
+    Writes a coverage.xml file with `nb_classes` classes of `nb_lines` lines each (half of them covered, and one
+    partially covered branch per class), in `nb_packages` packages.
+    """
+    lines = "".join(COVERAGE_LINE % (i % 2, i) for i in range(1, nb_lines))
+    lines += COVERAGE_BRANCH_LINE % (nb_lines, nb_lines)
+    nb_covered = len(range(1, nb_lines, 2)) + 1
+    classes_per_package = nb_classes // nb_packages + 1
+    with open(path, "wt") as f:
+        f.write(COVERAGE_ROOT % dict(lc=nb_covered * nb_classes, lv=nb_lines * nb_classes, lr=nb_covered / nb_lines,
+                                     bc=nb_classes, bv=2 * nb_classes, br=0.5))
+        for i in range(nb_classes):
+            if i % classes_per_package == 0:
+                f.write('\t\t<package branch-rate="0" complexity="0" line-rate="0.5" name="pkg%s">\n\t\t\t<classes>\n'
+                        % (i // classes_per_package))
+            f.write(COVERAGE_CLASS % dict(p=i // classes_per_package, i=i, lines=lines))
+            if (i + 1) % classes_per_package == 0 or i + 1 == nb_classes:
+                f.write('\t\t\t</classes>\n\t\t</package>\n')
+        f.write('\t</packages>\n</coverage>\n')
+
+
+def write_flake8_stats(path, nb_codes):
+    """Writes a flake8 statistics file (`flake8 --statistics`) with `nb_codes` distinct error codes"""
+    with open(path, "wt") as f:
+        for i in range(nb_codes):
+            prefix = FLAKE8_PREFIXES[i % len(FLAKE8_PREFIXES)]
+            f.write(FLAKE8_STAT % (i % 10 + 1, prefix, i // len(FLAKE8_PREFIXES)))
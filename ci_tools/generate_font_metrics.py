@@ -0,0 +1,71 @@
+"""
+Generates the precomputed glyph metrics module `genbadge/verdana_11_metrics.py` from the embedded `verdana.ttf`.
+
+This requires `pillow`. Run it from the project root:
+
+    python ci_tools/generate_font_metrics.py
+"""
+import itertools
+from pathlib import Path
+
+from PIL import ImageFont, features
+
+
+FONT_NAME = "Verdana"
+FONT_SIZE = 11
+CHARSET = "".join(chr(i) for i in range(32, 127))  # printable ASCII
+
+PKG_FOLDER = Path(__file__).parent.parent / "src" / "genbadge"
+TARGET = PKG_FOLDER / "verdana_11_metrics.py"
+
+
+def _dict_literal(dct, per_line=8):
+    items = ["%r: %r" % (k, v) for k, v in sorted(dct.items())]
+    lines = [", ".join(items[i:i + per_line]) for i in range(0, len(items), per_line)]
+    return "{\n    %s,\n}" % ",\n    ".join(lines)
+
+
+def main():
+    font = ImageFont.truetype(font=str(PKG_FOLDER / "verdana.ttf"), size=FONT_SIZE)
+
+    # advances in 26.6 fixed point units
+    advances = {c: int(round(font.getlength(c) * 64)) for c in CHARSET}
+    # right edge of the glyph bounding box, in pixels, when the glyph is drawn at the origin
+    right_edges = {c: font.getbbox(c)[2] for c in CHARSET}
+    # kerning adjustments in 26.6 fixed point units
+    kerning = dict()
+    for a, b in itertools.product(CHARSET, CHARSET):
+        k = int(round(font.getlength(a + b) * 64)) - advances[a] - advances[b]
+        if k != 0:
+            kerning[a + b] = k
+
+    TARGET.write_text('''#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Precomputed glyph metrics of the embedded `verdana.ttf` font at size %(size)s.
+
+This file is generated by `ci_tools/generate_font_metrics.py` - do not edit it manually.
+"""
+
+FONT_NAME = %(name)r
+FONT_SIZE = %(size)r
+
+# FreeType version used by pillow when this file was generated
+FREETYPE_VERSION = %(ft)r
+
+# Glyph advances, in 26.6 fixed point units (1/64th of a pixel)
+ADVANCES = %(advances)s
+
+# Right edge of each glyph bounding box in pixels, when drawn at the origin
+RIGHT_EDGES = %(right_edges)s
+
+# Kerning adjustments for pairs of glyphs, in 26.6 fixed point units
+KERNING = %(kerning)s
+''' % dict(name=FONT_NAME, size=FONT_SIZE, ft=features.version("freetype2"), advances=_dict_literal(advances),
+           right_edges=_dict_literal(right_edges), kerning=_dict_literal(kerning)))
+
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,8 @@ class Folders:
     flake8_reports = reports_root / "flake8"
     flake8_intermediate_file = root / "flake8stats.txt"
     flake8_badge = flake8_reports / "flake8-badge.svg"
+    benchmark_reports = reports_root / "benchmarks"
+    benchmark_json = benchmark_reports / "benchmarks.json"
 
 
 ENVS = {
@@ -174,6 +176,24 @@ def flake8(session):
     rm_file(Folders.flake8_intermediate_file)
 
 
+@nox.session(python=PY39)
+def benchmarks(session):
+    """Runs the benchmark suite. Pass '-- <baseline.json> [<threshold>]' to fail if it regressed since the baseline."""
+
+    install_reqs(session, setup=True, install=True, extras=("all",))
+    session.install(".", "--no-deps")
+
+    args = ["--output", str(Folders.benchmark_json)]
+    if len(session.posargs) > 2:
+        raise ValueError("At most two positional arguments are accepted, received: %r" % session.posargs)
+    if session.posargs:
+        args += ["--compare", session.posargs[0]]
+    if len(session.posargs) == 2:
+        args += ["--threshold", session.posargs[1]]
+
+    session.run("python", "benchmarks/bench_suite.py", *args)
+
+
 @nox.session(python=PY39)
 def docs(session):
     """Generates the doc. Pass '-- serve' to serve it on a local http server instead."""
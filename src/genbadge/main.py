@@ -2,6 +2,9 @@
 #            + All contributors to <https://github.com/smarie/python-genbadge>
 #
 #  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+import os
+import time
+
 try:
     from pathlib import Path
 except ImportError:  # pragma: no cover
@@ -10,9 +13,12 @@ except ImportError:  # pragma: no cover
 import click
 
 
-from .utils_junit import get_test_stats, get_tests_badge
-from .utils_coverage import get_coverage_badge, get_coverage_stats
-from .utils_flake8 import get_flake8_stats, get_flake8_badge
+# Note: the modules for each command are imported in the commands themselves, so that the startup time of the cli
+# only includes what is actually needed.
+from .utils_badge import text_width_cache_info, write_svg
+from .utils_io import expand_glob_pattern, is_glob_pattern
+from .utils_shields import set_shields_cache, DEFAULT_CACHE_TTL, DEFAULT_CACHE_MAX_SIZE
+from .utils_timings import NO_TIMINGS, StageTimings
 
 try:
     FileNotFoundError
@@ -24,10 +30,30 @@ INFILE_HELP_TMP = "An alternate %s file to read. '-' is supported and means <std
 OUTFILE_BADGE_HELP = ("An alternate SVG badge file to write to. '-' is supported and means <stdout>. Note that in this "
                       "case no other message will be printed to <stdout>. In particular the verbose flag will have no "
                       "effect.")
+MULTI_INFILE_HELP_TMP = ("An alternate %s file to read. '-' is supported and means <stdin>. Glob patterns such as "
+                         "'%s' are supported, and this option can be repeated: the results of all files are "
+                         "then combined into a single badge.")
+ALL_INFILE_HELP_TMP = ("An alternate %s file to read for the %s badge. By default the file is only used if it exists.")
 NAME_HELP = ("An alternate SVG badge text name to display on the left-hand side of the badge.")
 WITH_NAME_HELP = ("Indicates if a badge should be generated with or without the left-hand side of the badge.")
 SHIELDS_HELP = ("Indicates if badges should be generated using the shields.io HTTP API (default) or the local SVG file "
                 "template included.")
+SHIELDS_CACHE_HELP = ("An optional directory where to cache the badges downloaded from shields.io, so that identical "
+                      "badges are not downloaded again. The cache time-to-live (in seconds, default one day) and "
+                      "maximum size (in bytes, default 10MB) can be set with the GENBADGE_SHIELDS_CACHE_TTL and "
+                      "GENBADGE_SHIELDS_CACHE_MAX_SIZE environment variables.")
+INCREMENTAL_HELP = ("Only generate the badge if the input file(s), the options or the genbadge version changed since "
+                    "the previous run, and only rewrite the badge file if its contents changed. A manifest is stored "
+                    "next to the badge ('<badge>.svg.genbadge.json') for this. Not available when reading from <stdin> "
+                    "or writing to <stdout>.")
+WATCH_HELP = ("Keep running after the badge is generated, and generate it again each time the input file(s) change. "
+              "Press Ctrl+C to stop. Not available when reading from <stdin> or writing to <stdout>.")
+TIMINGS_HELP = ("Print the duration of each stage of the command on <stderr> when it ends: input files resolution, "
+                "parsing, statistics, badge rendering (or download from shields.io) and writing.")
+TIMINGS_JSON_HELP = ("A JSON file where to write the duration of each stage of the command, in seconds, when it ends "
+                     "(see --timings). '-' is supported and means <stdout>.")
+PROFILE_HELP = ("Run the command with the cProfile profiler, and write the profiling statistics to this file. They can "
+                "be read with the `pstats` module or a viewer such as snakeviz.")
 VERBOSE_HELP = ("Use this flag to print details to stdout during the badge generation process. Note that this flag has "
                 "no effect when '-' is used as output, since the badge is written to <stdout>. It also has no effect "
                 "when the silent flag `-s` is used.")
@@ -35,6 +61,78 @@ SILENT_HELP = ("When this flag is active nothing will be written to stdout. Note
                "is used as the output file.")
 
 
+class FileOrGlob(click.File):
+    """A `click.File` parameter type that also accepts glob patterns, returned as is so that they are expanded later"""
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, str) and value != "-" and is_glob_pattern(value):
+            return value
+        return super(FileOrGlob, self).convert(value, param, ctx)
+
+
+# The key of the `StageTimings` of the current command in the click context `meta`, shared with the sub-contexts
+_TIMINGS_KEY = "genbadge.timings"
+
+
+def _get_timings():
+    """Returns the `StageTimings` of the current command, or `NO_TIMINGS` if they were not requested"""
+    return click.get_current_context().meta.get(_TIMINGS_KEY, NO_TIMINGS)
+
+
+def _start_timings(ctx):
+    timings = ctx.meta.get(_TIMINGS_KEY)
+    if timings is None:
+        timings = ctx.meta[_TIMINGS_KEY] = StageTimings()
+    return timings
+
+
+def _show_timings(ctx, param, value):
+    """Callback of the --timings flag: the timings are printed on <stderr> when the command ends"""
+    if value:
+        timings = _start_timings(ctx)
+        ctx.call_on_close(lambda: click.echo("Timings of 'genbadge %s':\n%s" % (ctx.info_name, timings.format()),
+                                             err=True))
+
+
+def _save_timings(ctx, param, value):
+    """
+    Callback of the --timings-json option: the timings are written to the `value` file when the command ends. They
+    are written to <stderr> instead of <stdout> when the badge itself is written to <stdout>.
+    """
+    if value is not None:
+        import json
+        timings = _start_timings(ctx)
+
+        def _save():
+            results = dict(command=ctx.info_name, **timings.as_dict())
+            out = value
+            if _is_stdout(value) and _is_stdout(ctx.params.get("output_file")):
+                out = click.get_text_stream("stderr")
+            json.dump(results, out, indent=2)
+            out.write("\n")
+
+        ctx.call_on_close(_save)
+
+
+def _is_stdout(file):
+    """Returns True if `file` is a file opened by click for '-' in write mode"""
+    return file is not None and not isinstance(file, str) and getattr(file, "name", "<stdout>") == "<stdout>"
+
+
+def _start_profile(ctx, param, value):
+    """Callback of the --profile option: the command is run with cProfile, and the statistics saved when it ends"""
+    if value is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+
+        def _stop():
+            profiler.disable()
+            profiler.dump_stats(value)
+
+        ctx.call_on_close(_stop)
+        profiler.enable()
+
+
 @click.group(invoke_without_command=True)
 @click.pass_context
 def genbadge(ctx):
@@ -52,7 +150,8 @@ def genbadge(ctx):
 
 @genbadge.command(name="tests",
                   short_help="Generate a badge for the test results (e.g. from a junit.xml).")
-@click.option('-i', '--input-file', type=click.File('rt'), help=INFILE_HELP_TMP % "test results XML")
+@click.option('-i', '--input-file', type=FileOrGlob('rt'), multiple=True,
+              help=MULTI_INFILE_HELP_TMP % ("test results XML", "reports/junit/*.xml"))
 @click.option('-o', '--output-file', type=click.File('wt'), help=OUTFILE_BADGE_HELP)
 @click.option('-n', '--name', type=str, default="tests", help=NAME_HELP)
 @click.option('-t', '--threshold', type=float,
@@ -60,6 +159,17 @@ def genbadge(ctx):
                    "actual success percentage is strictly less than the provided value.")
 @click.option('--withname/--noname', type=bool, default=True, help=WITH_NAME_HELP)
 @click.option('-w/-l', '--webshields/--local', type=bool, default=True, help=SHIELDS_HELP)
+@click.option('--shields-cache', type=click.Path(file_okay=False), envvar="GENBADGE_SHIELDS_CACHE",
+              help=SHIELDS_CACHE_HELP)
+@click.option('--incremental', type=bool, default=False, is_flag=True, envvar="GENBADGE_INCREMENTAL",
+              help=INCREMENTAL_HELP)
+@click.option('--watch', type=bool, default=False, is_flag=True, help=WATCH_HELP)
+@click.option('--timings', type=bool, default=False, is_flag=True, expose_value=False, callback=_show_timings,
+              help=TIMINGS_HELP)
+@click.option('--timings-json', type=click.File('wt'), expose_value=False, callback=_save_timings,
+              help=TIMINGS_JSON_HELP)
+@click.option('--profile', type=click.Path(dir_okay=False), expose_value=False, callback=_start_profile,
+              help=PROFILE_HELP)
 @click.option('-v', '--verbose', type=bool, default=False, is_flag=True, help=VERBOSE_HELP)
 @click.option('-s', '--silent', type=bool, default=False, is_flag=True, help=SILENT_HELP)
 def gen_tests_badge(
@@ -69,6 +179,9 @@ def gen_tests_badge(
         threshold=None,
         withname=None,
         webshields=None,
+        shields_cache=None,
+        incremental=None,
+        watch=None,
         verbose=None,
         silent=None
 ):
@@ -79,7 +192,10 @@ def gen_tests_badge(
 
     By default the input file is the relative `./reports/junit/junit.xml` and
     the output file is `./tests-badge.svg`. You can change these settings with
-    the `-i/--input_file` and `-o/--output-file` options.
+    the `-i/--input_file` and `-o/--output-file` options. Several input files
+    can be provided, by repeating `-i` or with a glob pattern such as
+    `-i "reports/junit/*.xml"`: they are parsed in parallel and their results
+    are combined into a single badge.
 
     By default the badge will have the name "tests" as the left-hand side text.
     You can change these settings with the `-n/--name` option. The left-hand side
@@ -101,29 +217,42 @@ def gen_tests_badge(
     success percentage is below the threshold, an error will be raised and the
     badge will not be generated.
     """
+    timings = _get_timings()
+    from .utils_junit import get_test_stats, get_tests_badge
+    timings.lap("imports")
+
     # Process i/o files
-    input_file, input_file_path = _process_infile(input_file, "reports/junit/junit.xml")
+    input_file, input_file_path = _process_infiles(input_file, "reports/junit/junit.xml")
     output_file, output_file_path, is_stdout = _process_outfile(output_file, "tests-badge.svg")
 
-    # First retrieve the success percentage from the junit xml
+    # Generate the badge again each time the input file(s) change
+    if watch:
+        params = dict(click.get_current_context().params, input_file=input_file)
+        _watch([(gen_tests_badge, params)], output_file_path, is_stdout, silent)
+        return
+
+    # Nothing to do if the badge is up to date
+    manifest = _get_manifest("tests", incremental, input_file, output_file_path, is_stdout,
+                             dict(name=name, threshold=threshold, withname=withname, webshields=webshields))
+    up_to_date = manifest is not None and manifest.is_up_to_date()
+    timings.lap("infiles")
+    if up_to_date:
+        if not silent:
+            click.echo("SUCCESS - Tests badge is up to date: %r" % output_file_path)
+        return
+
+    # First retrieve the success percentage from the junit xml(s)
     try:
         test_stats = get_test_stats(junit_xml_file=input_file)
-    except FileNotFoundError:
-        raise click.exceptions.FileError(input_file, hint="File not found")
+    except FileNotFoundError as e:
+        raise click.exceptions.FileError(e.filename or input_file_path, hint="File not found")
+    timings.lap("parse")
 
     if not silent and verbose and not is_stdout:
-        click.echo("""Test statistics parsed successfully from %r
- - Nb tests: Total (%s) = Success (%s) + Skipped (%s) + Failed (%s) + Errors (%s)
- - Success percentage: %.2f%% (%s / %s) (Skipped tests are excluded)
-""" % (input_file_path, test_stats.total_with_skipped, test_stats.success, test_stats.skipped, test_stats.failed,
-       test_stats.errors, test_stats.success_percentage, test_stats.success, test_stats.total_without_skipped))
+        click.echo(_tests_verbose_msg(input_file_path, test_stats))
 
     # sanity check
-    if test_stats.total_with_skipped != test_stats.success + test_stats.skipped + test_stats.failed + test_stats.errors:
-        raise click.exceptions.ClickException(
-            "Inconsistent junit results: the sum of all kind of tests is not equal to the total. Please report this "
-            "issue if you think your file is correct. Details: %r" % test_stats
-        )
+    _check_test_stats(test_stats)
 
     # Validate against the threshold
     if threshold is not None and test_stats.success_percentage < threshold:
@@ -142,31 +271,62 @@ def gen_tests_badge(
 
     # Generate the badge
     badge = get_tests_badge(test_stats, name)
-    badge.write_to(
-        output_file if is_stdout else output_file_path, 
-        use_shields=webshields, 
-        clear_left_txt=clear_left_txt
-    )
+    timings.lap("stats")
+
+    _setup_shields_cache(shields_cache)
+    svg = badge.as_svg(use_shields=webshields, clear_left_txt=clear_left_txt)
+    timings.lap("fetch" if webshields else "render")
+
+    written = write_svg(svg, output_file if is_stdout else output_file_path, only_if_changed=manifest is not None)
+    if manifest is not None:
+        manifest.save()
+    timings.lap("write")
 
     if not silent and not is_stdout:
-        click.echo("SUCCESS - Tests badge created: %r" % str(output_file_path))
+        if verbose:
+            click.echo(_text_width_cache_msg())
+        click.echo("SUCCESS - Tests badge %s: %r" % ("created" if written else "unchanged", str(output_file_path)))
 
 
 @genbadge.command(name="coverage",
                   short_help="Generate a badge for the coverage results (e.g. from a coverage.xml).")
-@click.option('-i', '--input-file', type=click.File('rt'), help=INFILE_HELP_TMP % "coverage results XML")
+@click.option('-i', '--input-file', type=FileOrGlob('rt'), multiple=True,
+              help=MULTI_INFILE_HELP_TMP % ("coverage results", "reports/coverage/*.xml"))
+@click.option('--format', 'input_format', type=click.Choice(["auto", "xml", "lcov", "jacoco", "coveragepy"]),
+              default="auto",
+              help="The format of the input file(s): 'xml' for a coverage.xml file, 'lcov' for an LCOV tracefile "
+                   "(e.g. lcov.info), 'jacoco' for a JaCoCo xml report, or 'coveragepy' for a coverage.py data file, "
+                   "whose executed lines are read directly so that `coverage combine` and `coverage xml` do not need "
+                   "to be run first. By default ('auto') the "
+                   "format is detected from the first bytes of the file. With 'coveragepy' the default input file is "
+                   "'./.coverage'.")
 @click.option('-o', '--output-file', type=click.File('wt'), help=OUTFILE_BADGE_HELP)
 @click.option('-n', '--name', type=str, default="coverage", help=NAME_HELP)
 @click.option('--withname/--noname', type=bool, default=True, help=WITH_NAME_HELP)
 @click.option('-w/-l', '--webshields/--local', type=bool, default=True, help=SHIELDS_HELP)
+@click.option('--shields-cache', type=click.Path(file_okay=False), envvar="GENBADGE_SHIELDS_CACHE",
+              help=SHIELDS_CACHE_HELP)
+@click.option('--incremental', type=bool, default=False, is_flag=True, envvar="GENBADGE_INCREMENTAL",
+              help=INCREMENTAL_HELP)
+@click.option('--watch', type=bool, default=False, is_flag=True, help=WATCH_HELP)
+@click.option('--timings', type=bool, default=False, is_flag=True, expose_value=False, callback=_show_timings,
+              help=TIMINGS_HELP)
+@click.option('--timings-json', type=click.File('wt'), expose_value=False, callback=_save_timings,
+              help=TIMINGS_JSON_HELP)
+@click.option('--profile', type=click.Path(dir_okay=False), expose_value=False, callback=_start_profile,
+              help=PROFILE_HELP)
 @click.option('-v', '--verbose', type=bool, default=False, is_flag=True, help=VERBOSE_HELP)
 @click.option('-s', '--silent', type=bool, default=False, is_flag=True, help=SILENT_HELP)
 def gen_coverage_badge(
         input_file=None,
+        input_format=None,
         output_file=None,
         name=None,
         withname=None,
         webshields=None,
+        shields_cache=None,
+        incremental=None,
+        watch=None,
         verbose=None,
         silent=None
 ):
@@ -177,7 +337,11 @@ def gen_coverage_badge(
 
     By default the input file is the relative `./reports/coverage/coverage.xml`
     and the output file is `./coverage-badge.svg`. You can change these settings
-    with the `-i/--input_file` and `-o/--output-file` options.
+    with the `-i/--input_file` and `-o/--output-file` options. Several input
+    files can be provided, by repeating `-i` or with a glob pattern such as
+    `-i "reports/coverage/*.xml"`: they are read in parallel and merged as
+    `coverage combine` would do, so that lines covered in several files are
+    only counted once.
     
     By default the badge will have the name "coverage" as the left-hand side text.
     You can change these settings with the `-n/--name` option. The left-hand side
@@ -194,25 +358,65 @@ def gen_coverage_badge(
         (nb_lines_covered + nb_branches_covered) / (nb_lines / nb_branches)
 
     and multiplying this by 100.
+
+    LCOV tracefiles (e.g. lcov.info) and JaCoCo xml reports are also supported.
+    The format of the input file is detected automatically, or can be set with
+    `--format`. Instead of a coverage.xml file, the coverage.py data file
+    (`.coverage`) can also be read directly with `--format coveragepy`: the
+    executed lines are read from the data file(s), and only the statements and
+    branches of the source files are analyzed with coverage.py, so that
+    `coverage combine` and `coverage xml` do not need to be run first. The
+    coverage.py configuration files are used.
     """
+    timings = _get_timings()
+    from .utils_coverage import get_coverage_badge, get_coverage_stats, detect_coverage_format
+    timings.lap("imports")
+
     # Process i/o files
-    input_file, input_file_path = _process_infile(input_file, "reports/coverage/coverage.xml")
+    default_in_file = ".coverage" if input_format == "coveragepy" else "reports/coverage/coverage.xml"
+    input_file, input_file_path = _process_infiles(input_file, default_in_file)
     output_file, output_file_path, is_stdout = _process_outfile(output_file, "coverage-badge.svg")
 
-    # First retrieve the coverage info from the coverage xml
+    # Generate the badge again each time the input file(s) change
+    if watch:
+        params = dict(click.get_current_context().params, input_file=input_file)
+        _watch([(gen_coverage_badge, params)], output_file_path, is_stdout, silent)
+        return
+
+    # First retrieve the coverage info from the coverage file(s)
     try:
-        cov_stats = get_coverage_stats(coverage_xml_file=input_file)
-    except FileNotFoundError:
-        raise click.exceptions.FileError(input_file, hint="File not found")
+        if input_format == "auto":
+            try:
+                input_format = detect_coverage_format(input_file)
+            except ValueError as e:
+                raise click.exceptions.UsageError(str(e))
+        if input_format == "coveragepy":
+            input_file = _as_file_paths(input_file, "--format %s" % input_format)
+        elif input_format != "xml" and isinstance(input_file, list):
+            raise click.exceptions.UsageError("Several input files can only be merged with the 'xml' and "
+                                              "'coveragepy' formats, not %r" % input_format)
+
+        # Nothing to do if the badge is up to date. Not supported for the coverage.py data files, since the results
+        # also depend on the source files and on the coverage.py configuration
+        manifest = None
+        if input_format != "coveragepy":
+            manifest = _get_manifest("coverage", incremental, input_file, output_file_path, is_stdout,
+                                     dict(input_format=input_format, name=name, withname=withname,
+                                          webshields=webshields))
+        up_to_date = manifest is not None and manifest.is_up_to_date()
+        timings.lap("infiles")
+        if up_to_date:
+            if not silent:
+                click.echo("SUCCESS - Coverage badge is up to date: %r" % output_file_path)
+            return
+
+        cov_stats = get_coverage_stats(coverage_xml_file=input_file, input_format=input_format)
+    except FileNotFoundError as e:
+        raise click.exceptions.FileError(e.filename or input_file_path, hint="File not found")
+    timings.lap("parse")
 
     if not silent and verbose and not is_stdout:
-        click.echo("""Coverage results parsed successfully from %(ifp)r
- - Branch coverage: %(bcp).2f%% (%(bc)s/%(bv)s)
- - Line coverage: %(lcp).2f%% (%(lc)s/%(lv)s)
- - Total coverage: %(tcp).2f%% ((%(bc)s+%(lc)s)/(%(bv)s+%(lv)s))
-""" % dict(ifp=input_file_path, tcp=cov_stats.total_coverage,
-           bcp=cov_stats.branch_coverage, bc=cov_stats.branches_covered, bv=cov_stats.branches_valid,
-           lcp=cov_stats.line_coverage, lc=cov_stats.lines_covered, lv=cov_stats.lines_valid))
+        click.echo(_coverage_verbose_msg(input_file_path, cov_stats))
 
     # Set badge name
     clear_left_txt = False
@@ -223,15 +427,22 @@ def gen_coverage_badge(
         clear_left_txt = True # keep left side of badge but remove text
     
     # Generate the badge
-    badge = get_coverage_badge(cov_stats, name)    
-    badge.write_to(
-        output_file if is_stdout else output_file_path, 
-        use_shields=webshields, 
-        clear_left_txt=clear_left_txt
-    )
+    badge = get_coverage_badge(cov_stats, name)
+    timings.lap("stats")
+
+    _setup_shields_cache(shields_cache)
+    svg = badge.as_svg(use_shields=webshields, clear_left_txt=clear_left_txt)
+    timings.lap("fetch" if webshields else "render")
+
+    written = write_svg(svg, output_file if is_stdout else output_file_path, only_if_changed=manifest is not None)
+    if manifest is not None:
+        manifest.save()
+    timings.lap("write")
 
     if not silent and not is_stdout:
-        click.echo("SUCCESS - Coverage badge created: %r" % str(output_file_path))
+        if verbose:
+            click.echo(_text_width_cache_msg())
+        click.echo("SUCCESS - Coverage badge %s: %r" % ("created" if written else "unchanged", str(output_file_path)))
 
 
 @genbadge.command(name="flake8",
@@ -241,6 +452,17 @@ def gen_coverage_badge(
 @click.option('-n', '--name', type=str, default="flake8", help=NAME_HELP)
 @click.option('--withname/--noname', type=bool, default=True, help=WITH_NAME_HELP)
 @click.option('-w/-l', '--webshields/--local', type=bool, default=True, help=SHIELDS_HELP)
+@click.option('--shields-cache', type=click.Path(file_okay=False), envvar="GENBADGE_SHIELDS_CACHE",
+              help=SHIELDS_CACHE_HELP)
+@click.option('--incremental', type=bool, default=False, is_flag=True, envvar="GENBADGE_INCREMENTAL",
+              help=INCREMENTAL_HELP)
+@click.option('--watch', type=bool, default=False, is_flag=True, help=WATCH_HELP)
+@click.option('--timings', type=bool, default=False, is_flag=True, expose_value=False, callback=_show_timings,
+              help=TIMINGS_HELP)
+@click.option('--timings-json', type=click.File('wt'), expose_value=False, callback=_save_timings,
+              help=TIMINGS_JSON_HELP)
+@click.option('--profile', type=click.Path(dir_okay=False), expose_value=False, callback=_start_profile,
+              help=PROFILE_HELP)
 @click.option('-v', '--verbose', type=bool, default=False, is_flag=True, help=VERBOSE_HELP)
 @click.option('-s', '--silent', type=bool, default=False, is_flag=True, help=SILENT_HELP)
 def gen_flake8_badge(
@@ -249,13 +471,17 @@ def gen_flake8_badge(
         name=None,
         withname=None,
         webshields=None,
+        shields_cache=None,
+        incremental=None,
+        watch=None,
         verbose=None,
         silent=None
 ):
     """
     This command generates a badge for the flake8 results, from a flake8stats.txt
     file. Such a file can be generated from python `flake8` using the
-    --statistics flag.
+    --statistics flag. The raw flake8 output (one line per violation, in the
+    default format) is also accepted, and tallied in constant memory.
 
     By default the input file is the relative `./reports/flake8/flake8stats.txt`
     and the output file is `./flake8-badge.svg`. You can change these settings
@@ -276,20 +502,48 @@ def gen_flake8_badge(
     change the appearance of the badge with the --format option (not
     implemented, todo).
     """
+    timings = _get_timings()
+    from .utils_flake8 import get_flake8_stats, get_flake8_badge
+    timings.lap("imports")
+
     # Process i/o files
     input_file, input_file_path = _process_infile(input_file, "reports/flake8/flake8stats.txt")
     output_file, output_file_path, is_stdout = _process_outfile(output_file, "flake8-badge.svg")
 
-    # First retrieve the success percentage from the junit xml
+    # Generate the badge again each time the input file(s) change
+    if watch:
+        params = dict(click.get_current_context().params, input_file=input_file)
+        _watch([(gen_flake8_badge, params)], output_file_path, is_stdout, silent)
+        return
+
+    # Nothing to do if the badge is up to date
+    manifest = _get_manifest("flake8", incremental, input_file, output_file_path, is_stdout,
+                             dict(name=name, withname=withname, webshields=webshields))
+    up_to_date = manifest is not None and manifest.is_up_to_date()
+    timings.lap("infiles")
+    if up_to_date:
+        if not silent:
+            click.echo("SUCCESS - Flake8 badge is up to date: %r" % output_file_path)
+        return
+
+    # First retrieve the statistics from the flake8 report, displaying the progress on large files in verbose mode
+    nb_lines_read = [0]
+
+    def _progress(nb_lines, finished):
+        nb_lines_read[0] = nb_lines
+        if not silent and verbose and not finished:
+            click.echo("... %s lines read" % nb_lines, err=True)
+
     try:
-        flake8_stats = get_flake8_stats(flake8_stats_file=input_file)
+        start = time.perf_counter()
+        flake8_stats = get_flake8_stats(flake8_stats_file=input_file, progress=_progress)
+        duration = time.perf_counter() - start
     except FileNotFoundError:
         raise click.exceptions.FileError(input_file, hint="File not found")
+    timings.lap("parse")
 
     if not silent and verbose and not is_stdout:
-        click.echo("""Flake8 statistics parsed successfully from %r
- - Total (%s) = Critical (%s) + Warning (%s) + Info (%s)
-""" % (input_file_path, flake8_stats.nb_total, flake8_stats.nb_critical, flake8_stats.nb_warning, flake8_stats.nb_info))
+        click.echo(_flake8_verbose_msg(input_file_path, flake8_stats, nb_lines=nb_lines_read[0], duration=duration))
 
     # Set badge name
     clear_left_txt = False
@@ -301,14 +555,316 @@ def gen_flake8_badge(
 
     # Generate the badge
     badge = get_flake8_badge(flake8_stats, name)
-    badge.write_to(
-        output_file if is_stdout else output_file_path, 
-        use_shields=webshields, 
-        clear_left_txt=clear_left_txt
-    )
+    timings.lap("stats")
+
+    _setup_shields_cache(shields_cache)
+    svg = badge.as_svg(use_shields=webshields, clear_left_txt=clear_left_txt)
+    timings.lap("fetch" if webshields else "render")
+
+    written = write_svg(svg, output_file if is_stdout else output_file_path, only_if_changed=manifest is not None)
+    if manifest is not None:
+        manifest.save()
+    timings.lap("write")
 
     if not silent and not is_stdout:
-        click.echo("SUCCESS - Flake8 badge created: %r" % str(output_file_path))
+        if verbose:
+            click.echo(_text_width_cache_msg())
+        click.echo("SUCCESS - Flake8 badge %s: %r" % ("created" if written else "unchanged", str(output_file_path)))
+
+
+@genbadge.command(name="all",
+                  short_help="Generate the tests, coverage and flake8 badges at once.")
+@click.option('--tests-input', type=click.Path(dir_okay=False),
+              help=ALL_INFILE_HELP_TMP % ("test results XML", "tests"))
+@click.option('--coverage-input', type=click.Path(dir_okay=False),
+              help=ALL_INFILE_HELP_TMP % ("coverage results XML", "coverage"))
+@click.option('--flake8-input', type=click.Path(dir_okay=False),
+              help=ALL_INFILE_HELP_TMP % ("flake8 results TXT", "flake8"))
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False), default=".",
+              help="An alternate directory where to write the SVG badges.")
+@click.option('-w/-l', '--webshields/--local', type=bool, default=True, help=SHIELDS_HELP)
+@click.option('--shields-cache', type=click.Path(file_okay=False), envvar="GENBADGE_SHIELDS_CACHE",
+              help=SHIELDS_CACHE_HELP)
+@click.option('--incremental', type=bool, default=False, is_flag=True, envvar="GENBADGE_INCREMENTAL",
+              help=INCREMENTAL_HELP)
+@click.option('--watch', type=bool, default=False, is_flag=True, help=WATCH_HELP)
+@click.option('--timings', type=bool, default=False, is_flag=True, expose_value=False, callback=_show_timings,
+              help=TIMINGS_HELP)
+@click.option('--timings-json', type=click.File('wt'), expose_value=False, callback=_save_timings,
+              help=TIMINGS_JSON_HELP)
+@click.option('--profile', type=click.Path(dir_okay=False), expose_value=False, callback=_start_profile,
+              help=PROFILE_HELP)
+@click.option('-v', '--verbose', type=bool, default=False, is_flag=True, help=VERBOSE_HELP)
+@click.option('-s', '--silent', type=bool, default=False, is_flag=True, help=SILENT_HELP)
+def gen_all_badges(
+        tests_input=None,
+        coverage_input=None,
+        flake8_input=None,
+        output_dir=None,
+        webshields=None,
+        shields_cache=None,
+        incremental=None,
+        watch=None,
+        verbose=None,
+        silent=None
+):
+    """
+    This command generates the tests, coverage and flake8 badges in a single
+    run. It is equivalent to running the `tests`, `coverage` and `flake8`
+    commands with their default options, but faster: the input files are parsed
+    concurrently and the badges are rendered together.
+
+    By default the input files are the relative `./reports/junit/junit.xml`,
+    `./reports/coverage/coverage.xml` and `./reports/flake8/flake8stats.txt`.
+    Only the ones that exist are used, so any subset of these files can be
+    present. You can change these settings with the `--tests-input`,
+    `--coverage-input` and `--flake8-input` options.
+
+    The badges are written to `tests-badge.svg`, `coverage-badge.svg` and
+    `flake8-badge.svg` in the current directory. You can change the directory
+    with the `-o/--output-dir` option.
+
+    If a badge can not be generated, the error is reported and the other badges
+    are still generated. The command then fails with exit code 1.
+    """
+    timings = _get_timings()
+    from concurrent.futures import ThreadPoolExecutor
+    from .utils_badge import render_badges
+    timings.lap("imports")
+
+    # Process i/o files
+    jobs = []
+    for kind, input_file in (("tests", tests_input), ("coverage", coverage_input), ("flake8", flake8_input)):
+        default_in_file, default_out_file = _DEFAULT_FILES[kind]
+        if input_file is None:
+            if not Path(default_in_file).exists():
+                continue
+        input_file, input_file_path = _process_infile(input_file, default_in_file)
+        output_file_path = (Path(output_dir) / default_out_file).absolute().as_posix()
+        jobs.append((kind, input_file, input_file_path, output_file_path))
+
+    if len(jobs) == 0:
+        raise click.exceptions.ClickException(
+            "No input file found. Default input files are %s" % ", ".join(repr(f) for f, _ in _DEFAULT_FILES.values())
+        )
+
+    # Generate each badge again each time its input file changes
+    if watch:
+        commands = dict(tests=gen_tests_badge, coverage=gen_coverage_badge, flake8=gen_flake8_badge)
+        _watch([(commands[kind], dict(input_file=input_file, output_file=output_file_path, webshields=webshields,
+                                      shields_cache=shields_cache, incremental=incremental, verbose=verbose,
+                                      silent=silent))
+                for kind, input_file, _, output_file_path in jobs], None, False, silent)
+        return
+
+    # Nothing to do for the badges that are up to date
+    manifests = dict()
+    for job in list(jobs):
+        kind, input_file, _, output_file_path = job
+        manifest = _get_manifest("all", incremental, input_file, output_file_path, False,
+                                 dict(kind=kind, webshields=webshields))
+        if manifest is not None and manifest.is_up_to_date():
+            jobs.remove(job)
+            if not silent:
+                click.echo("SUCCESS - %s badge is up to date: %r" % (kind.capitalize(), output_file_path))
+        else:
+            manifests[output_file_path] = manifest
+    timings.lap("infiles")
+
+    # Parse all input files concurrently. The stages of each job are also recorded, e.g. 'parse (tests)'
+    jobs_timings = [timings.child() for _ in jobs]
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as executor:
+        results = list(executor.map(lambda job, job_timings: _get_stats_and_badge(job[0], job[1], job_timings),
+                                    jobs, jobs_timings))
+    timings.lap("parse")
+    for job, job_timings in zip(jobs, jobs_timings):
+        timings.update(job_timings, job[0])
+
+    nb_errors = 0
+    succeeded = []
+    for (kind, input_file, input_file_path, output_file_path), (stats, badge, error) in zip(jobs, results):
+        if error is not None:
+            nb_errors += 1
+            click.echo("ERROR - %s badge could not be generated from %r: %s"
+                       % (kind.capitalize(), input_file_path, error), err=True)
+            continue
+
+        if not silent and verbose:
+            click.echo(_VERBOSE_MSGS[kind](input_file_path, stats))
+        succeeded.append((kind, output_file_path, badge))
+
+    # Render all badges together
+    _setup_shields_cache(shields_cache)
+    svgs = list(render_badges([badge for _, _, badge in succeeded], use_shields=webshields))
+    timings.lap("fetch" if webshields else "render")
+    if not silent and verbose:
+        click.echo(_text_width_cache_msg())
+
+    for (kind, output_file_path, badge), svg in zip(succeeded, svgs):
+        manifest = manifests[output_file_path]
+        written = write_svg(svg, output_file_path, only_if_changed=manifest is not None)
+        if manifest is not None:
+            manifest.save()
+        if not silent:
+            click.echo("SUCCESS - %s badge %s: %r"
+                       % (kind.capitalize(), "created" if written else "unchanged", output_file_path))
+    timings.lap("write")
+
+    if nb_errors > 0:
+        raise click.exceptions.ClickException("%s badge(s) could not be generated" % nb_errors)
+
+
+@genbadge.command(name="serve",
+                  short_help="Serve the badges over HTTP, generated on demand from the reports.")
+@click.option('-r', '--root', type=click.Path(exists=True, file_okay=False), default=".",
+              help="The folder containing the reports to serve.")
+@click.option('-h', '--host', type=str, default="127.0.0.1", help="The address to listen on.")
+@click.option('-p', '--port', type=int, default=8080, help="The port to listen on.")
+@click.option('--cache-size', type=int, default=1024, help="The maximum number of rendered badges kept in memory.")
+@click.option('-s', '--silent', type=bool, default=False, is_flag=True, help=SILENT_HELP)
+def serve_badges(
+        root=None,
+        host=None,
+        port=None,
+        cache_size=None,
+        silent=None
+):
+    """
+    This command starts an HTTP server generating the badges on demand, so
+    that they do not need to be committed:
+
+     - `/tests`, `/coverage` and `/flake8` return the badge for the default
+       report file in the `-r/--root` folder, e.g.
+       `./reports/junit/junit.xml` for the tests badge.
+
+     - `/tests/<path>`, `/coverage/<path>` and `/flake8/<path>` use the
+       report in subfolder `<path>` of the root folder instead, so that the
+       badges of many repositories can be served at once.
+
+     - `/badge/<label>/<message>/<color>` returns a static badge, where color
+       is a color name such as `green` or an hexadecimal code such as `4c1`.
+
+    The left-hand side text of the report badges can be changed with the
+    `name` query parameter, e.g. `/coverage?name=cov`.
+
+    The badges are generated from the local SVG template and kept in memory:
+    the reports are only parsed again when they change. They are sent with an
+    `ETag` header so that clients can revalidate them cheaply.
+    """
+    from .utils_server import serve
+
+    def _on_start(address):
+        if not silent:
+            click.echo("Serving the badges of %r on http://%s:%s/. Press Ctrl+C to stop." % ((root,) + address))
+
+    try:
+        serve(root=root, host=host, port=port, cache_size=cache_size, on_start=_on_start)
+    except KeyboardInterrupt:
+        pass
+
+
+# Default input and output files for each kind of badge
+_DEFAULT_FILES = {
+    "tests": ("reports/junit/junit.xml", "tests-badge.svg"),
+    "coverage": ("reports/coverage/coverage.xml", "coverage-badge.svg"),
+    "flake8": ("reports/flake8/flake8stats.txt", "flake8-badge.svg"),
+}
+
+
+def _get_stats_and_badge(kind, input_file, timings=NO_TIMINGS):
+    """
+    Parses `input_file` and creates the badge for `kind` ("tests", "coverage" or "flake8").
+    Returns a tuple (stats, badge, error) where error is an error message or None if parsing succeeded.
+    """
+    try:
+        if kind == "tests":
+            from .utils_junit import get_test_stats, get_tests_badge
+            stats = get_test_stats(junit_xml_file=input_file)
+            timings.lap("parse")
+            _check_test_stats(stats)
+            badge = get_tests_badge(stats)
+        elif kind == "coverage":
+            from .utils_coverage import get_coverage_badge, get_coverage_stats
+            stats = get_coverage_stats(coverage_xml_file=input_file)
+            timings.lap("parse")
+            badge = get_coverage_badge(stats)
+        elif kind == "flake8":
+            from .utils_flake8 import get_flake8_stats, get_flake8_badge
+            stats = get_flake8_stats(flake8_stats_file=input_file)
+            timings.lap("parse")
+            badge = get_flake8_badge(stats)
+        else:
+            raise ValueError("Unknown badge kind: %r" % kind)
+        timings.lap("stats")
+    except FileNotFoundError:
+        return None, None, "File not found"
+    except click.exceptions.ClickException as e:
+        return None, None, e.format_message()
+    except Exception as e:
+        return None, None, "%s: %s" % (e.__class__.__name__, e)
+
+    return stats, badge, None
+
+
+def _tests_verbose_msg(input_file_path, test_stats):
+    """Returns the verbose message describing the test statistics"""
+    return """Test statistics parsed successfully from %r
+ - Nb tests: Total (%s) = Success (%s) + Skipped (%s) + Failed (%s) + Errors (%s)
+ - Success percentage: %.2f%% (%s / %s) (Skipped tests are excluded)
+""" % (input_file_path, test_stats.total_with_skipped, test_stats.success, test_stats.skipped, test_stats.failed,
+       test_stats.errors, test_stats.success_percentage, test_stats.success, test_stats.total_without_skipped)
+
+
+def _check_test_stats(test_stats):
+    """Sanity check of the test statistics"""
+    if test_stats.total_with_skipped != test_stats.success + test_stats.skipped + test_stats.failed + test_stats.errors:
+        raise click.exceptions.ClickException(
+            "Inconsistent junit results: the sum of all kind of tests is not equal to the total. Please report this "
+            "issue if you think your file is correct. Details: %r" % test_stats
+        )
+
+
+def _coverage_verbose_msg(input_file_path, cov_stats):
+    """Returns the verbose message describing the coverage statistics"""
+    return """Coverage results parsed successfully from %(ifp)r
+ - Branch coverage: %(bcp).2f%% (%(bc)s/%(bv)s)
+ - Line coverage: %(lcp).2f%% (%(lc)s/%(lv)s)
+ - Total coverage: %(tcp).2f%% ((%(bc)s+%(lc)s)/(%(bv)s+%(lv)s))
+""" % dict(ifp=input_file_path, tcp=cov_stats.total_coverage,
+           bcp=cov_stats.branch_coverage, bc=cov_stats.branches_covered, bv=cov_stats.branches_valid,
+           lcp=cov_stats.line_coverage, lc=cov_stats.lines_covered, lv=cov_stats.lines_valid)
+
+
+def _flake8_verbose_msg(input_file_path, flake8_stats, nb_lines=None, duration=None):
+    """Returns the verbose message describing the flake8 statistics, and the parsing time if provided"""
+    msg = """Flake8 statistics parsed successfully from %r
+ - Total (%s) = Critical (%s) + Warning (%s) + Info (%s)
+""" % (input_file_path, flake8_stats.nb_total, flake8_stats.nb_critical, flake8_stats.nb_warning, flake8_stats.nb_info)
+    if duration is not None:
+        msg += " - Read %s lines in %.3fs\n" % (nb_lines, duration)
+    return msg
+
+
+_VERBOSE_MSGS = {
+    "tests": _tests_verbose_msg,
+    "coverage": _coverage_verbose_msg,
+    "flake8": _flake8_verbose_msg,
+}
+
+
+def _setup_shields_cache(shields_cache):
+    """Enables the on-disk cache of shields.io badges if a cache directory is provided"""
+    if shields_cache is not None:
+        set_shields_cache(shields_cache,
+                          ttl=float(os.environ.get("GENBADGE_SHIELDS_CACHE_TTL", DEFAULT_CACHE_TTL)),
+                          max_size=int(os.environ.get("GENBADGE_SHIELDS_CACHE_MAX_SIZE", DEFAULT_CACHE_MAX_SIZE)))
+
+
+def _text_width_cache_msg():
+    """Returns a message with the text width cache statistics, for the verbose mode"""
+    info = text_width_cache_info()
+    return "Text width cache: %s hits, %s misses (%s/%s entries)" \
+           % (info.hits, info.misses, info.currsize, info.maxsize)
 
 
 def _process_infile(input_file, default_in_file):
@@ -325,6 +881,107 @@ def _process_infile(input_file, default_in_file):
     return input_file, input_file_path
 
 
+def _process_infiles(input_files, default_in_file):
+    """Common in file processor for the commands accepting several input files"""
+
+    if len(input_files) <= 1:
+        return _process_infile(input_files[0] if input_files else None, default_in_file)
+
+    input_files, input_file_paths = zip(*(_process_infile(f, None) for f in input_files))
+    return list(input_files), ", ".join(input_file_paths)
+
+
+def _as_file_paths(input_files, option):
+    """Returns the paths of the input files opened by click, for the `option` that can only be used with paths"""
+    file_paths = []
+    for input_file in (input_files if isinstance(input_files, list) else [input_files]):
+        if not isinstance(input_file, str):
+            input_file_path = getattr(input_file, "name", "-")
+            if input_file_path in ("-", "<stdin>"):
+                raise click.exceptions.UsageError("<stdin> is not supported with %s" % option)
+            input_file.close()
+            input_file = input_file_path
+        file_paths.append(input_file)
+
+    return file_paths if len(file_paths) > 1 else file_paths[0]
+
+
+def _watch(jobs, output_file_path, is_stdout, silent):
+    """
+    Runs each (command, params) job once, and then again each time one of its input files changes, until interrupted.
+    The `output_file_path` of the single commands is set in their params.
+    """
+    from .utils_watch import watch_files
+
+    if is_stdout:
+        raise click.exceptions.UsageError("<stdout> is not supported with --watch")
+
+    # the input files are read from their path each time
+    jobs_input_files = []
+    for command, params in jobs:
+        input_files = _as_file_paths(params["input_file"], "--watch")
+        if not isinstance(input_files, list):
+            input_files = [input_files]
+        input_files = [Path(f).absolute().as_posix() for f in input_files]
+        jobs_input_files.append(input_files)
+        multiple = any(p.name == "input_file" and p.multiple for p in command.params)
+        params["input_file"] = input_files if multiple else input_files[0]
+        if output_file_path is not None:
+            params["output_file"] = output_file_path
+        params["watch"] = False
+
+    ctx = click.get_current_context()
+    timings = _get_timings()
+
+    def _run(changed):
+        for (command, params), input_files in zip(jobs, jobs_input_files):
+            if changed is not None and not any(f in changed for f in input_files):
+                continue
+            # the stages of all runs are summed, without the time spent waiting for changes
+            timings.restart()
+            try:
+                ctx.invoke(command, **params)
+            except click.exceptions.ClickException as e:
+                click.echo("ERROR - %s" % e.format_message(), err=True)
+            except Exception as e:
+                # the watch goes on, e.g. until the input file is fixed
+                click.echo("ERROR - %r" % e, err=True)
+
+    _run(None)
+    input_files = sorted({f for input_files in jobs_input_files for f in input_files})
+    if not silent:
+        click.echo("Watching %s for changes. Press Ctrl+C to stop." % ", ".join(repr(f) for f in input_files))
+    try:
+        watch_files(input_files, _run)
+    except KeyboardInterrupt:
+        pass
+
+
+def _get_manifest(command, incremental, input_files, output_file_path, is_stdout, options):
+    """
+    Returns the `BadgeManifest` used to only generate the badge when something changed, or None if `incremental` is
+    False or if a standard stream is used.
+    """
+    if not incremental or is_stdout:
+        return None
+
+    input_paths = []
+    for input_file in (input_files if isinstance(input_files, list) else [input_files]):
+        if isinstance(input_file, str):
+            try:
+                input_paths += [Path(f).absolute().as_posix() for f in expand_glob_pattern(input_file)]
+            except FileNotFoundError:
+                return None  # reported when parsing
+        else:
+            input_file_path = getattr(input_file, "name", "-")
+            if input_file_path in ("-", "<stdin>"):
+                return None
+            input_paths.append(Path(input_file_path).absolute().as_posix())
+
+    from .utils_manifest import BadgeManifest
+    return BadgeManifest(output_file_path, command, options, input_paths)
+
+
 def _process_outfile(output_file, default_out_file):
     """Common out file processor"""
 
@@ -3,9 +3,13 @@
 #
 #  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
 import os
+import re
 import sys
+from functools import lru_cache
+from warnings import warn
 
-from PIL import ImageFont
+from . import verdana_11_metrics
+from .utils_shields import get_shields_svg, get_shields_svgs, ShieldsError, DEFAULT_MAX_WORKERS
 
 try:
     from pathlib import Path
@@ -13,7 +17,7 @@ except ImportError:  # pragma: no cover
     from pathlib2 import Path  # python 2
 
 try:
-    from typing import Union
+    from typing import Any, Dict, Iterable, Iterator, Union, Optional
 except ImportError:  # pragma: no cover
     pass
 
@@ -58,73 +62,117 @@ class Badge:
         return "[ %s | %s ]  color: %s" % (self.left_txt, self.right_txt, self.color)
 
     def as_svg(self,
-               use_shields=False  # type: bool
+               use_shields=False,       # type: bool
+               fallback_to_local=True,  # type: bool
+               clear_left_txt=False     # type: bool
                ):
         """Return a string containing the SVG representation of this badge
 
-        :param use_shields:
+        :param use_shields: a boolean indicating if the badge should be downloaded from shields.io (True) or
+            generated from the local SVG template (False, default)
+        :param fallback_to_local: when `use_shields` is True, a boolean indicating if the local SVG template should be
+            used when the download from shields.io fails or times out (True, default). Otherwise a `ShieldsError` is
+            raised.
+        :param clear_left_txt: if True, the left-hand side text is removed from the SVG but the left-hand side of the
+            badge is kept.
         :return:
         """
-        if not use_shields:
+        svg = None
+        if use_shields:
+            # download from shields.io (or from the on-disk cache if enabled)
+            try:
+                svg = get_shields_svg(left_txt=self.left_txt, right_txt=self.right_txt, color=self.color)
+            except ShieldsError as e:
+                if not fallback_to_local:
+                    raise
+                warn("%s. Using the local SVG template instead." % e)
+
+        if svg is None:
             # generate from our local file template
-            return get_svg_badge(label_txt=self.left_txt, msg_txt=self.right_txt, color=self.color)
-        else:
-            # download from requests
-            import requests
-            # url encode test
-            safe_left_txt = requests.utils.quote(self.left_txt, safe='')
-            safe_right_txt = requests.utils.quote(self.right_txt, safe='')
-            safe_color_txt = requests.utils.quote(self.color, safe='')         
-            url = 'https://img.shields.io/badge/%s-%s-%s.svg' % (safe_left_txt, safe_right_txt, safe_color_txt)
-            response = requests.get(url, stream=True)
-            return response.text
+            svg = get_svg_badge(label_txt=self.left_txt, msg_txt=self.right_txt, color=self.color)
+
+        if clear_left_txt:
+            svg = svg.replace(">" + escape_xml(self.left_txt) + "<", "><")
+        return svg
 
     def write_to(self,
                  path_or_stream,              # type: Union[TextIO, str, Path]
                  use_shields=False,  # type: bool
-                 clear_left_txt=False  # type: bool 
+                 clear_left_txt=False,  # type: bool
+                 only_if_changed=False  # type: bool
                  ):
+        # type: (...) -> bool
         """Write the SVG representation of this badge to the given file
 
         :param path_or_stream:
         :param use_shields:
         :param clear_left_txt:
-        :return:
+        :param only_if_changed: if True, an existing badge file is only rewritten if its contents change.
+        :return: True if the badge was written, False if the existing badge file was left as is.
         """
-        # convert to a Path
-        if isinstance(path_or_stream, str):
-            path_or_stream = Path(path_or_stream)
+        svg = self.as_svg(use_shields=use_shields, clear_left_txt=clear_left_txt)
+        return write_svg(svg, path_or_stream, only_if_changed=only_if_changed)
 
-        svg = self.as_svg(use_shields=use_shields)
-        if clear_left_txt:
-            svg = svg.replace(">" + self.left_txt + "<", "><")
+
+def write_svg(svg,                  # type: str
+              path_or_stream,       # type: Union[TextIO, str, Path]
+              only_if_changed=False  # type: bool
+              ):
+    # type: (...) -> bool
+    """
+    Writes the `svg` string to the given file path or text stream. Parent directories are created if needed.
+
+    With `only_if_changed`, an existing file with the same contents is left untouched so that its modification time
+    does not change. Returns True if the svg was written, False otherwise.
+    """
+    # convert to a Path
+    if isinstance(path_or_stream, str):
+        path_or_stream = Path(path_or_stream)
+
+    if isinstance(path_or_stream, Path):
+        svg_bytes = svg.encode("utf-8")
+        if only_if_changed:
+            try:
+                if path_or_stream.read_bytes() == svg_bytes:
+                    return False
+            except (IOError, OSError):
+                pass  # no badge yet
 
         # create parent dirs if needed
-        if isinstance(path_or_stream, Path):
-            path_or_stream.parent.mkdir(parents=True, exist_ok=True)
+        path_or_stream.parent.mkdir(parents=True, exist_ok=True)
 
-            # finally write to
-            with open(str(path_or_stream), mode="wb") as f:
-                f.write(svg.encode("utf-8"))
-        else:
-            path_or_stream.write(svg)
+        # finally write to
+        with open(str(path_or_stream), mode="wb") as f:
+            f.write(svg_bytes)
+    else:
+        path_or_stream.write(svg)
+
+    return True
 
 
 def get_svg_badge(
         label_txt,    # type: str
         msg_txt,   # type: str
         color,       # type: str
-        label_color=None
+        label_color=None,
+        template=None,  # type: Union[str, CompiledTemplate]
+        color_hexa=None  # type: str
 ):
     # type: (...) -> str
     """
-    Reads the SVG template from the package,
+    Reads the SVG template from the package (or uses the custom `template` string or compiled template if provided),
     fills the various information from args and returns the svg string
+
+    `color_hexa` can be provided to skip the resolution of `color` when it was already resolved with `get_color`, e.g.
+    when rendering many badges.
     """
     all_text = "%s: %s" % (label_txt, msg_txt) if label_txt else ("%s" % msg_txt)
 
     # Same principle as in shields.io
-    template = get_local_badge_template()
+    if template is None:
+        template = get_local_badge_template()
+    if not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
 
     horiz_padding = 5
     vertical_margin = 0
@@ -141,7 +189,6 @@ def get_svg_badge(
         https://github.com/badges/shields/blob/4415d07e8b5bf794e6675cea052cc644d0c81bb5/badge-maker/lib/badge-renderers.js#L113
         """
         text_length = preferred_width_of(content, font_size=11, font_name="Verdana")
-        # todo content = escape_xml(content)
         shadow_margin = 150 + vertical_margin
         text_margin = 140 + vertical_margin
         out_text_length = 10 * text_length
@@ -169,10 +216,11 @@ def get_svg_badge(
 
     total_width = left_width + right_width
 
+    # the texts are measured as displayed, and escaped when inserted in the xml
     to_replace = {
-        "title": all_text,
+        "title": escape_xml(all_text),
         "label_color": get_color(label_color),
-        "color": get_color(color),
+        "color": color_hexa if color_hexa is not None else get_color(color),
         "total_width": total_width,
         "left_width": left_width,
         "right_width": right_width,
@@ -181,18 +229,117 @@ def get_svg_badge(
         "left_shadow_margin": label_shadow_margin,
         "left_text_margin": label_text_margin,
         "left_out_text_length": label_text_length,
-        "left_text": label_txt,
+        "left_text": escape_xml(label_txt),
         # msg text
         "right_x": msg_x,
         "right_shadow_margin": msg_shadow_margin,
         "right_text_margin": msg_text_margin,
         "right_out_text_length": msg_text_length,
-        "right_text": msg_txt
+        "right_text": escape_xml(msg_txt)
     }
-    for k, v in to_replace.items():
-        template = template.replace("{{ %s }}" % k, str(v))
+    return template.render(to_replace)
 
-    return template
+
+def render_badges(badges,                  # type: Iterable[Badge]
+                  use_shields=False,       # type: bool
+                  template=None,           # type: str
+                  fallback_to_local=True,  # type: bool
+                  max_workers=DEFAULT_MAX_WORKERS  # type: int
+                  ):
+    # type: (...) -> Iterator[str]
+    """
+    Renders many badges in one call, and yields their SVG representations in the same order as `badges`.
+
+    The template is compiled and each color is resolved only once for the whole batch. Badges with identical
+    (left_txt, right_txt, color) are only rendered once. When `use_shields` is True, the badges are downloaded from
+    shields.io concurrently.
+
+    :param badges: an iterable of `Badge` instances
+    :param use_shields: a boolean indicating if the badges should be downloaded from shields.io (True) or generated
+        from the local SVG template (False, default)
+    :param template: an optional custom SVG template string to use instead of the local template. Ignored when
+        `use_shields` is True, except for the badges that can not be downloaded.
+    :param fallback_to_local: when `use_shields` is True, a boolean indicating if the local SVG template should be
+        used for badges that can not be downloaded from shields.io (True, default). Otherwise a `ShieldsError` is
+        raised.
+    :param max_workers: when `use_shields` is True, the maximum number of badges downloaded concurrently.
+    :return: a generator of SVG strings
+    """
+    rendered = dict()
+    if use_shields:
+        # download all distinct badges concurrently first
+        badges = list(badges)
+        keys = list(dict.fromkeys((b.left_txt, b.right_txt, b.color) for b in badges))
+        svgs = get_shields_svgs(keys, max_workers=max_workers, return_errors=fallback_to_local)
+        for key, svg in zip(keys, svgs):
+            if isinstance(svg, ShieldsError):
+                warn("%s. Using the local SVG template instead." % svg)
+            else:
+                rendered[key] = svg
+
+    compiled_template = None
+    colors = dict()
+    for badge in badges:
+        key = (badge.left_txt, badge.right_txt, badge.color)
+        try:
+            svg = rendered[key]
+        except KeyError:
+            if compiled_template is None:
+                compiled_template = compile_template(template if template is not None else get_local_badge_template())
+            try:
+                color_hexa = colors[badge.color]
+            except KeyError:
+                color_hexa = colors[badge.color] = get_color(badge.color)
+            svg = rendered[key] = get_svg_badge(label_txt=badge.left_txt, msg_txt=badge.right_txt, color=badge.color,
+                                                template=compiled_template, color_hexa=color_hexa)
+        yield svg
+
+
+# Placeholders in the SVG templates look like {{ name }}
+_SLOT_PATTERN = re.compile(r"\{\{ (\w+) \}\}")
+
+
+def escape_xml(txt  # type: str
+               ):
+    # type: (...) -> str
+    """
+    Escapes the special xml characters of a badge text, so that it can be inserted in the SVG. This is what
+    `xml.sax.saxutils.escape` does, without importing it (it imports `urllib.request`, which slows the startup down)
+    """
+    return txt.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+class CompiledTemplate(object):
+    """
+    A SVG template compiled into a list of static chunks and slots, so that rendering is a single join.
+    """
+    def __init__(self,
+                 template  # type: str
+                 ):
+        # split() returns the static chunks at even indices and the slot names at odd indices
+        self.chunks = _SLOT_PATTERN.split(template)
+        self.slots = tuple((i, self.chunks[i]) for i in range(1, len(self.chunks), 2))
+
+    def render(self,
+               values  # type: Dict[str, Any]
+               ):
+        # type: (...) -> str
+        """Returns the template filled with `values`. Slots without value are left untouched."""
+        chunks = list(self.chunks)
+        for i, name in self.slots:
+            try:
+                chunks[i] = str(values[name])
+            except KeyError:
+                chunks[i] = "{{ %s }}" % name
+        return "".join(chunks)
+
+
+@lru_cache(maxsize=8)
+def compile_template(template  # type: str
+                     ):
+    # type: (...) -> CompiledTemplate
+    """Compiles the SVG `template` string. Compiled templates are cached, so this can be called repeatedly."""
+    return CompiledTemplate(template)
 
 
 def _resource_string(package, resource_name):
@@ -217,6 +364,8 @@ def _resource_filename(package, resource_name):
 
         return resource_filename(package, resource_name)
 
+
+@lru_cache(maxsize=1)
 def get_local_badge_template():
     """Reads the SVG file template fgrom the package resources"""
     template_path = "badge-template.svg"
@@ -245,28 +394,113 @@ def round_up_to_odd(val):
     return (val + 1) if (val % 2 == 0) else val
 
 
-def preferred_width_of(txt, font_name, font_size):
-    # Increase chances of pixel grid alignment.
+# Font files that could not be found by the OS font lookup. They are remembered so that the failing probe is not
+# repeated every time a new font/size is loaded.
+_OS_FONTS_NOT_FOUND = set()
+
+
+@lru_cache(maxsize=16)
+def get_font(font_name,  # type: str
+             font_size   # type: int
+             ):
+    """
+    Return the FreeType font with name `font_name` and size `font_size`.
+
+    The font is first looked up by name in the OS. If it can not be found there, the font file embedded in this package
+    is used. Loaded fonts are kept in a process-wide LRU cache keyed by (font_name, font_size) so that the TTF file is
+    only parsed once.
+    """
+    from PIL import ImageFont
+
     font_file = "%s.ttf" % font_name.lower()
-    try:
-        # Try from name only - this works if the font is known by the OS
-        font = ImageFont.truetype(font=font_file, size=font_size)
-    except (IOError if sys.version_info < (3,) else OSError):
-        # Font not found: use the embedded font file from the package
+    if font_file not in _OS_FONTS_NOT_FOUND:
+        try:
+            # Try from name only - this works if the font is known by the OS
+            return ImageFont.truetype(font=font_file, size=font_size)
+        except (IOError if sys.version_info < (3,) else OSError):
+            # Font not found: remember it so as not to try again
+            _OS_FONTS_NOT_FOUND.add(font_file)
+
+    # Use the embedded font file from the package
+    font_path = _resource_filename("genbadge", font_file)
+    if not os.path.exists(font_path):
+        # error when running on python 2 inside the CliInvoker from click with a change of os.cwd.
+        import genbadge
+        reload(genbadge)  # noqa
         font_path = _resource_filename("genbadge", font_file)
-        if not os.path.exists(font_path):
-            # error when running on python 2 inside the CliInvoker from click with a change of os.cwd.
-            import genbadge
-            reload(genbadge)  # noqa
-            font_path = _resource_filename("genbadge", font_file)
-
-        font = ImageFont.truetype(font=font_path, size=font_size)
-
-    # PLI.FreeTypeFont does not have a getsize() method, however, the FreeTypeFont class is not part of PLI's API.
-    # Thus, we can not use isinstance(font, FreeTypeFont) here.
-    getsize = getattr(font, "getsize", None)
-    if callable(getsize):
-        width = font.getsize(txt)[0]
-    else:
-        width = font.getbbox(txt)[2]  # exists for FreeTypeFont in PLI >= v10.0.0
+
+    return ImageFont.truetype(font=font_path, size=font_size)
+
+
+def metrics_width_of(txt  # type: str
+                     ):
+    # type: (...) -> Optional[int]
+    """
+    Return the width in pixels of `txt` written with the embedded Verdana font at size 11, computed from the
+    precomputed glyph metrics in `verdana_11_metrics`. This is a pure-python equivalent of
+    `get_font("Verdana", 11).getbbox(txt)[2]`, that does not require pillow.
+
+    Returns None if `txt` contains a character that is not in the metrics table.
+    """
+    if not txt:
+        return 0
+
+    advances = verdana_11_metrics.ADVANCES
+    kerning = verdana_11_metrics.KERNING
+    try:
+        # pen position before the last glyph, in 26.6 fixed point units
+        pen = sum(advances[c] for c in txt[:-1])
+        right_edge = verdana_11_metrics.RIGHT_EDGES[txt[-1]]
+    except KeyError:
+        return None
+
+    pen += sum(kerning.get(txt[i:i + 2], 0) for i in range(len(txt) - 1))
+
+    # round the pen position to the nearest pixel, as FreeType does
+    return ((pen + 32) >> 6) + right_edge
+
+
+def _preferred_width_of(txt, font_name, font_size):
+    """Non-memoized version of `preferred_width_of`"""
+    width = None
+    if font_size == verdana_11_metrics.FONT_SIZE and font_name.lower() == verdana_11_metrics.FONT_NAME.lower():
+        # Fast path: use the precomputed metrics table, no need to load the font
+        width = metrics_width_of(txt)
+
+    if width is None:
+        font = get_font(font_name, font_size)
+
+        # PLI.FreeTypeFont does not have a getsize() method, however, the FreeTypeFont class is not part of PLI's API.
+        # Thus, we can not use isinstance(font, FreeTypeFont) here.
+        getsize = getattr(font, "getsize", None)
+        if callable(getsize):
+            width = font.getsize(txt)[0]
+        else:
+            width = font.getbbox(txt)[2]  # exists for FreeTypeFont in PLI >= v10.0.0
+
+    # Increase chances of pixel grid alignment.
     return round_up_to_odd(width)
+
+
+# Default maximum number of (txt, font_name, font_size) entries memoized by `preferred_width_of`
+TEXT_WIDTH_CACHE_SIZE = 1024
+
+# Memoized text width computation - see `set_text_width_cache_size` to change the cache size
+preferred_width_of = lru_cache(maxsize=TEXT_WIDTH_CACHE_SIZE)(_preferred_width_of)
+
+
+def set_text_width_cache_size(maxsize  # type: Optional[int]
+                              ):
+    """
+    Changes the maximum number of text widths memoized by `preferred_width_of`. The current cache content and hit/miss
+    counters are discarded. Use `maxsize=None` for an unbounded cache and `maxsize=0` to disable memoization.
+    """
+    global preferred_width_of
+    preferred_width_of = lru_cache(maxsize=maxsize)(_preferred_width_of)
+
+
+def text_width_cache_info():
+    """
+    Returns the statistics of the `preferred_width_of` cache, as a named tuple (hits, misses, maxsize, currsize).
+    """
+    return preferred_width_of.cache_info()
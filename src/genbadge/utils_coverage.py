@@ -4,7 +4,15 @@
 #  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
 from __future__ import division
 
+import re
+
 from .utils_badge import Badge
+from .utils_io import is_multiple_sources, split_sources, map_in_processes, read_head, open_binary_source
+
+try:
+    from typing import Dict, FrozenSet, Iterable, Optional, Tuple, Union
+except ImportError:  # pragma: no cover
+    pass
 
 try:
     # security patch: see https://docs.python.org/3/library/xml.etree.elementtree.html
@@ -22,10 +30,14 @@ except ImportError as e:
 class CoverageStats(object):
     """
     Contains the results from parsing the coverage.xml.
+
+    When the details were requested (see `get_coverage_stats`), `packages` and `files` contain the `CoverageStats` of
+    each package and each source file, by name. Otherwise they are None.
     """
     def __init__(self,
                  branches_covered=None, branches_valid=None, branch_option=None,
                  complexity=None, lines_covered=None, lines_valid=None,
+                 packages=None, files=None
                  ):
         self.complexity = complexity
 
@@ -36,6 +48,9 @@ class CoverageStats(object):
         self.lines_covered = lines_covered
         self.lines_valid = lines_valid
 
+        self.packages = packages  # type: Optional[Dict[str, CoverageStats]]
+        self.files = files  # type: Optional[Dict[str, CoverageStats]]
+
     @property
     def branch_rate(self):
         """
@@ -87,26 +102,117 @@ class CoverageStats(object):
         return self.total_rate * 100
 
 
-def get_coverage_stats(coverage_xml_file):
+def get_coverage_stats(coverage_xml_file,
+                       details=False,     # type: bool
+                       max_workers=None,  # type: int
+                       input_format=None  # type: str
+                       ):
     # type: (...) -> CoverageStats
     """
-    Reads a coverage.xml file
+    Reads a coverage file. Its format is detected from its first bytes (see `detect_coverage_format`), unless
+    `input_format` is provided: one of 'xml' (Cobertura-style coverage.xml, described below), 'lcov' (LCOV tracefile,
+    see `utils_lcov`), 'jacoco' (JaCoCo xml report, see `utils_jacoco`) or 'coveragepy' (coverage.py data file, see
+    `utils_coveragepy`).
+
+    A coverage.xml file
 
     <coverage branch-rate="0.6" branches-covered="24" branches-valid="40" complexity="0" line-rate="0.8586"
               lines-covered="170" lines-valid="198" timestamp="1620747625339" version="5.5">
     </coverage>
+
+    By default only the root element is read. If `details=True`, the whole file is read in a single streaming pass to
+    also compute the per-package and per-file stats, available in `packages` and `files`.
+
+    A glob pattern (e.g. "reports/coverage/*.xml") or a list of file paths, glob patterns and streams can also be
+    provided, for example when the tests are sharded. The files are then read in parallel (in up to `max_workers`
+    processes, default is the number of CPUs) and merged as `coverage combine` would do: the hits of each line and
+    branch of each source file are unioned, so that a line covered in several files is only counted once. This is only
+    possible with the 'xml' and 'coveragepy' formats.
     """
-    if isinstance(coverage_xml_file, str):
-        # assume a file path
-        with open(coverage_xml_file) as f:
-            cov_stats = parse_cov(f)
+    if input_format is None:
+        input_format = detect_coverage_format(coverage_xml_file)
+
+    if input_format == "coveragepy":
+        from .utils_coveragepy import get_coveragepy_stats
+        return get_coveragepy_stats(coverage_xml_file, details=details)
+    elif input_format != "xml":
+        if is_multiple_sources(coverage_xml_file):
+            raise ValueError("Several coverage files can only be merged in the 'xml' and 'coveragepy' formats, not %r"
+                             % input_format)
+        parse = _get_parser(input_format)
+    else:
+        parse = parse_cov
+
+    if is_multiple_sources(coverage_xml_file):
+        # several files: read their line hits in parallel and merge them
+        file_paths, streams = split_sources(coverage_xml_file)
+        all_hits = [get_coverage_line_hits(stream) for stream in streams]
+        all_hits += map_in_processes(get_coverage_line_hits, file_paths, max_workers=max_workers)
+        if not all_hits:
+            raise ValueError("No coverage xml file was provided")
+        cov_stats = merge_coverage_line_hits(all_hits, details=details)
     else:
-        # assume a stream already
-        cov_stats = parse_cov(coverage_xml_file)
+        # a file path (memory-mapped) or a stream
+        with open_binary_source(coverage_xml_file) as f:
+            cov_stats = parse(f, details=details)
 
     return cov_stats
 
 
+# the supported coverage file formats
+COVERAGE_FORMATS = ("xml", "lcov", "jacoco", "coveragepy")
+
+# the first element of an xml document, skipping the xml declaration, comments and DOCTYPE
+_XML_ROOT_TAG_PATTERN = re.compile(br"<([A-Za-z_][\w.:-]*)")
+_LCOV_HEAD_PATTERN = re.compile(br"(TN|SF):")
+
+
+def detect_coverage_format(source):
+    # type: (...) -> str
+    """
+    Returns the format of coverage file `source` (a file path or stream, or a list of them), detected from its first
+    bytes: 'xml' for a Cobertura-style coverage.xml, 'jacoco' for a JaCoCo xml report, 'lcov' for an LCOV tracefile or
+    'coveragepy' for a coverage.py data file. With several sources, only the first one is looked at. 'xml' is returned
+    for streams that can not be peeked at, and a `ValueError` is raised if the format is not recognized.
+    """
+    if is_multiple_sources(source):
+        file_paths, streams = split_sources(source)
+        if not file_paths and not streams:
+            raise ValueError("No coverage file was provided")
+        source = file_paths[0] if file_paths else streams[0]
+
+    head = read_head(source)
+    if head is None:
+        return "xml"
+
+    if head.startswith(b"SQLite format 3\x00"):
+        return "coveragepy"
+
+    head = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"<"):
+        match = _XML_ROOT_TAG_PATTERN.search(head)
+        return "jacoco" if match is not None and match.group(1) == b"report" else "xml"
+    elif _LCOV_HEAD_PATTERN.match(head):
+        return "lcov"
+    else:
+        raise ValueError("Unable to detect the format of the coverage file %r, please specify it explicitly. "
+                         "Supported formats: %s" % (getattr(source, "name", source), ", ".join(COVERAGE_FORMATS)))
+
+
+def _get_parser(input_format  # type: str
+                ):
+    """Returns the `parse(source, details)` function for `input_format`, importing its module only when needed"""
+    if input_format == "lcov":
+        from .utils_lcov import parse_lcov
+        return parse_lcov
+    elif input_format == "jacoco":
+        from .utils_jacoco import parse_jacoco
+        return parse_jacoco
+    else:
+        raise ValueError("Unsupported coverage format: %r. Supported formats: %s"
+                         % (input_format, ", ".join(COVERAGE_FORMATS)))
+
+
 def get_color(
         cov_stats  # type: CoverageStats
 ):
@@ -138,34 +244,84 @@ def get_coverage_badge(
     return Badge(left_txt=left_txt, right_txt=right_txt, color=color)
 
 
-def parse_cov(source):
+def parse_cov(source,
+              details=False  # type: bool
+              ):
     """Parses the coverage.xml contents from source"""
-    return CovParser().parse(source)
+    return CovParser(details=details).parse(source)
+
+
+# the branches info of a <line> element, e.g. condition-coverage="50% (1/2)"
+_CONDITION_COVERAGE_PATTERN = re.compile(r"\((\d+)/(\d+)\)")
 
 
 class CovParser(object):
     """Parser class - inspired by the code in `xunitparser`"""
 
+    # the totals in the attributes of the root element. When they are missing they are computed from the classes
+    ROOT_ATTRIBUTES = ('branches-covered', 'branches-valid', 'lines-covered', 'lines-valid')
+
+    def __init__(self,
+                 details=False  # type: bool
+                 ):
+        self.details = details
+
     def parse(self, source):
-        xml = defused_etree.parse(source)
-        root = xml.getroot()
-        return self.parse_root(root)
+        # Incremental parsing: all the information is in the attributes of the root element, so unless details are
+        # needed we stop parsing right after its start tag. Only the beginning of the source is read (by 16kB chunks).
+        events = defused_etree.iterparse(source, events=('start', 'end'))
+        _, root = next(events)
+
+        if self.details or self.needs_full_parse(root):
+            # Single streaming pass over the packages and classes
+            packages, files = self.parse_packages(root, events)
+        else:
+            return self.parse_root(root)
 
-    def parse_root(self, root):
+        cov = self.parse_root(root, files)
+
+        if self.details:
+            _set_details(cov, packages, files)
+
+        return cov
+
+    def needs_full_parse(self, root):
+        """Returns True if the whole document is needed to parse `root`, False if its start tag is enough"""
+        return any(a not in root.attrib for a in self.ROOT_ATTRIBUTES)
+
+    def parse_root(self,
+                   root,
+                   files=None  # type: Dict[str, CoverageStats]
+                   ):
+        """
+        Returns the `CoverageStats` in the attributes of `root`. Missing totals are computed from the stats of the
+        source `files`, that are required in this case (see `needs_full_parse` and `parse_packages`).
+        """
         cov = CoverageStats()
         assert root.tag == 'coverage'
 
-        cov.complexity = float(root.attrib.get('complexity'))
+        cov.complexity = float(root.attrib.get('complexity', 0))
 
-        cov.branches_covered = int(root.attrib.get('branches-covered'))
-        cov.branches_valid = int(root.attrib.get('branches-valid'))
+        # the totals, computed from the classes if they are not in the file
+        totals = dict()
+        if self.needs_full_parse(root):
+            for file_cov in files.values():
+                for attr_name, count in (('branches-covered', file_cov.branches_covered),
+                                         ('branches-valid', file_cov.branches_valid),
+                                         ('lines-covered', file_cov.lines_covered),
+                                         ('lines-valid', file_cov.lines_valid)):
+                    totals[attr_name] = totals.get(attr_name, 0) + count
+        totals.update((k, int(v)) for k, v in root.attrib.items() if k in self.ROOT_ATTRIBUTES)
 
-        cov.lines_covered = int(root.attrib.get('lines-covered'))
-        cov.lines_valid = int(root.attrib.get('lines-valid'))
+        cov.branches_covered = totals.get('branches-covered', 0)
+        cov.branches_valid = totals.get('branches-valid', 0)
+
+        cov.lines_covered = totals.get('lines-covered', 0)
+        cov.lines_valid = totals.get('lines-valid', 0)
 
         # recompute the rates for more precision, but make sure that's correct
-        branch_rate = float(root.attrib.get('branch-rate'))
-        line_rate = float(root.attrib.get('line-rate'))
+        branch_rate = float(root.attrib.get('branch-rate', cov.branch_rate))
+        line_rate = float(root.attrib.get('line-rate', cov.line_rate))
 
         # detect whether the --branch option were set or not
         # so CoverageStats knows how to distinguish between them
@@ -178,15 +334,250 @@ class CovParser(object):
             raise ValueError("Computed line rate (%s) is different from the one in the file (%s)"
                              % (cov.line_rate, line_rate))
 
-        # for el in root:
-        #     if el.tag == 'sources':
-        #         self.parse_sources(el, ts)
-        #     if el.tag == 'packages':
-        #         self.parse_packages(el, ts)
+        return cov
+
+    def iter_classes(self, root, events):
+        """
+        Yields a tuple (package name, <class> element) for each <class>, from the remaining `events` of the `iterparse`
+        of `root`, as soon as its end tag is read. Elements are freed as we go, so that the memory used does not depend
+        on the file size.
+        """
+        package_name = None
+
+        # the stack of currently open elements
+        stack = [root]
+        for event, elem in events:
+            if event == 'start':
+                if elem.tag == 'package':
+                    package_name = elem.attrib.get('name', '')
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag == 'class':
+                yield package_name, elem
+            elif elem.tag == 'package':
+                package_name = None
+            else:
+                # keep the children of <class> until it is processed
+                continue
+
+            # free memory as we go: the element is not needed anymore
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+    def parse_packages(self, root, events):
+        # type: (...) -> Tuple[Dict[str, CoverageStats], Dict[str, CoverageStats]]
+        """
+        Computes the stats of each <package> and of each source file (<class> in a <package>), from the remaining
+        `events` of the `iterparse` of `root`.
+        """
+        packages = dict()
+        files = dict()
+        for package_name, elem in self.iter_classes(root, events):
+            counts = self.parse_class(elem)
+            _add_counts(_get_or_create_stats(files, elem.attrib.get('filename', '')), counts)
+            if package_name is not None:
+                _add_counts(_get_or_create_stats(packages, package_name), counts)
+
+        return packages, files
+
+    def parse_line_hits(self, source):
+        # type: (...) -> Tuple[bool, float, Dict[str, FileLineHits]]
+        """
+        Reads the hits of each line and branch of each source file in `source`, in a single streaming pass. Returns a
+        tuple (branch_option, complexity, files) where `files` contains the `FileLineHits` of each source file.
+        """
+        events = defused_etree.iterparse(source, events=('start', 'end'))
+        _, root = next(events)
+        assert root.tag == 'coverage'
 
+        complexity = float(root.attrib.get('complexity', 0))
+        # see parse_root
+        branch_option = int(root.attrib.get('branches-valid', 0)) > 0 or float(root.attrib.get('branch-rate', 0)) == 1.0
+
+        files = dict()
+        for package_name, elem in self.iter_classes(root, events):
+            filename = elem.attrib.get('filename', '')
+            try:
+                file_hits = files[filename]
+            except KeyError:
+                file_hits = files[filename] = FileLineHits(package_name)
+            for line in elem.iterfind('lines/line'):
+                file_hits.add_line(line.attrib)
+
+        return branch_option, complexity, files
+
+    def parse_class(self, elem):
+        # type: (...) -> Tuple[int, int, int, int]
+        """Returns the (lines_covered, lines_valid, branches_covered, branches_valid) counts of a <class>"""
+        lines_covered = lines_valid = branches_covered = branches_valid = 0
+        # note: the <line> elements in <methods> are duplicates of the ones in <lines>
+        for line in elem.iterfind('lines/line'):
+            lines_valid += 1
+            if int(line.attrib.get('hits', 0)) > 0:
+                lines_covered += 1
+            if line.attrib.get('branch') == 'true':
+                match = _CONDITION_COVERAGE_PATTERN.search(line.attrib.get('condition-coverage', ''))
+                if match is not None:
+                    branches_covered += int(match.group(1))
+                    branches_valid += int(match.group(2))
+
+        return lines_covered, lines_valid, branches_covered, branches_valid
+
+
+class FileLineHits(object):
+    """
+    The hits of each line and branch of a source file, read from one or several coverage.xml files.
+
+    `lines` maps each line number to True if it is covered. `branches` maps the line number of each branch to a tuple
+    (nb_branches, missing) where `missing` is the set of destinations of the missing branches, or only their number
+    when the destinations are not in the file.
+    """
+    __slots__ = ('package', 'lines', 'branches')
+
+    def __init__(self, package=None):
+        self.package = package
+        self.lines = dict()  # type: Dict[int, bool]
+        self.branches = dict()  # type: Dict[int, Tuple[int, Union[FrozenSet[str], int]]]
+
+    def add_line(self, attrib):
+        """Adds the hits of a <line> element, from its attributes"""
+        number = int(attrib['number'])
+        self.lines[number] = self.lines.get(number, False) or int(attrib.get('hits', 0)) > 0
+
+        if attrib.get('branch') == 'true':
+            match = _CONDITION_COVERAGE_PATTERN.search(attrib.get('condition-coverage', ''))
+            if match is not None:
+                nb_covered, nb_branches = int(match.group(1)), int(match.group(2))
+                missing_branches = attrib.get('missing-branches')
+                if nb_covered == nb_branches:
+                    missing = frozenset()
+                elif missing_branches is not None:
+                    missing = frozenset(missing_branches.split(','))
+                else:
+                    missing = nb_branches - nb_covered
+                self.add_branch(number, nb_branches, missing)
+
+    def add_branch(self, number, nb_branches, missing):
+        """Adds the hits of the branches of line `number`. A branch is covered if it is covered in any file"""
+        try:
+            prev_nb_branches, prev_missing = self.branches[number]
+        except KeyError:
+            self.branches[number] = (nb_branches, missing)
+            return
+
+        if isinstance(missing, frozenset) and isinstance(prev_missing, frozenset):
+            missing = missing & prev_missing
+        else:
+            # the destinations are unknown: at least the max number of covered branches are covered
+            missing = min(_nb_missing(missing), _nb_missing(prev_missing))
+        self.branches[number] = (max(nb_branches, prev_nb_branches), missing)
+
+    def update(self, other):
+        # type: (FileLineHits) -> None
+        """Unions the line and branch hits of `other` into this object"""
+        lines = self.lines
+        for number, hit in other.lines.items():
+            lines[number] = lines.get(number, False) or hit
+        for number, (nb_branches, missing) in other.branches.items():
+            self.add_branch(number, nb_branches, missing)
+        if self.package is None:
+            self.package = other.package
+
+    def counts(self):
+        # type: (...) -> Tuple[int, int, int, int]
+        """Returns the (lines_covered, lines_valid, branches_covered, branches_valid) counts"""
+        branches_covered = branches_valid = 0
+        for nb_branches, missing in self.branches.values():
+            branches_valid += nb_branches
+            branches_covered += nb_branches - _nb_missing(missing)
+        return sum(self.lines.values()), len(self.lines), branches_covered, branches_valid
+
+
+def _nb_missing(missing):
+    return len(missing) if isinstance(missing, frozenset) else missing
+
+
+def get_coverage_line_hits(coverage_xml_file):
+    # type: (...) -> Tuple[bool, float, Dict[str, FileLineHits]]
+    """Reads the line and branch hits in a coverage.xml file path or stream. See `CovParser.parse_line_hits`"""
+    with open_binary_source(coverage_xml_file) as f:
+        return CovParser().parse_line_hits(f)
+
+
+def merge_coverage_line_hits(all_hits,     # type: Iterable[Tuple[bool, float, Dict[str, FileLineHits]]]
+                             details=False  # type: bool
+                             ):
+    # type: (...) -> CoverageStats
+    """
+    Merges the line hits read from several coverage.xml files with `get_coverage_line_hits`, and returns the
+    corresponding `CoverageStats`. If `details=True`, the per-package and per-file stats are also computed.
+    """
+    branch_option = False
+    complexity = 0
+    files = dict()
+    for file_branch_option, file_complexity, file_hits in all_hits:
+        branch_option = branch_option or file_branch_option
+        complexity = max(complexity, file_complexity)
+        for filename, hits in file_hits.items():
+            try:
+                files[filename].update(hits)
+            except KeyError:
+                files[filename] = hits
+
+    cov = CoverageStats(branch_option=branch_option, complexity=complexity, branches_covered=0, branches_valid=0,
+                        lines_covered=0, lines_valid=0)
+    packages_stats = dict()
+    files_stats = dict()
+    for filename, hits in files.items():
+        counts = hits.counts()
+        _add_counts(cov, counts)
+        if details:
+            _add_counts(_get_or_create_stats(files_stats, filename), counts)
+            if hits.package is not None:
+                _add_counts(_get_or_create_stats(packages_stats, hits.package), counts)
+
+    if details:
+        _set_details(cov, packages_stats, files_stats)
+
+    return cov
+
+
+def _set_details(cov,       # type: CoverageStats
+                 packages,  # type: Dict[str, CoverageStats]
+                 files      # type: Dict[str, CoverageStats]
+                 ):
+    """Sets the per-package and per-file stats of `cov`"""
+    for sub_cov in list(packages.values()) + list(files.values()):
+        sub_cov.branch_option = cov.branch_option
+    cov.packages = packages
+    cov.files = files
+
+
+def _get_or_create_stats(stats_dict, name):
+    # type: (...) -> CoverageStats
+    """Returns the `CoverageStats` for `name` in `stats_dict`, creating it with zero counts if needed"""
+    try:
+        return stats_dict[name]
+    except KeyError:
+        cov = stats_dict[name] = CoverageStats(complexity=0, branches_covered=0, branches_valid=0,
+                                               lines_covered=0, lines_valid=0)
         return cov
 
 
+def _add_counts(cov,    # type: CoverageStats
+                counts  # type: Tuple[int, int, int, int]
+                ):
+    """Adds the (lines_covered, lines_valid, branches_covered, branches_valid) counts to `cov`"""
+    lines_covered, lines_valid, branches_covered, branches_valid = counts
+    cov.lines_covered += lines_covered
+    cov.lines_valid += lines_valid
+    cov.branches_covered += branches_covered
+    cov.branches_valid += branches_valid
+
+
 def is_close(a, b):
     """Return True if there is at most a difference of 1 at the 2d decimal"""
     return abs(a - b) <= 0.01
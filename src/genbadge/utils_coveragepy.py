@@ -0,0 +1,325 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Reads the coverage.py data files (`.coverage` SQLite databases) directly, without running `coverage combine` and
+`coverage xml` first: the executed lines and arcs are read with a few bulk SQL queries, and only the statements and
+branches of the source files are obtained from the public analysis API of coverage.py (7.7 or later).
+"""
+import errno
+import os
+import re
+import sqlite3
+
+try:
+    from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+except ImportError:  # pragma: no cover
+    pass
+
+from .utils_coverage import CoverageStats, _add_counts, _get_or_create_stats, _set_details
+from .utils_io import split_sources
+
+try:
+    FileNotFoundError
+except NameError:
+    FileNotFoundError = IOError
+
+
+def _import_coverage():
+    """Imports `coverage` lazily, with a nice error message if it is not installed"""
+    try:
+        import coverage
+    except ImportError as e:
+        raise ImportError("Could not import `coverage`, please install `coverage` to read the coverage.py data files. "
+                          "Note that all dependencies for this can be installed with "
+                          "`pip install genbadge[coveragepy]`. Caught: %r" % e)
+    return coverage
+
+
+def get_coveragepy_stats(data_file='.coverage',  # type: Union[str, Iterable[str]]
+                         config_file=True,       # type: Union[bool, str]
+                         details=False           # type: bool
+                         ):
+    # type: (...) -> CoverageStats
+    """
+    Reads a coverage.py data file (the `.coverage` SQLite database) and returns the same `CoverageStats` as reading
+    the coverage.xml file generated by `coverage xml`.
+
+    The executed lines and arcs of all source files are read with a few bulk SQL queries, and nothing is written to
+    disk. The number of statements and branches of each source file are then obtained with `Coverage.analysis2` and
+    `Coverage.branch_stats`, taking the coverage.py configuration into account: `[paths]` remapping, plugins,
+    excluded lines, `[report] include` and `omit`, `ignore_errors`, `skip_empty`.
+
+    :param data_file: the path to the data file. A glob pattern or a list of paths can also be provided (e.g. the
+        parallel data files of several test shards): their executed lines and arcs are then combined, as
+        `coverage combine` would do. The data files are left untouched.
+    :param config_file: the coverage.py configuration file to use, see `coverage.Coverage`. By default the usual
+        configuration files (.coveragerc, setup.cfg, tox.ini, pyproject.toml) are used.
+    :param details: if True, the per-package and per-file stats are also computed.
+    """
+    coverage = _import_coverage()
+
+    file_paths, streams = split_sources(data_file)
+    if streams:
+        raise TypeError("coverage.py data files can only be read from file paths, not streams")
+    has_arcs, executed, tracers = read_coveragepy_data(file_paths)
+
+    # in-memory coverage.py sessions, only used to analyze the source files
+    cov = coverage.Coverage(data_file=None, config_file=config_file)
+    map_path = get_path_mapper(cov.get_option("paths"))
+    if map_path is not None:
+        executed, tracers = _remap(executed, map_path), {map_path(f): t for f, t in tracers.items()}
+
+    if has_arcs:
+        # the statements are analyzed with the executed lines only, which is cheaper than the analysis of the arcs
+        branches_cov = coverage.Coverage(data_file=None, config_file=config_file)
+        _add_data(branches_cov, executed, tracers, has_arcs=True)
+        executed_lines = {f: {lineno for arc in arcs for lineno in arc if lineno > 0} for f, arcs in executed.items()}
+        _add_data(cov, executed_lines, tracers, has_arcs=False)
+    else:
+        _add_data(cov, executed, tracers, has_arcs=False)
+
+    measured_files = _filter_measured_files(sorted(executed), cov.get_option("report:include"),
+                                            cov.get_option("report:omit"))
+    ignore_errors = cov.get_option("report:ignore_errors")
+    skip_empty = cov.get_option("report:skip_empty")
+    if details:
+        xml_names = XmlNames(cov)
+
+    cov_stats = CoverageStats(branch_option=has_arcs, complexity=0, branches_covered=0, branches_valid=0,
+                              lines_covered=0, lines_valid=0)
+    packages = dict()
+    files = dict()
+    for filename in measured_files:
+        try:
+            analyzed_filename, statements, _, missing, _ = cov.analysis2(filename)
+            branch_stats = branches_cov.branch_stats(filename) if has_arcs else dict()
+        except Exception:
+            if ignore_errors:
+                continue
+            raise
+
+        if skip_empty and not statements:
+            continue
+
+        counts = (len(statements) - len(missing), len(statements),
+                  sum(taken for _, taken in branch_stats.values()), sum(total for total, _ in branch_stats.values()))
+        _add_counts(cov_stats, counts)
+
+        if details:
+            rel_name, package_name = xml_names.get_names(analyzed_filename)
+            _add_counts(_get_or_create_stats(files, rel_name), counts)
+            _add_counts(_get_or_create_stats(packages, package_name), counts)
+
+    if details:
+        _set_details(cov_stats, packages, files)
+
+    return cov_stats
+
+
+def _add_data(cov,       # type: coverage.Coverage
+              executed,  # type: Dict[str, Set]
+              tracers,   # type: Dict[str, str]
+              has_arcs   # type: bool
+              ):
+    """Adds the executed lines (or arcs) and the plugins of the source files to the data of `cov`"""
+    data = cov.get_data()
+    if has_arcs:
+        data.add_arcs(executed)
+    else:
+        data.add_lines(executed)
+    data.add_file_tracers(tracers)
+
+
+def read_coveragepy_data(data_files  # type: Iterable[str]
+                         ):
+    # type: (...) -> Tuple[bool, Dict[str, Set], Dict[str, str]]
+    """
+    Reads the executed lines or arcs of all source files in the coverage.py data files, with a few SQL queries per data
+    file. Returns a tuple (has_arcs, executed, tracers) where `executed` contains the executed line numbers (or arcs
+    if `has_arcs`) of each source file path for all contexts, and `tracers` the plugin of the source files measured
+    by a plugin.
+    """
+    has_arcs = None
+    executed = dict()
+    tracers = dict()
+    for data_file in data_files:
+        if not os.path.isfile(data_file):
+            raise FileNotFoundError(errno.ENOENT, "coverage.py data file not found", data_file)
+
+        con = sqlite3.connect("file:%s?mode=ro" % os.path.abspath(data_file), uri=True)
+        try:
+            row = con.execute("SELECT value FROM meta WHERE key = 'has_arcs'").fetchone()
+            file_has_arcs = bool(int(row[0])) if row is not None else False
+            if has_arcs is not None and file_has_arcs != has_arcs:
+                raise ValueError("Can not combine line and branch (arc) coverage data, see %r" % data_file)
+            has_arcs = file_has_arcs
+
+            # files without any executed line are still measured
+            for path, in con.execute("SELECT path FROM file"):
+                executed.setdefault(path, set())
+
+            if has_arcs:
+                query = "SELECT file.path, arc.fromno, arc.tono FROM arc JOIN file ON file.id = arc.file_id"
+                for path, fromno, tono in con.execute(query):
+                    executed[path].add((fromno, tono))
+            else:
+                query = "SELECT file.path, line_bits.numbits FROM line_bits JOIN file ON file.id = line_bits.file_id"
+                for path, numbits in con.execute(query):
+                    executed[path].update(numbits_to_nums(numbits))
+
+            query = "SELECT file.path, tracer.tracer FROM tracer JOIN file ON file.id = tracer.file_id"
+            tracers.update(con.execute(query))
+        except sqlite3.DatabaseError as e:
+            raise ValueError("Error while reading the coverage.py data file %r, please check that it was generated "
+                             "with coverage.py 5.0 or later: %r" % (data_file, e))
+        finally:
+            con.close()
+
+    return bool(has_arcs), executed, tracers
+
+
+def numbits_to_nums(numbits  # type: bytes
+                    ):
+    # type: (...) -> Iterable[int]
+    """Yields the line numbers in a coverage.py `numbits` blob: bit i of byte j is set if line 8*j+i was executed"""
+    for byte_i, byte in enumerate(bytearray(numbits)):
+        while byte:
+            low_bit = byte & -byte
+            yield byte_i * 8 + low_bit.bit_length() - 1
+            byte ^= low_bit
+
+
+# Absolute paths on any OS, since the data files may have been generated on another OS
+_ABS_PATH_ANYWHERE = re.compile(r"([a-zA-Z]:)?[/\\]")
+
+# The tokens of the coverage.py file path patterns, and their regex. Other characters match themselves
+_GLOB_TOKENS = tuple((re.compile(token), sub) for token, sub in (
+    (r"^\*+/", r"(.*[/\\])?"),   # a leading */ matches any prefix
+    (r"/\*+$", r"[/\\].*"),      # a trailing /* matches any suffix
+    (r"\*\*/", r"(.*[/\\])?"),   # **/ matches any number of folders
+    (r"[/\\]", r"[/\\]"),        # / matches both separators
+    (r"\*", r"[^/\\]*"),         # * and ? do not match separators
+    (r"\?", r"[^/\\]"),
+))
+
+
+def glob_to_regex(pattern,      # type: str
+                  partial=False  # type: bool
+                  ):
+    # type: (...) -> re.Pattern
+    """
+    Compiles a coverage.py file path pattern: `*` and `?` do not match path separators, `**/` matches any number of
+    folders, a leading `*/` matches any prefix and a trailing `/*` any suffix. `/` matches both separators. With
+    `partial=True`, the pattern only has to match the beginning of the path.
+    """
+    regex = []
+    pos = 0
+    while pos < len(pattern):
+        for token, sub in _GLOB_TOKENS:
+            m = token.match(pattern, pos)
+            if m:
+                regex.append(sub)
+                pos = m.end()
+                break
+        else:
+            regex.append(re.escape(pattern[pos]))
+            pos += 1
+    return re.compile("".join(regex) + ("" if partial else r"\Z"), re.IGNORECASE if os.name == "nt" else 0)
+
+
+def _prep_pattern(pattern  # type: str
+                  ):
+    # type: (...) -> str
+    """As in coverage.py, patterns that do not start with a wildcard are relative to the current directory"""
+    if pattern.startswith(("*", "?")) or os.path.isabs(pattern) or _ABS_PATH_ANYWHERE.match(pattern):
+        return pattern
+    return os.path.abspath(pattern)
+
+
+def _filter_measured_files(filenames,  # type: List[str]
+                           include,    # type: Optional[List[str]]
+                           omit        # type: Optional[List[str]]
+                           ):
+    # type: (...) -> List[str]
+    """Applies the `[report] include` and `omit` options of the coverage.py configuration, as `coverage xml` does"""
+    if include:
+        matchers = [glob_to_regex(p) for pattern in include for p in {pattern, _prep_pattern(pattern)}]
+        filenames = [f for f in filenames if any(m.match(f) for m in matchers)]
+    if omit:
+        matchers = [glob_to_regex(p) for pattern in omit for p in {pattern, _prep_pattern(pattern)}]
+        filenames = [f for f in filenames if not any(m.match(f) for m in matchers)]
+    return filenames
+
+
+def get_path_mapper(paths  # type: Optional[Dict[str, List[str]]]
+                    ):
+    # type: (...) -> Optional[Callable[[str], str]]
+    """
+    Returns a function remapping the source file paths according to the `[paths]` option of the coverage.py
+    configuration, as `coverage combine` does, or None if there is no such option. The first pattern matching the
+    beginning of a path, and leading to an existing file, is replaced with the first path of its entry.
+    """
+    aliases = []
+    for entry in (paths or dict()).values():
+        result = entry[0].rstrip("\\/") + os.sep
+        for pattern in entry[1:]:
+            pattern = _prep_pattern(pattern.rstrip("\\/")) + "/"
+            aliases.append((glob_to_regex(pattern, partial=True), result))
+
+    if not aliases:
+        return None
+
+    def map_path(path):
+        for regex, result in aliases:
+            m = regex.match(path)
+            if m:
+                new_path = result + path[m.end():].replace("\\", os.sep).replace("/", os.sep)
+                if os.path.exists(new_path):
+                    return new_path
+        return path
+
+    return map_path
+
+
+def _remap(executed,  # type: Dict[str, Set]
+           map_path   # type: Callable[[str], str]
+           ):
+    # type: (...) -> Dict[str, Set]
+    """Remaps the source file paths with `map_path`, unioning the lines or arcs of the paths mapped together"""
+    remapped = dict()
+    for path, items in executed.items():
+        remapped.setdefault(map_path(path), set()).update(items)
+    return remapped
+
+
+class XmlNames(object):
+    """
+    Computes the same file and package names as in the coverage.xml generated by `coverage xml`: file names are
+    relative to the `[run] source` folders, or to the folder of the previous files, or to the current directory.
+    """
+    def __init__(self, cov):
+        self.relative_files = cov.get_option("run:relative_files")
+        self.package_depth = cov.get_option("xml:package_depth")
+        self.source_paths = []
+        for src in cov.get_option("run:source") or ():
+            if os.path.exists(src):
+                self.source_paths.append(src.rstrip("\\/") if self.relative_files else os.path.abspath(src))
+
+    def get_names(self, filename):
+        """Returns the file name and package name of the analyzed source file `filename`"""
+        filename = filename.replace("\\", "/")
+        for source_path in self.source_paths:
+            if not self.relative_files:
+                source_path = os.path.abspath(source_path)
+            if filename.startswith(source_path.replace("\\", "/") + "/"):
+                rel_name = filename[len(source_path) + 1:]
+                break
+        else:
+            cwd = os.getcwd().replace("\\", "/") + "/"
+            rel_name = filename[len(cwd):] if filename.startswith(cwd) else filename
+            self.source_paths.append(filename[:-len(rel_name)].rstrip("\\/"))
+
+        dirname = os.path.dirname(rel_name) or "."
+        return rel_name, ".".join(dirname.split("/")[:self.package_depth])
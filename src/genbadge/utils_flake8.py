@@ -4,23 +4,36 @@
 #  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
 from __future__ import division
 
+from functools import lru_cache
 from warnings import warn
 import re
 
 from .utils_badge import Badge
-
+from .utils_io import open_binary_source, iter_lines
 
 try:
-    # flake8-html is an optional dependency, do not fail too soon if it cant be loaded
-    import flake8_html
-except ImportError as e:
-    ee = e  # save it
-    class FakeFlake8HtmlImport(object):  # noqa
-        def __getattribute__(self, item):
-            raise ImportError("Could not import `flake8_html` module, please install it. "
-                              "Note that all dependencies for the flake8 command can be installed with "
-                              "`pip install genbadge[flake8]`. Caught: %r" % ee)
-    flake8_html = FakeFlake8HtmlImport()
+    from typing import Any, Callable, Iterable, Optional, Tuple, Union
+except ImportError:  # pragma: no cover
+    pass
+
+
+@lru_cache(maxsize=None)
+def find_severity(code  # type: str
+                  ):
+    # type: (...) -> int
+    """
+    Returns the severity level of flake8 error `code`, as defined by flake8-html. It is memoized per code.
+
+    flake8-html is an optional dependency, and importing it also imports flake8 which is slow. So it is only imported
+    here, the first time it is actually needed.
+    """
+    try:
+        from flake8_html.plugin import find_severity as _find_severity
+    except ImportError as e:
+        raise ImportError("Could not import `flake8_html` module, please install it. "
+                          "Note that all dependencies for the flake8 command can be installed with "
+                          "`pip install genbadge[flake8]`. Caught: %r" % e)
+    return _find_severity(code)
 
 
 class Flake8Stats(object):
@@ -43,7 +56,7 @@ class Flake8Stats(object):
         """
         Add `nb` errors with the same code to the statistics.
         """
-        severity = flake8_html.plugin.find_severity(code)
+        severity = find_severity(code)
         if severity == 1:
             self.nb_critical += nb
         elif severity == 2:
@@ -89,41 +102,107 @@ def get_flake8_badge(
     return Badge(left_txt=left_txt, right_txt=right_txt, color=color)
 
 
-def get_flake8_stats(flake8_stats_file):
+def get_flake8_stats(flake8_stats_file,
+                     progress=None  # type: Callable[[int, bool], Any]
+                     ):
     # type: (...) -> Flake8Stats
     """
-    Reads an index.html file obtained from flake8-html.
-    """
-    if isinstance(flake8_stats_file, str):
-        # assume a file path
-        with open(flake8_stats_file) as f:
-            flake8_stats_txt = f.read()
-    else:
-        # assume a stream already
-        flake8_stats_txt = flake8_stats_file.read()
+    Reads a flake8 statistics file obtained with `flake8 --statistics`, or the raw flake8 output (one violation per
+    line, in the default `path:row:col: code text` format). The file is read line by line, so that even a raw output
+    with millions of lines is tallied in constant memory.
 
-    return parse_flake8_stats(flake8_stats_txt)
+    :param flake8_stats_file: the file path or stream
+    :param progress: an optional callable `progress(nb_lines, finished)`, called every `PROGRESS_INTERVAL` lines read
+        with `finished=False`, and once at the end with `finished=True`.
+    """
+    # a file path (memory-mapped) or a stream, read line by line
+    with open_binary_source(flake8_stats_file) as f:
+        return parse_flake8_lines(iter_lines(f), progress=progress)
 
 
+# a line of `flake8 --statistics`, e.g. "3     E501 line too long (127 > 120 characters)"
 RE_TO_MATCH = re.compile(r"([0-9]+)\s+([A-Z0-9]+)\s.*")
+# a line of the raw flake8 output in its default format, e.g. "src/foo.py:12:121: E501 line too long (127 > 120 ...)"
+RE_RAW_TO_MATCH = re.compile(r".*:[0-9]+:[0-9]+: ([A-Z]+[0-9]+)\s")
+# the total printed by `flake8 --count`
+RE_COUNT_TO_MATCH = re.compile(r"[0-9]+\s*$")
+
+_PATTERNS = (RE_TO_MATCH, RE_RAW_TO_MATCH, RE_COUNT_TO_MATCH)
+_PATTERNS_BYTES = tuple(re.compile(p.pattern.encode("ascii")) for p in _PATTERNS)
+
+# the number of lines between two calls to the `progress` callback
+PROGRESS_INTERVAL = 1000000
 
 
 def parse_flake8_stats(stats_txt  # type: str
                        ):
     # type: (...) -> Flake8Stats
+    return parse_flake8_lines(stats_txt.splitlines())
 
-    stats = Flake8Stats()
-    for line in stats_txt.splitlines():
-        match = RE_TO_MATCH.match(line)
-        if not match:
-            warn("Line in Flake8 statistics report does not match template and will be ignored: %r" % line)
+
+def parse_flake8_lines(lines,         # type: Iterable[Union[str, bytes]]
+                       progress=None  # type: Callable[[int, bool], Any]
+                       ):
+    # type: (...) -> Flake8Stats
+    """
+    Parses the lines of a flake8 statistics report or raw flake8 output, as str or bytes. The number of errors is
+    tallied per code, so that the severity is only looked up once per code.
+
+    Note that without `--format` option, `flake8 --statistics` prints the violations before the statistics: when both
+    are present only the statistics are taken into account.
+    """
+    statistics = dict()
+    violations = dict()
+    for nb, code in iter_flake8_counts(lines, progress=progress):
+        if nb is None:
+            violations[code] = violations.get(code, 0) + 1
         else:
-            nb, code = match.groups()
-            stats.add(int(nb), code)
+            statistics[code] = statistics.get(code, 0) + nb
+
+    stats = Flake8Stats()
+    for code, nb in (statistics or violations).items():
+        stats.add(nb, code if isinstance(code, str) else code.decode("ascii"))
 
     return stats
 
 
+def iter_flake8_counts(lines,         # type: Iterable[Union[str, bytes]]
+                       progress=None  # type: Callable[[int, bool], Any]
+                       ):
+    # type: (...) -> Iterable[Tuple[Optional[int], Union[str, bytes]]]
+    """
+    Generator yielding a tuple (nb, code) for each statistics line in `lines`, and (None, code) for each raw
+    violation line. Bytes lines are matched without being decoded, and the codes are yielded as bytes. Lines that do
+    not match any of these formats are ignored with a warning, except the total printed by `flake8 --count`.
+    """
+    match_stats = match_raw = match_count = None
+    nb_lines = 0
+    for nb_lines, line in enumerate(lines, 1):
+        if match_stats is None:
+            patterns = _PATTERNS if isinstance(line, str) else _PATTERNS_BYTES
+            match_stats, match_raw, match_count = (p.match for p in patterns)
+
+        match = match_stats(line)
+        if match is not None:
+            nb, code = match.groups()
+            yield int(nb), code
+        else:
+            match = match_raw(line)
+            if match is not None:
+                yield None, match.group(1)
+            elif match_count(line) is None:
+                if not isinstance(line, str):
+                    line = line.decode("utf-8", "replace")
+                warn("Line in Flake8 statistics report does not match template and will be ignored: %r"
+                     % line.rstrip("\r\n"))
+
+        if progress is not None and nb_lines % PROGRESS_INTERVAL == 0:
+            progress(nb_lines, False)
+
+    if progress is not None:
+        progress(nb_lines, True)
+
+
 # def parse_flake8_html(html  # type: str
 #                       ):
 #     #
@@ -0,0 +1,171 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+import errno
+import mmap
+import os
+from contextlib import contextmanager
+from glob import glob
+
+try:
+    from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+except ImportError:  # pragma: no cover
+    pass
+
+try:
+    FileNotFoundError
+except NameError:
+    FileNotFoundError = IOError
+
+
+def is_glob_pattern(file_path  # type: str
+                    ):
+    # type: (...) -> bool
+    """Returns True if `file_path` contains glob wildcards"""
+    return any(c in file_path for c in "*?[")
+
+
+def expand_glob_pattern(file_path  # type: str
+                        ):
+    # type: (...) -> List[str]
+    """
+    Returns the sorted list of files matching `file_path` if it is a glob pattern (`**` matches any subfolders), or
+    `[file_path]` otherwise. A `FileNotFoundError` is raised if no file matches the pattern.
+    """
+    if not is_glob_pattern(file_path):
+        return [file_path]
+
+    file_paths = sorted(p for p in glob(file_path, recursive=True) if os.path.isfile(p))
+    if not file_paths:
+        raise FileNotFoundError(errno.ENOENT, "No file matches this pattern", file_path)
+    return file_paths
+
+
+def is_multiple_sources(sources):
+    # type: (...) -> bool
+    """Returns True if `sources` is a glob pattern or a list of sources, False if it is a single file path or stream"""
+    if isinstance(sources, str):
+        return is_glob_pattern(sources)
+    return isinstance(sources, (list, tuple))
+
+
+def split_sources(sources  # type: Iterable
+                  ):
+    # type: (...) -> Tuple[List[str], List[Any]]
+    """
+    Returns the list of file paths and the list of streams in `sources`, an iterable of file paths, glob patterns and
+    streams (or a single glob pattern). Glob patterns are expanded.
+    """
+    if isinstance(sources, str):
+        sources = (sources,)
+
+    file_paths = []
+    streams = []
+    for source in sources:
+        if isinstance(source, str):
+            file_paths += expand_glob_pattern(source)
+        else:
+            streams.append(source)
+
+    return file_paths, streams
+
+
+def map_in_processes(func,            # type: Callable
+                     items,           # type: List
+                     max_workers=None  # type: int
+                     ):
+    # type: (...) -> List
+    """
+    Returns `[func(item) for item in items]`, computed in a process pool. `func` should be a module-level function, and
+    its arguments and results should be picklable.
+
+    :param max_workers: the maximum number of processes. Default is the number of CPUs. With 1 (or a single item), no
+        process pool is created and everything happens in the current process.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(items))
+
+    if max_workers <= 1:
+        return [func(item) for item in items]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # send the items to the workers by batches to limit the inter-process communication overhead
+        chunksize = max(1, len(items) // (4 * max_workers))
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
+def read_head(source,     # type: Union[str, Any]
+              size=2048  # type: int
+              ):
+    # type: (...) -> Optional[bytes]
+    """
+    Returns the first `size` bytes of `source`, a file path or a stream, without consuming them from the stream.
+    Returns None if this is not possible, i.e. if the stream can neither be peeked at nor seeked. Text streams are
+    peeked at through their binary buffer, so they should not have been read yet.
+    """
+    if isinstance(source, str):
+        with open(source, mode="rb") as f:
+            return f.read(size)
+
+    # the binary buffer below a text stream
+    buffer = getattr(source, "buffer", source)
+    if hasattr(buffer, "peek"):
+        return buffer.peek(size)[:size]
+
+    try:
+        if source.seekable():
+            pos = source.tell()
+            head = source.read(size)
+            source.seek(pos)
+            return head if isinstance(head, bytes) else head.encode("utf-8")
+    except (AttributeError, IOError, ValueError):
+        pass
+
+    return None
+
+
+@contextmanager
+def open_binary_source(source):
+    """
+    Context manager yielding a binary file-like object to read `source`, a file path or a stream, with no decoding:
+
+     - a file path is memory-mapped (read-only), so that parsers read its bytes directly from the OS page cache
+       instead of copying them through a file buffer. Files that can not be mapped (empty files, pipes, ...) are
+       opened in binary mode instead.
+     - a text stream is read through its underlying binary buffer (e.g. `sys.stdin.buffer`) if it has one, so that it
+       is not decoded. Otherwise the text stream is yielded as is.
+     - a binary stream is yielded as is.
+
+    In all cases the parsers should read the yielded object by chunks, with `read(size)`. Memory maps can also be
+    scanned directly with regular expressions.
+    """
+    if isinstance(source, str):
+        with open(source, mode="rb") as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # empty file, or not a regular file
+                yield f
+            else:
+                try:
+                    yield mapped
+                finally:
+                    mapped.close()
+    else:
+        buffer = getattr(source, "buffer", None)
+        yield buffer if buffer is not None else source
+
+
+def iter_lines(source):
+    # type: (...) -> Iterable[Union[bytes, str]]
+    """
+    Yields the lines of `source`, as yielded by `open_binary_source`: a memory map is read line by line, and a stream
+    is iterated, which reads it by chunks. The lines include their end of line character(s).
+    """
+    if isinstance(source, mmap.mmap):
+        return iter(source.readline, b"")
+    else:
+        return iter(source)
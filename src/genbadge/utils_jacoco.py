@@ -0,0 +1,96 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Reads the JaCoCo xml reports (e.g. jacoco.xml) generated by JVM coverage tools.
+"""
+from .utils_coverage import CoverageStats, _add_counts, _get_or_create_stats, _set_details, defused_etree
+
+
+def parse_jacoco(source,
+                 details=False  # type: bool
+                 ):
+    # type: (...) -> CoverageStats
+    """Parses the JaCoCo xml report contents from source"""
+    return JacocoParser(details=details).parse(source)
+
+
+class JacocoParser(object):
+    """
+    Streaming parser of JaCoCo xml reports.
+
+    <report name="...">
+        <package name="org/example"> ... <sourcefile name="Foo.java"> ... <counter .../> </sourcefile> ...
+            <counter type="LINE" missed="12" covered="30"/> </package>
+        <counter type="INSTRUCTION" missed="120" covered="300"/>
+        <counter type="BRANCH" missed="4" covered="8"/>
+        <counter type="LINE" missed="12" covered="30"/>
+        <counter type="COMPLEXITY" missed="5" covered="10"/>
+    </report>
+
+    The totals are in the report-level <counter> elements, at the end of the file. The file is read with `iterparse`
+    and every element is freed as soon as its end tag is read, so that the memory used does not depend on the file
+    size. Only the report-level counters are read, and the package-level and source file-level counters if the details
+    were requested.
+    """
+
+    def __init__(self,
+                 details=False  # type: bool
+                 ):
+        self.details = details
+
+    def parse(self, source):
+        events = defused_etree.iterparse(source, events=('start', 'end'))
+        _, root = next(events)
+        if root.tag != 'report':
+            raise ValueError("Invalid JaCoCo xml report: the root element is <%s> instead of <report>" % root.tag)
+
+        cov = CoverageStats(complexity=0, branches_covered=0, branches_valid=0, lines_covered=0, lines_valid=0)
+        packages = dict()
+        files = dict()
+
+        # the current element and its ancestors
+        stack = [root]
+        for event, elem in events:
+            if event == 'start':
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if not stack:
+                break  # end of the root element
+            parent = stack[-1]
+            if elem.tag == 'counter':
+                if parent is root:
+                    self.add_counter(cov, elem)
+                elif self.details:
+                    if parent.tag == 'package':
+                        self.add_counter(_get_or_create_stats(packages, parent.get('name')), elem)
+                    elif parent.tag == 'sourcefile':
+                        filename = "%s/%s" % (stack[-2].get('name'), parent.get('name'))
+                        self.add_counter(_get_or_create_stats(files, filename), elem)
+
+            # free the element
+            parent.remove(elem)
+
+        cov.branch_option = cov.branches_valid > 0
+        if self.details:
+            _set_details(cov, packages, files)
+
+        return cov
+
+    def add_counter(self,
+                    cov,     # type: CoverageStats
+                    counter
+                    ):
+        """Adds the counts in `counter`, a <counter> element, to `cov`"""
+        counter_type = counter.get('type')
+        missed = int(counter.get('missed'))
+        covered = int(counter.get('covered'))
+        if counter_type == 'LINE':
+            _add_counts(cov, (covered, missed + covered, 0, 0))
+        elif counter_type == 'BRANCH':
+            _add_counts(cov, (0, 0, covered, missed + covered))
+        elif counter_type == 'COMPLEXITY':
+            cov.complexity += missed + covered
@@ -7,13 +7,24 @@ from __future__ import division
 from io import TextIOWrapper
 
 try:
-    from typing import Union
+    from typing import Iterable, Union
 except ImportError:
     pass
 
-# use our own copy so as to use defusedxml and to be compliant with setuptools>=58
-from .xunitparser_copy import parse
 from .utils_badge import Badge
+from .utils_io import is_multiple_sources, split_sources, map_in_processes, open_binary_source
+
+try:
+    # security patch: see https://docs.python.org/3/library/xml.etree.elementtree.html
+    import defusedxml.ElementTree as defused_etree
+except ImportError as e:
+    ee = e  # save it
+    class FakeDefusedXmlImport(object):  # noqa
+        def __getattribute__(self, item):
+            raise ImportError("Could not import `defusedxml.ElementTree`, please install `defusedxml`. "
+                              "Note that all dependencies for the tests command can be installed with "
+                              "`pip install genbadge[tests]`. Caught: %r" % ee)
+    defused_etree = FakeDefusedXmlImport()
 
 
 class TestStats(object):
@@ -49,28 +60,109 @@ class TestStats(object):
     def __repr__(self):
         return "%s(%s)" % (self.__class__.__name__, ",".join("%s=%r" % (k, v) for k, v in vars(self).items()))
 
+    def __add__(self, other):
+        """Sums the results of two test reports, for example two shards of the same test suite"""
+        if not isinstance(other, TestStats):
+            return NotImplemented
+        return TestStats(runned=self.runned + other.runned, skipped=self.skipped + other.skipped,
+                         failed=self.failed + other.failed, errors=self.errors + other.errors)
+
+    def __radd__(self, other):
+        # so that the builtin sum() can be used
+        if other == 0:
+            return self
+        return NotImplemented
 
-def get_test_stats(junit_xml_file='reports/junit/junit.xml'  # type: Union[str, TextIOWrapper]
+
+def get_test_stats(junit_xml_file='reports/junit/junit.xml',  # type: Union[str, TextIOWrapper, Iterable]
+                   max_workers=None                           # type: int
                    ):
     # type: (...) -> TestStats
     """
-    read the junit test file and extract the success percentage
-    :param junit_xml_file: the junit xml file path or file/text stream
-    :return: the success percentage (an int)
+    read the junit test file(s) and extract the test statistics
+
+    :param junit_xml_file: the junit xml file path or file/text stream. A glob pattern (e.g. "reports/junit/*.xml")
+        or a list of file paths, glob patterns and streams can also be provided, for example when the test suite is
+        sharded: the statistics of all files are then summed.
+    :param max_workers: when several files are read, the maximum number of processes used to parse them in parallel.
+        Default is the number of CPUs. Use 1 to parse them sequentially in the current process.
+    :return: the test statistics
     """
-    if isinstance(junit_xml_file, str):
-        # assume a file path
-        with open(junit_xml_file) as f:
-            ts, tr = parse(f)
+    if is_multiple_sources(junit_xml_file):
+        # several files: parse them in parallel
+        file_paths, streams = split_sources(junit_xml_file)
+        all_stats = [parse_junit_stats(stream) for stream in streams]
+        all_stats += map_in_processes(get_test_stats, file_paths, max_workers=max_workers)
+        if not all_stats:
+            raise ValueError("No junit xml file was provided")
+        return sum(all_stats)
     else:
-        # assume a stream already
-        ts, tr = parse(junit_xml_file)
+        # a file path (memory-mapped) or a stream
+        with open_binary_source(junit_xml_file) as f:
+            return parse_junit_stats(f)
 
-    runned = tr.testsRun
-    skipped = len(tr.skipped)
-    failed = len(tr.failures)
-    errors = len(tr.errors)
 
+def parse_junit_stats(source):
+    # type: (...) -> TestStats
+    """
+    Counts the test results in the junit xml `source` in a single streaming pass, in constant memory.
+
+    The counting semantics are the same as `xunitparser_copy.parse`: only the <testcase> elements directly under the
+    <testsuite> element(s) are taken into account, and the last <failure>, <error> or <skipped> child of a <testcase>
+    determines its result (so that error takes over failure in JUnit 4). The totals in the root element attributes,
+    if any, are checked.
+    """
+    runned = skipped = failed = errors = 0
+    root_attrib = None
+    root_is_testsuites = False
+
+    # the stack of currently open elements
+    stack = []
+    # the result of the current <testcase>, if any
+    tc_result = None
+
+    for event, elem in defused_etree.iterparse(source, events=("start", "end")):
+        depth = len(stack)
+        if event == "start":
+            if depth == 0:
+                root_attrib = dict(elem.attrib)
+                root_is_testsuites = elem.tag == 'testsuites'
+                if not root_is_testsuites:
+                    assert elem.tag == 'testsuite'
+            elif depth == 1 and root_is_testsuites:
+                assert elem.tag == 'testsuite'
+            elif stack[-1].tag == 'testcase' and depth == (3 if root_is_testsuites else 2):
+                if elem.tag in ('failure', 'error', 'skipped'):
+                    tc_result = elem.tag
+            stack.append(elem)
+        else:
+            stack.pop()
+            if elem.tag == 'testcase' and depth == (3 if root_is_testsuites else 2):
+                runned += 1
+                if tc_result == 'skipped':
+                    skipped += 1
+                elif tc_result == 'failure':
+                    failed += 1
+                elif tc_result == 'error':
+                    errors += 1
+                tc_result = None
+
+            # free memory as we go: the element is not needed anymore
+            if stack:
+                elem.clear()
+                stack[-1].remove(elem)
+
+    # check totals if they are in the root XML element
+    if 'errors' in root_attrib:
+        assert errors == int(root_attrib['errors'])
+    if 'failures' in root_attrib:
+        assert failed == int(root_attrib['failures'])
+    if 'skip' in root_attrib:
+        assert skipped == int(root_attrib['skip'])
+    if 'tests' in root_attrib:
+        assert runned == int(root_attrib['tests'])
+
+    # note: as in unittest, runned includes the skipped, failed and errored tests
     return TestStats(runned=runned, skipped=skipped, failed=failed, errors=errors)
 
 
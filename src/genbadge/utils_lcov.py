@@ -0,0 +1,127 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Reads the LCOV tracefiles (e.g. lcov.info) generated by JavaScript and C/C++ coverage tools.
+"""
+import mmap
+import os
+import re
+
+from .utils_coverage import CoverageStats, _add_counts, _get_or_create_stats, _set_details
+
+try:
+    from typing import Dict, List, Optional
+except ImportError:  # pragma: no cover
+    pass
+
+
+def parse_lcov(source,
+               details=False  # type: bool
+               ):
+    # type: (...) -> CoverageStats
+    """Parses the LCOV tracefile contents from source, a binary or text stream"""
+    return LcovParser(details=details).parse(source)
+
+
+# the summary records of each source file: lines hit/found and branches hit/found. `SF` (source file) starts the
+# records of a new source file.
+_LCOV_RECORDS_PATTERN = re.compile(r"^(SF|LH|LF|BRH|BRF):(.*?)\r?$", re.MULTILINE)
+_LCOV_RECORDS_PATTERN_BYTES = re.compile(_LCOV_RECORDS_PATTERN.pattern.encode("ascii"), re.MULTILINE)
+
+# the position of each summary record in the counts expected by `_add_counts`
+_LCOV_COUNTS_INDEX = {"LH": 0, "LF": 1, "BRH": 2, "BRF": 3}
+_LCOV_COUNTS_INDEX_BYTES = {k.encode("ascii"): v for k, v in _LCOV_COUNTS_INDEX.items()}
+
+
+class LcovParser(object):
+    """
+    Line-oriented parser of LCOV tracefiles. Only the summary records of each source file (LF, LH, BRF, BRH) are
+    tallied: the source is read by chunks of `chunk_size` characters (or scanned in place if it is memory-mapped) and
+    these records are found with a regular expression anchored at the start of lines, so that the detailed DA and
+    BRDA records (the vast majority of the lines) are skipped without being parsed. The memory used does not depend
+    on the file size.
+    """
+
+    def __init__(self,
+                 details=False,         # type: bool
+                 chunk_size=1024 * 1024  # type: int
+                 ):
+        self.details = details
+        self.chunk_size = chunk_size
+
+    def parse(self, source):
+        cov = CoverageStats(complexity=0, branches_covered=0, branches_valid=0, lines_covered=0, lines_valid=0)
+        packages = dict()
+        files = dict()
+
+        filename = None
+        counts = [0, 0, 0, 0]
+        for key, value in self.iter_records(source):
+            if key is not None:
+                counts[key] += int(value)
+            else:
+                # new source file
+                self.add_file(cov, packages, files, filename, counts)
+                filename = value if isinstance(value, str) else value.decode("utf-8")
+                counts = [0, 0, 0, 0]
+
+        self.add_file(cov, packages, files, filename, counts)
+
+        cov.branch_option = cov.branches_valid > 0
+        if self.details:
+            _set_details(cov, packages, files)
+
+        return cov
+
+    def iter_records(self, source):
+        """
+        Yields a tuple (index in the counts, value) for each LH, LF, BRH and BRF record, and (None, file name) for
+        each SF record of `source`, a memory map or a text or binary stream.
+        """
+        if isinstance(source, mmap.mmap):
+            # the whole file can be scanned in place, without copying it by chunks
+            for match in _LCOV_RECORDS_PATTERN_BYTES.finditer(source):
+                key, value = match.groups()
+                yield _LCOV_COUNTS_INDEX_BYTES.get(key), value
+            return
+
+        pattern = index = newline = rest = None
+        while True:
+            data = source.read(self.chunk_size)
+            if pattern is None:
+                if isinstance(data, str):
+                    pattern, index, newline, rest = _LCOV_RECORDS_PATTERN, _LCOV_COUNTS_INDEX, "\n", ""
+                else:
+                    pattern, index, newline, rest = _LCOV_RECORDS_PATTERN_BYTES, _LCOV_COUNTS_INDEX_BYTES, b"\n", b""
+
+            if data:
+                # only scan the complete lines, the last one is completed with the next chunk
+                chunk = rest + data
+                end = chunk.rfind(newline) + 1
+                rest = chunk[end:]
+            else:
+                # end of file: the last line has no newline
+                chunk, end = rest, len(rest)
+
+            for match in pattern.finditer(chunk, 0, end):
+                key, value = match.groups()
+                yield index.get(key), value
+
+            if not data:
+                break
+
+    def add_file(self,
+                 cov,       # type: CoverageStats
+                 packages,  # type: Dict[str, CoverageStats]
+                 files,     # type: Dict[str, CoverageStats]
+                 filename,  # type: Optional[str]
+                 counts     # type: List[int]
+                 ):
+        """Adds the counts of source file `filename` to the total, and to its file and package (folder) stats"""
+        _add_counts(cov, counts)
+        if self.details and filename is not None:
+            _add_counts(_get_or_create_stats(files, filename), counts)
+            package_name = os.path.dirname(filename.replace("\\", "/")) or "."
+            _add_counts(_get_or_create_stats(packages, package_name), counts)
@@ -0,0 +1,168 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Incremental regeneration of the badges: a manifest stored next to each badge records what it was generated from, so
+that the badge is only regenerated when its input files, the options or the genbadge version change.
+"""
+import hashlib
+import json
+import mmap
+import os
+
+try:
+    from typing import Any, Dict, List, Optional
+except ImportError:  # pragma: no cover
+    pass
+
+from .utils_io import open_binary_source
+
+
+# The manifest of badge `<badge>.svg` is stored in `<badge>.svg.genbadge.json`
+MANIFEST_SUFFIX = ".genbadge.json"
+# The version of the manifest contents. Manifests with another version are ignored
+MANIFEST_FORMAT = 1
+
+
+def get_manifest_path(badge_path  # type: str
+                      ):
+    # type: (...) -> str
+    """Returns the path of the manifest of badge file `badge_path`"""
+    return badge_path + MANIFEST_SUFFIX
+
+
+def hash_file(file_path  # type: str
+              ):
+    # type: (...) -> str
+    """Returns the SHA-256 hash of the contents of file `file_path`, as an hexadecimal string"""
+    sha = hashlib.sha256()
+    with open_binary_source(file_path) as f:
+        if isinstance(f, mmap.mmap):
+            sha.update(f)
+        else:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+class BadgeManifest(object):
+    """
+    The manifest of a badge file: the size, modification time and SHA-256 hash of each input file, the options and the
+    genbadge version used to generate the badge, and the SHA-256 hash of the badge.
+
+    `is_up_to_date` tells if the badge can be left as is. The input files are only hashed if their size did not
+    change but their modification time did (e.g. a report regenerated with the same contents), or when the manifest
+    is saved.
+    """
+    def __init__(self,
+                 badge_path,    # type: str
+                 command,       # type: str
+                 options,       # type: Dict[str, Any]
+                 input_paths,   # type: List[str]
+                 version=None   # type: str
+                 ):
+        if version is None:
+            from . import __version__ as version
+
+        self.badge_path = badge_path
+        self.path = get_manifest_path(badge_path)
+        self.command = command
+        self.options = options
+        self.input_paths = list(input_paths)
+        self.version = version
+
+        # the size, modification time and hash of the input files, as seen before parsing them
+        self._inputs = dict()  # type: Dict[str, Dict[str, Any]]
+
+    def __repr__(self):
+        return "%s(badge_path=%r, command=%r, input_paths=%r)" % (self.__class__.__name__, self.badge_path,
+                                                                  self.command, self.input_paths)
+
+    def _get_input(self, input_path, with_hash):
+        """Returns the size, modification time and optionally the hash of input file `input_path`"""
+        file_info = self._inputs.get(input_path)
+        if file_info is None:
+            st = os.stat(input_path)
+            file_info = self._inputs[input_path] = dict(path=input_path, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        if with_hash and "sha256" not in file_info:
+            file_info["sha256"] = hash_file(input_path)
+        return file_info
+
+    def load(self):
+        # type: (...) -> Optional[Dict[str, Any]]
+        """Returns the contents of the manifest file, or None if it does not exist or can not be read"""
+        try:
+            with open(self.path, mode="rt") as f:
+                contents = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(contents, dict) or contents.get("format") != MANIFEST_FORMAT:
+            return None
+        return contents
+
+    def is_up_to_date(self):
+        # type: (...) -> bool
+        """
+        Returns True if the badge was generated by the same genbadge version and command, with the same options, from
+        input files with the same contents, and was not modified since.
+        """
+        try:
+            current_inputs = [self._get_input(p, with_hash=False) for p in self.input_paths]
+        except (IOError, OSError):
+            return False  # missing input file, reported when parsing it
+
+        previous = self.load()
+        if previous is None \
+                or previous.get("version") != self.version \
+                or previous.get("command") != self.command \
+                or previous.get("options") != self.options:
+            return False
+
+        try:
+            previous_inputs = previous["inputs"]
+            if [i["path"] for i in previous_inputs] != self.input_paths:
+                return False
+
+            for file_info, previous_input in zip(current_inputs, previous_inputs):
+                if file_info["size"] != previous_input["size"]:
+                    return False
+                if file_info["mtime_ns"] != previous_input["mtime_ns"] \
+                        and self._get_input(file_info["path"], with_hash=True)["sha256"] != previous_input["sha256"]:
+                    return False
+
+            return hash_file(self.badge_path) == previous["badge_sha256"]
+        except (IOError, OSError, KeyError, TypeError):
+            # missing badge, or invalid manifest
+            return False
+
+    def save(self):
+        """
+        Writes the manifest file. It should be called once the badge was written: the input files are described as
+        they were when `is_up_to_date` was called, so that an input file modified in the meantime is detected the next
+        time.
+        """
+        inputs = []
+        for input_path in self.input_paths:
+            file_info = self._get_input(input_path, with_hash=True)
+            st = os.stat(input_path)
+            if st.st_size != file_info["size"] or st.st_mtime_ns != file_info["mtime_ns"]:
+                # modified since it was parsed: the recorded hash may not match, make sure the badge is regenerated
+                file_info = dict(file_info, sha256=None)
+            inputs.append(file_info)
+
+        contents = dict(
+            format=MANIFEST_FORMAT,
+            version=self.version,
+            command=self.command,
+            options=self.options,
+            inputs=inputs,
+            badge_sha256=hash_file(self.badge_path),
+        )
+
+        # write to a temporary file first so that an interrupted run never leaves a half-written manifest
+        tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+        with open(tmp_path, mode="wt") as f:
+            json.dump(contents, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,292 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+A small asyncio HTTP server generating the badges on demand, so that they do not need to be committed:
+
+ - `/badge/<label>/<message>/<color>` returns a static badge, as shields.io does.
+ - `/tests`, `/coverage` and `/flake8` return the badge for the default report file (e.g. `reports/junit/junit.xml`)
+   in the served folder. `/tests/<path>` uses the report in subfolder `<path>` of the served folder instead, so that
+   the badges of many repositories can be served at once. The `name` query parameter changes the left-hand side text.
+
+The rendered badges are kept in an LRU cache, and sent with an `ETag` so that conditional requests are answered with
+`304 Not Modified`. The reports are only parsed again when their size or modification time change.
+
+This module requires python 3.7 or later.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    from typing import Any, Dict, Tuple
+except ImportError:  # pragma: no cover
+    pass
+
+from .utils_badge import COLORS, get_svg_badge
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Default maximum number of rendered badges kept in memory
+DEFAULT_CACHE_SIZE = 1024
+
+# The report file used for each kind of badge, relative to the served folder or to the `<path>` in the url
+REPORT_FILES = {
+    "tests": "reports/junit/junit.xml",
+    "coverage": "reports/coverage/coverage.xml",
+    "flake8": "reports/flake8/flake8stats.txt",
+}
+
+# Static badges never change. The badges of the reports can be cached by clients, but should be revalidated
+STATIC_CACHE_CONTROL = "public, max-age=86400, immutable"
+REPORT_CACHE_CONTROL = "no-cache"
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            500: "Internal Server Error"}
+_HEX_COLOR_PATTERN = re.compile(r"#?([0-9a-fA-F]{3}|[0-9a-fA-F]{6})$")
+
+
+class LRUCache(object):
+    """A mapping keeping at most `maxsize` entries: the least recently used entry is removed when it is full"""
+
+    def __init__(self,
+                 maxsize=DEFAULT_CACHE_SIZE  # type: int
+                 ):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the entry for `key`, or None"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores `value` as the entry for `key`, and removes the least recently used entry if the cache is full"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+def render_report_badge(kind,       # type: str
+                        file_path,  # type: str
+                        name        # type: str
+                        ):
+    # type: (...) -> str
+    """Parses report `file_path` and returns the SVG of the `kind` badge ("tests", "coverage" or "flake8")"""
+    if kind == "tests":
+        from .utils_junit import get_test_stats, get_tests_badge
+        badge = get_tests_badge(get_test_stats(junit_xml_file=file_path), name)
+    elif kind == "coverage":
+        from .utils_coverage import get_coverage_badge, get_coverage_stats
+        badge = get_coverage_badge(get_coverage_stats(coverage_xml_file=file_path), name)
+    elif kind == "flake8":
+        from .utils_flake8 import get_flake8_stats, get_flake8_badge
+        badge = get_flake8_badge(get_flake8_stats(flake8_stats_file=file_path), name)
+    else:
+        raise ValueError("Unknown badge kind: %r" % kind)
+
+    return badge.as_svg(use_shields=False)
+
+
+class BadgeServer(object):
+    """
+    Serves the static badges and the badges of the reports found in folder `root`, see the module documentation.
+    The badges are always generated from the local SVG template.
+    """
+    def __init__(self,
+                 root=".",                        # type: str
+                 cache_size=DEFAULT_CACHE_SIZE    # type: int
+                 ):
+        self.root = os.path.realpath(root)
+        self.cache = LRUCache(cache_size)
+        # the reports being parsed, so that concurrent requests for the same badge only parse it once
+        self._pending = dict()  # type: Dict[Tuple, asyncio.Future]
+
+    def __repr__(self):
+        return "%s(root=%r, cache_size=%r)" % (self.__class__.__name__, self.root, self.cache.maxsize)
+
+    async def get_response(self,
+                           method,   # type: str
+                           target,   # type: str
+                           headers   # type: Dict[str, str]
+                           ):
+        # type: (...) -> Tuple[int, Dict[str, str], bytes]
+        """Returns the (status, headers, body) response to the request for url `target`"""
+        if method not in ("GET", "HEAD"):
+            return _text_response(405, "Method not allowed: %s" % method, Allow="GET, HEAD")
+
+        url = urlsplit(target)
+        if not url.path.startswith("/"):
+            return _text_response(400, "Invalid request target: %r" % target)
+        # unquote after splitting, so that the texts may contain (quoted) slashes
+        segments = [unquote(s) for s in url.path.split("/")[1:]]
+
+        if segments[0] == "badge":
+            if len(segments) != 4:
+                return _text_response(404, "Badge urls are /badge/<label>/<message>/<color>")
+            label, message, color = segments[1:]
+            if color.endswith(".svg"):
+                color = color[:-len(".svg")]
+            if color not in COLORS:
+                match = _HEX_COLOR_PATTERN.match(color)
+                if match is None:
+                    return _text_response(400, "Invalid color: %r" % color)
+                color = "#" + match.group(1)
+            entry = self._get_static_badge(label, message, color)
+            cache_control = STATIC_CACHE_CONTROL
+
+        elif segments[0] in REPORT_FILES:
+            kind = segments[0]
+            folder = os.path.realpath(os.path.join(self.root, *segments[1:]))
+            if folder != self.root and not folder.startswith(os.path.join(self.root, "")):
+                return _text_response(404, "Not found: %s" % url.path)
+            name = parse_qs(url.query).get("name", [kind])[0]
+            try:
+                entry = await self._get_report_badge(kind, os.path.join(folder, REPORT_FILES[kind]), name)
+            except (IOError, OSError):
+                return _text_response(404, "No %s report found for %s" % (kind, url.path))
+            except Exception:
+                # the details of the error are not sent to the client
+                return _text_response(500, "Error while reading the %s report for %s" % (kind, url.path))
+            cache_control = REPORT_CACHE_CONTROL
+
+        else:
+            return _text_response(404, "Not found: %s" % url.path)
+
+        svg, etag = entry
+        response_headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+            return 304, response_headers, b""
+
+        response_headers["Content-Type"] = "image/svg+xml; charset=utf-8"
+        return 200, response_headers, svg
+
+    def _get_static_badge(self, label, message, color):
+        key = ("badge", label, message, color)
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = self._put(key, get_svg_badge(label_txt=label, msg_txt=message, color=color))
+        return entry
+
+    async def _get_report_badge(self, kind, file_path, name):
+        st = os.stat(file_path)
+        key = (kind, file_path, st.st_size, st.st_mtime_ns, name)
+        entry = self.cache.get(key)
+        if entry is None:
+            future = self._pending.get(key)
+            if future is None:
+                # parse the report in a thread so that the other requests are still served meanwhile
+                future = asyncio.get_running_loop().run_in_executor(None, render_report_badge, kind, file_path, name)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._pending.pop(key, None))
+            entry = self._put(key, await future)
+        return entry
+
+    def _put(self, key, svg):
+        svg = svg.encode("utf-8")
+        entry = svg, '"%s"' % hashlib.sha256(svg).hexdigest()[:32]
+        self.cache.put(key, entry)
+        return entry
+
+    async def handle(self,
+                     reader,  # type: asyncio.StreamReader
+                     writer   # type: asyncio.StreamWriter
+                     ):
+        """Handles the HTTP/1.1 requests received on a connection, that is kept alive unless asked otherwise"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, "GET", _text_response(400, "Invalid request line"), keep_alive=False)
+                    break
+
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    header_name, _, value = line.decode("latin-1").partition(":")
+                    headers[header_name.strip().lower()] = value.strip()
+
+                # request bodies are ignored
+                content_length = headers.get("content-length")
+                if content_length:
+                    await reader.readexactly(int(content_length))
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                response = await self.get_response(method, target, headers)
+                await self._send(writer, method, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client gone, or invalid request
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, method, response, keep_alive):
+        status, headers, body = response
+        lines = ["HTTP/1.1 %s %s" % (status, _REASONS[status])]
+        lines += ["%s: %s" % h for h in headers.items()]
+        lines.append("Content-Length: %s" % len(body))
+        lines.append("Connection: %s" % ("keep-alive" if keep_alive else "close"))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+
+    async def start(self,
+                    host=DEFAULT_HOST,  # type: str
+                    port=DEFAULT_PORT   # type: int
+                    ):
+        # type: (...) -> asyncio.AbstractServer
+        """Starts serving on `host`:`port` and returns the `asyncio` server. Use port 0 to use any free port"""
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def serve(root=".",                       # type: str
+          host=DEFAULT_HOST,              # type: str
+          port=DEFAULT_PORT,              # type: int
+          cache_size=DEFAULT_CACHE_SIZE,  # type: int
+          on_start=None                   # type: Any
+          ):
+    """
+    Serves the badges of the reports in folder `root` on `host`:`port` until interrupted. `on_start` is called with
+    the (host, port) socket address once the server is started.
+    """
+    async def _serve():
+        server = await BadgeServer(root, cache_size=cache_size).start(host, port)
+        if on_start is not None:
+            on_start(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(_serve())
+
+
+def _text_response(status, message, **headers):
+    headers["Content-Type"] = "text/plain; charset=utf-8"
+    return status, headers, message.encode("utf-8")
@@ -0,0 +1,361 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from warnings import warn
+
+try:
+    from pathlib import Path
+except ImportError:  # pragma: no cover
+    from pathlib2 import Path  # python 2
+
+try:
+    from urllib.parse import quote
+except ImportError:  # pragma: no cover
+    from urllib import quote  # python 2
+
+try:
+    from typing import Iterable, List, Optional, Tuple, Union
+except ImportError:  # pragma: no cover
+    pass
+
+
+SHIELDS_URL_TEMPLATE = "https://img.shields.io/badge/%s-%s-%s.svg"
+
+# Default connect and read timeouts of the shields.io requests, in seconds
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+# Default number of retries of failed shields.io requests, and backoff factor between retries
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 0.5
+# Default maximum number of connections kept alive in the pool
+DEFAULT_POOL_SIZE = 10
+# Default maximum number of badges downloaded concurrently
+DEFAULT_MAX_WORKERS = 8
+
+# Default time-to-live of the cached badges, in seconds
+DEFAULT_CACHE_TTL = 24 * 3600
+# Default maximum total size of the cached badges, in bytes
+DEFAULT_CACHE_MAX_SIZE = 10 * 1024 * 1024
+
+
+class ShieldsError(IOError):
+    """Raised when a badge can not be downloaded from shields.io"""
+
+
+def get_shields_url(left_txt,  # type: str
+                    right_txt,  # type: str
+                    color       # type: str
+                    ):
+    # type: (...) -> str
+    """Returns the shields.io url to use to download the badge with the given texts and color"""
+    safe_left_txt = quote(left_txt, safe='')
+    safe_right_txt = quote(right_txt, safe='')
+    safe_color_txt = quote(color, safe='')
+    return SHIELDS_URL_TEMPLATE % (safe_left_txt, safe_right_txt, safe_color_txt)
+
+
+class ShieldsCache(object):
+    """
+    A content-addressed on-disk cache for the badges downloaded from shields.io.
+
+    Each entry is stored in a file named after the SHA-256 hash of the badge url. Entries older than `ttl` seconds are
+    ignored, and the oldest entries are removed when the total size of the cache exceeds `max_size` bytes.
+    """
+    def __init__(self,
+                 cache_dir,                      # type: Union[str, Path]
+                 ttl=DEFAULT_CACHE_TTL,          # type: float
+                 max_size=DEFAULT_CACHE_MAX_SIZE  # type: int
+                 ):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        # the total size of the entries, listed on the first write and then updated as entries are written
+        self._total_size = None  # type: Optional[int]
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s(cache_dir=%r, ttl=%r, max_size=%r)" % (self.__class__.__name__, str(self.cache_dir), self.ttl,
+                                                          self.max_size)
+
+    def _entry_path(self, url):
+        return self.cache_dir / ("%s.svg" % hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def get(self,
+            url  # type: str
+            ):
+        # type: (...) -> Optional[str]
+        """Returns the cached SVG for `url`, or None if there is no valid entry"""
+        entry_path = self._entry_path(url)
+        try:
+            if time.time() - entry_path.stat().st_mtime > self.ttl:
+                return None
+            return entry_path.read_bytes().decode("utf-8")
+        except (IOError, OSError):
+            return None
+
+    def put(self,
+            url,  # type: str
+            svg   # type: str
+            ):
+        """
+        Stores `svg` as the entry for `url`, and removes the oldest entries if the cache is too large. Errors (e.g. a
+        read-only or full disk) are only warned about, so that the cache never makes the badge generation fail.
+        """
+        entry_path = self._entry_path(url)
+        svg_bytes = svg.encode("utf-8")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if self._total_size is None:
+                    self._total_size = sum(size for _, size, _ in self._list_entries())
+            try:
+                old_size = entry_path.stat().st_size
+            except (IOError, OSError):
+                old_size = 0
+
+            # write to a unique temporary file first so that concurrent readers never see a half-written entry, and
+            # concurrent writers of the same entry do not conflict
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=str(self.cache_dir))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(svg_bytes)
+                os.replace(tmp_path, str(entry_path))
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except (IOError, OSError):
+                    pass
+                raise
+        except (IOError, OSError) as e:
+            warn("Could not store the badge in the shields.io cache %r: %r" % (str(self.cache_dir), e))
+            return
+
+        # the entries are only listed again when the cache becomes too large
+        with self._lock:
+            self._total_size += len(svg_bytes) - old_size
+            too_large = self._total_size > self.max_size
+        if too_large:
+            self.prune()
+
+    def _list_entries(self):
+        # type: (...) -> List[Tuple[float, int, Path]]
+        """Returns the (modification time, size, path) of all entries"""
+        entries = []
+        for entry_path in self.cache_dir.glob("*.svg"):
+            try:
+                st = entry_path.stat()
+            except (IOError, OSError):
+                continue  # removed concurrently
+            entries.append((st.st_mtime, st.st_size, entry_path))
+        return entries
+
+    def prune(self):
+        """Removes the oldest entries until the total size of the cache is below `max_size`"""
+        try:
+            entries = self._list_entries()
+        except (IOError, OSError) as e:
+            warn("Could not list the entries of the shields.io cache %r: %r" % (str(self.cache_dir), e))
+            return
+
+        total_size = sum(size for _, size, _ in entries)
+        if total_size > self.max_size:
+            for _, size, entry_path in sorted(entries):
+                try:
+                    entry_path.unlink()
+                except (IOError, OSError):
+                    continue
+                total_size -= size
+                if total_size <= self.max_size:
+                    break
+
+        with self._lock:
+            self._total_size = total_size
+
+
+# The current cache, see `set_shields_cache`
+_shields_cache = None  # type: Optional[ShieldsCache]
+
+
+def set_shields_cache(cache_dir,                       # type: Optional[Union[str, Path]]
+                      ttl=DEFAULT_CACHE_TTL,           # type: float
+                      max_size=DEFAULT_CACHE_MAX_SIZE  # type: int
+                      ):
+    """
+    Enables the on-disk cache of badges downloaded from shields.io, in directory `cache_dir`. Use `cache_dir=None` to
+    disable it (default).
+
+    :param cache_dir: the directory where to store the cached badges, or None to disable the cache.
+    :param ttl: the time-to-live of cached badges, in seconds. Default is one day.
+    :param max_size: the maximum total size of the cached badges, in bytes. Default is 10MB.
+    """
+    global _shields_cache
+    _shields_cache = ShieldsCache(cache_dir, ttl=ttl, max_size=max_size) if cache_dir is not None else None
+
+
+def get_shields_cache():
+    # type: (...) -> Optional[ShieldsCache]
+    """Returns the current on-disk cache of shields.io badges, or None if it is disabled."""
+    return _shields_cache
+
+
+class ShieldsSession(object):
+    """
+    A pooled `requests.Session` to download badges from shields.io, with keep-alive connections, connect/read timeouts
+    and bounded retries with backoff.
+    """
+    def __init__(self,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,  # type: float
+                 read_timeout=DEFAULT_READ_TIMEOUT,        # type: float
+                 retries=DEFAULT_RETRIES,                  # type: int
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR,    # type: float
+                 pool_size=DEFAULT_POOL_SIZE               # type: int
+                 ):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self,
+            url  # type: str
+            ):
+        # type: (...) -> str
+        """Downloads the badge at `url` and returns its SVG text. Raises a `ShieldsError` if it fails"""
+        import requests
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ShieldsError("Error while downloading %r: %r" % (url, e))
+
+        if response.status_code != 200:
+            raise ShieldsError("Error while downloading %r: HTTP status %s" % (url, response.status_code))
+
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+
+# The current session, created on first use. See `set_shields_session_options`
+_shields_session = None  # type: Optional[ShieldsSession]
+_shields_session_options = dict()
+# Protects the creation of the session, that can happen concurrently in the workers of `get_shields_svgs`
+_shields_session_lock = threading.Lock()
+
+
+def set_shields_session_options(connect_timeout=DEFAULT_CONNECT_TIMEOUT,  # type: float
+                                read_timeout=DEFAULT_READ_TIMEOUT,        # type: float
+                                retries=DEFAULT_RETRIES,                  # type: int
+                                backoff_factor=DEFAULT_BACKOFF_FACTOR,    # type: float
+                                pool_size=DEFAULT_POOL_SIZE               # type: int
+                                ):
+    """
+    Changes the options of the pooled HTTP session used to download badges from shields.io. The current session, if
+    any, is closed.
+
+    :param connect_timeout: the connection timeout, in seconds.
+    :param read_timeout: the read timeout, in seconds.
+    :param retries: the maximum number of retries of a failed request.
+    :param backoff_factor: the backoff factor between retries, see `urllib3.util.retry.Retry`.
+    :param pool_size: the maximum number of connections kept alive in the pool.
+    """
+    global _shields_session, _shields_session_options
+    with _shields_session_lock:
+        _shields_session_options = dict(connect_timeout=connect_timeout, read_timeout=read_timeout, retries=retries,
+                                        backoff_factor=backoff_factor, pool_size=pool_size)
+        if _shields_session is not None:
+            _shields_session.close()
+            _shields_session = None
+
+
+def get_shields_session():
+    # type: (...) -> ShieldsSession
+    """Returns the pooled HTTP session used to download badges from shields.io, creating it if needed"""
+    global _shields_session
+    session = _shields_session
+    if session is None:
+        with _shields_session_lock:
+            if _shields_session is None:
+                _shields_session = ShieldsSession(**_shields_session_options)
+            session = _shields_session
+    return session
+
+
+def get_shields_svg(left_txt,  # type: str
+                    right_txt,  # type: str
+                    color       # type: str
+                    ):
+    # type: (...) -> str
+    """
+    Returns the SVG badge with the given texts and color from shields.io. If the on-disk cache is enabled (see
+    `set_shields_cache`) and contains the badge, the network is not used at all.
+
+    A `ShieldsError` is raised if the badge can not be downloaded.
+    """
+    url = get_shields_url(left_txt, right_txt, color)
+
+    cache = _shields_cache
+    if cache is not None:
+        svg = cache.get(url)
+        if svg is not None:
+            return svg
+
+    svg = _download(url)
+
+    if cache is not None:
+        cache.put(url, svg)
+
+    return svg
+
+
+def get_shields_svgs(specs,                           # type: Iterable[Tuple[str, str, str]]
+                     max_workers=DEFAULT_MAX_WORKERS,  # type: int
+                     return_errors=False               # type: bool
+                     ):
+    # type: (...) -> List[Union[str, ShieldsError]]
+    """
+    Downloads several badges from shields.io concurrently, over the shared connection pool.
+
+    :param specs: an iterable of (left_txt, right_txt, color) tuples
+    :param max_workers: the maximum number of badges downloaded concurrently. Note that the connection pool size (see
+        `set_shields_session_options`) should be at least as large to benefit from keep-alive.
+    :param return_errors: if True, a `ShieldsError` is returned in place of each badge that can not be downloaded.
+        Otherwise (default) the first error is raised.
+    :return: the list of SVG strings, in the same order as `specs`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _get(spec):
+        try:
+            return get_shields_svg(*spec)
+        except ShieldsError as e:
+            if return_errors:
+                return e
+            raise
+
+    specs = list(specs)
+    if len(specs) <= 1:
+        return [_get(spec) for spec in specs]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(specs))) as executor:
+        # map() returns the results in input order
+        return list(executor.map(_get, specs))
+
+
+def _download(url  # type: str
+              ):
+    # type: (...) -> str
+    """Downloads the badge at `url` using the pooled session. Raises a `ShieldsError` if it fails"""
+    return get_shields_session().get(url)
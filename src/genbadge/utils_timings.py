@@ -0,0 +1,94 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Per-stage timings of the commands: input files resolution, parsing, statistics, badge rendering (or download from
+shields.io) and writing.
+
+The commands record the end of each stage with `timings.lap(stage)`. When the timings are not requested, `timings` is
+`NO_TIMINGS`, whose methods do nothing, so that the instrumentation costs nothing.
+"""
+import time
+from collections import OrderedDict
+
+try:
+    from typing import Any, Dict
+except ImportError:  # pragma: no cover
+    pass
+
+
+class StageTimings(object):
+    """Records the duration of the successive stages of a command, in seconds"""
+    def __init__(self):
+        self.stages = OrderedDict()  # type: Dict[str, float]
+        self.start = self._last = time.perf_counter()
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join("%s=%.6f" % s for s in self.stages.items()))
+
+    def lap(self,
+            stage  # type: str
+            ):
+        """Records the time elapsed since the previous lap (or since creation) as the duration of `stage`"""
+        now = time.perf_counter()
+        self.add(stage, now - self._last)
+        self._last = now
+
+    def restart(self):
+        """Starts the next stage now, so that the time elapsed since the previous lap (e.g. waiting) is not recorded"""
+        self._last = time.perf_counter()
+
+    def add(self,
+            stage,    # type: str
+            duration  # type: float
+            ):
+        """Adds `duration` to the duration of `stage`, so that repeated stages (e.g. in --watch mode) are summed"""
+        self.stages[stage] = self.stages.get(stage, 0.) + duration
+
+    def child(self):
+        # type: (...) -> StageTimings
+        """Returns new timings, e.g. for the stages of a job run in a thread. See `update`"""
+        return StageTimings()
+
+    def update(self,
+               other,  # type: StageTimings
+               suffix  # type: str
+               ):
+        """Adds the stages of `other` to these timings, with `suffix` appended to their names"""
+        for stage, duration in other.stages.items():
+            self.add("%s (%s)" % (stage, suffix), duration)
+
+    def as_dict(self):
+        # type: (...) -> Dict[str, Any]
+        """Returns the durations of the stages and the total duration since creation, as a json-able dictionary"""
+        return OrderedDict([("stages", OrderedDict(self.stages)), ("total", time.perf_counter() - self.start)])
+
+    def format(self):
+        # type: (...) -> str
+        """Returns the durations as a human-readable text, in milliseconds"""
+        durations = list(self.stages.items()) + [("total", self.as_dict()["total"])]
+        width = max(len(stage) for stage, _ in durations) + 1
+        return "\n".join(" - %s %9.2f ms" % ((stage + ":").ljust(width), duration * 1000)
+                         for stage, duration in durations)
+
+
+class NoTimings(object):
+    """The timings used when they are not requested: nothing is recorded"""
+    def lap(self, stage):
+        pass
+
+    def restart(self):
+        pass
+
+    def add(self, stage, duration):
+        pass
+
+    def child(self):
+        return self
+
+    def update(self, other, suffix):
+        pass
+
+
+NO_TIMINGS = NoTimings()
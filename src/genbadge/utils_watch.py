@@ -0,0 +1,228 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Watches the input files of the badges, so that the badges are generated again as soon as the reports change.
+"""
+import errno
+import os
+import struct
+import sys
+import time
+from fnmatch import fnmatch
+from glob import glob
+
+try:
+    from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+except ImportError:  # pragma: no cover
+    pass
+
+from .utils_io import is_glob_pattern
+
+
+# Time without any change of the watched files before calling back, in seconds, so that files that are being written
+# (e.g. a junit.xml written by chunks) are not read before they are complete
+DEFAULT_DEBOUNCE = 0.5
+# Interval between two checks of the watched files, in seconds, when inotify is not available
+DEFAULT_POLL_INTERVAL = 0.5
+# Maximum time waiting for changes before checking the `stop` event, in seconds
+WAIT_TIMEOUT = 1.0
+
+# inotify constants, see <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# the events watched on the folders of the input files: modifications are watched so that the debounce period is
+# extended while a file is being written, and files replaced by a rename are detected
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def watch_files(patterns,                   # type: Iterable[str]
+                callback,                   # type: Callable[[List[str]], None]
+                debounce=DEFAULT_DEBOUNCE,  # type: float
+                polling=False,              # type: bool
+                stop=None                   # type: Optional[object]
+                ):
+    """
+    Calls `callback(changed)` each time some of the files in `patterns` (file paths or glob patterns) change, until
+    `stop` (a `threading.Event`) is set or the process is interrupted. `changed` is the sorted list of the patterns
+    whose files changed.
+
+    Changes are debounced: the callback is only called once no change happened for `debounce` seconds, so that a file
+    being written is not read before it is complete, and several files changed together trigger a single call.
+
+    :param polling: if True, the files are checked every `DEFAULT_POLL_INTERVAL` seconds instead of being watched with
+        inotify. This is always the case if inotify is not available (non-linux platforms), or for recursive glob
+        patterns.
+    """
+    watcher = get_file_watcher(patterns, polling=polling)
+    try:
+        pending = set()  # type: Set[str]
+        while stop is None or not stop.is_set():
+            changed = watcher.wait(debounce if pending else WAIT_TIMEOUT)
+            if changed:
+                # wait until the files do not change anymore
+                pending.update(changed)
+            elif pending:
+                callback(sorted(pending))
+                pending = set()
+    finally:
+        watcher.close()
+
+
+def get_file_watcher(patterns,      # type: Iterable[str]
+                     polling=False  # type: bool
+                     ):
+    """
+    Returns an `InotifyWatcher` for `patterns`, or a `PollingWatcher` if `polling` is True, if inotify is not
+    available, or if a pattern has wildcards in its folder (e.g. `reports/*/junit.xml` or `**`): inotify does not
+    watch the subfolders of a watched folder.
+    """
+    patterns = [os.path.abspath(p) for p in patterns]
+    if not polling and not any(is_glob_pattern(os.path.dirname(p)) for p in patterns):
+        try:
+            return InotifyWatcher(patterns)
+        except OSError:
+            pass  # not linux, or no more inotify instances/watches available
+
+    return PollingWatcher(patterns)
+
+
+def _matches(path, pattern):
+    """Returns True if absolute file path `path` is `pattern` or matches glob pattern `pattern`"""
+    return path == pattern or (is_glob_pattern(pattern) and fnmatch(path, pattern))
+
+
+class PollingWatcher(object):
+    """
+    Detects the changes of the files in `patterns` by comparing their size and modification time every `interval`
+    seconds. Glob patterns are expanded each time, so that new matching files are detected.
+    """
+    def __init__(self,
+                 patterns,                        # type: List[str]
+                 interval=DEFAULT_POLL_INTERVAL   # type: float
+                 ):
+        self.patterns = patterns
+        self.interval = interval
+        self._states = self._get_states()
+
+    def _get_states(self):
+        # type: (...) -> Dict[str, Tuple]
+        """Returns the (path, size, modification time) of the files of each pattern"""
+        states = dict()
+        for pattern in self.patterns:
+            file_states = []
+            for file_path in (sorted(glob(pattern, recursive=True)) if is_glob_pattern(pattern) else (pattern,)):
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue  # missing file
+                file_states.append((file_path, st.st_size, st.st_mtime_ns))
+            states[pattern] = tuple(file_states)
+        return states
+
+    def wait(self,
+             timeout  # type: float
+             ):
+        # type: (...) -> Set[str]
+        """Waits at most `timeout` seconds for changes. Returns the patterns whose files changed, if any"""
+        deadline = time.monotonic() + timeout
+        while True:
+            states = self._get_states()
+            changed = {p for p, state in states.items() if state != self._states[p]}
+            self._states = states
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detects the changes of the files in `patterns` with the linux inotify API, called with `ctypes`. The folders of the
+    files are watched rather than the files themselves, so that files replaced by a rename (or created later) are
+    detected. Glob patterns can only have wildcards in their file name, since inotify does not watch subfolders.
+
+    An `OSError` is raised if inotify is not available.
+    """
+    def __init__(self,
+                 patterns  # type: List[str]
+                 ):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on linux")
+
+        import ctypes
+        import ctypes.util
+
+        for pattern in patterns:
+            if is_glob_pattern(os.path.dirname(pattern)):
+                raise ValueError("Wildcards in folder names can not be watched with inotify: %r" % pattern)
+
+        self.patterns = patterns
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+        # the watched folders
+        self._folders = dict()  # type: Dict[int, str]
+        try:
+            for folder in sorted({os.path.dirname(p) for p in patterns}):
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+                if wd < 0:
+                    e = ctypes.get_errno()
+                    raise OSError(e, os.strerror(e), folder)
+                self._folders[wd] = folder
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self,
+             timeout  # type: float
+             ):
+        # type: (...) -> Set[str]
+        """Waits at most `timeout` seconds for changes. Returns the patterns whose files changed, if any"""
+        import select
+
+        changed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except (IOError, OSError) as e:
+                if e.errno == errno.EAGAIN:
+                    return changed  # no more events
+                raise
+
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, pos)
+                pos += _EVENT_HEADER.size
+                name = data[pos:pos + name_len].rstrip(b"\0")
+                pos += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    # some events were lost
+                    changed.update(self.patterns)
+                elif wd in self._folders and name:
+                    file_path = os.path.join(self._folders[wd], os.fsdecode(name))
+                    changed.update(p for p in self.patterns if _matches(file_path, p))
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
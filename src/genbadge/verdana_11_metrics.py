@@ -0,0 +1,54 @@
+#  Authors: Sylvain MARIE <sylvain.marie@se.com>
+#            + All contributors to <https://github.com/smarie/python-genbadge>
+#
+#  License: 3-clause BSD, <https://github.com/smarie/python-genbadge/blob/master/LICENSE>
+"""
+Precomputed glyph metrics of the embedded `verdana.ttf` font at size 11.
+
+This file is generated by `ci_tools/generate_font_metrics.py` - do not edit it manually.
+"""
+
+FONT_NAME = 'Verdana'
+FONT_SIZE = 11
+
+# FreeType version used by pillow when this file was generated
+FREETYPE_VERSION = '2.14.3'
+
+# Glyph advances, in 26.6 fixed point units (1/64th of a pixel)
+ADVANCES = {
+    ' ': 256, '!': 256, '"': 320, '#': 576, '$': 448, '%': 768, '&': 512, "'": 192,
+    '(': 320, ')': 320, '*': 448, '+': 576, ',': 256, '-': 320, '.': 256, '/': 320,
+    '0': 448, '1': 448, '2': 448, '3': 448, '4': 448, '5': 448, '6': 448, '7': 448,
+    '8': 448, '9': 448, ':': 320, ';': 320, '<': 576, '=': 576, '>': 576, '?': 384,
+    '@': 704, 'A': 512, 'B': 512, 'C': 512, 'D': 512, 'E': 448, 'F': 384, 'G': 576,
+    'H': 512, 'I': 320, 'J': 320, 'K': 512, 'L': 384, 'M': 576, 'N': 512, 'O': 576,
+    'P': 448, 'Q': 576, 'R': 512, 'S': 512, 'T': 448, 'U': 512, 'V': 512, 'W': 704,
+    'X': 512, 'Y': 448, 'Z': 512, '[': 320, '\\': 320, ']': 320, '^': 576, '_': 448,
+    '`': 448, 'a': 448, 'b': 448, 'c': 384, 'd': 448, 'e': 448, 'f': 256, 'g': 448,
+    'h': 448, 'i': 192, 'j': 256, 'k': 448, 'l': 192, 'm': 704, 'n': 448, 'o': 448,
+    'p': 448, 'q': 448, 'r': 320, 's': 384, 't': 256, 'u': 448, 'v': 448, 'w': 576,
+    'x': 448, 'y': 448, 'z': 384, '{': 448, '|': 320, '}': 448, '~': 576,
+}
+
+# Right edge of each glyph bounding box in pixels, when drawn at the origin
+RIGHT_EDGES = {
+    ' ': 4, '!': 4, '"': 5, '#': 9, '$': 7, '%': 12, '&': 9, "'": 3,
+    '(': 5, ')': 5, '*': 7, '+': 9, ',': 4, '-': 5, '.': 4, '/': 5,
+    '0': 7, '1': 7, '2': 7, '3': 7, '4': 7, '5': 7, '6': 7, '7': 7,
+    '8': 7, '9': 7, ':': 5, ';': 5, '<': 9, '=': 9, '>': 9, '?': 6,
+    '@': 11, 'A': 8, 'B': 8, 'C': 8, 'D': 8, 'E': 7, 'F': 7, 'G': 9,
+    'H': 8, 'I': 5, 'J': 5, 'K': 8, 'L': 7, 'M': 9, 'N': 8, 'O': 9,
+    'P': 7, 'Q': 9, 'R': 8, 'S': 8, 'T': 7, 'U': 8, 'V': 8, 'W': 11,
+    'X': 8, 'Y': 7, 'Z': 8, '[': 5, '\\': 6, ']': 5, '^': 9, '_': 8,
+    '`': 7, 'a': 7, 'b': 7, 'c': 6, 'd': 7, 'e': 7, 'f': 5, 'g': 7,
+    'h': 7, 'i': 3, 'j': 4, 'k': 7, 'l': 3, 'm': 11, 'n': 7, 'o': 7,
+    'p': 7, 'q': 7, 'r': 5, 's': 6, 't': 5, 'u': 7, 'v': 7, 'w': 9,
+    'x': 7, 'y': 7, 'z': 6, '{': 7, '|': 5, '}': 7, '~': 9,
+}
+
+# Kerning adjustments for pairs of glyphs, in 26.6 fixed point units
+KERNING = {
+    'F,': -1, 'F.': -1, 'P,': -1, 'P.': -1, 'T,': -1, 'T.': -1, 'Ta': -1, 'Tc': -1,
+    'Te': -1, 'To': -1, 'V,': -1, 'V.': -1, 'W,': -1, 'W.': -1, 'Y,': -1, 'Y.': -1,
+    'r,': -1, 'r.': -1,
+}
@@ -3,6 +3,11 @@ import math
 import unittest
 from datetime import timedelta
 
+try:
+    from sys import intern
+except ImportError:  # pragma: no cover
+    pass  # python 2: intern is a builtin
+
 try:
     # security patch: see https://docs.python.org/3/library/xml.etree.elementtree.html
     from defusedxml import ElementTree
@@ -33,15 +38,9 @@ class TestResult(unittest.TestResult):
         return ': '.join(err)
 
 
-class TestCase(unittest.TestCase):
-    TR_CLASS = TestResult
-    stdout = None
-    stderr = None
-
-    def __init__(self, classname, methodname):
-        super(TestCase, self).__init__()
-        self.classname = classname
-        self.methodname = methodname
+class TestCaseMixin(object):
+    """ The accessors shared by `TestCase` and the lightweight `TestCaseRecord` """
+    __slots__ = ()
 
     def __str__(self):
         return "%s (%s)" % (self.methodname, self.classname)
@@ -60,23 +59,6 @@ class TestCase(unittest.TestCase):
         """ Provide the expected result """
         self.result, self.typename, self.message, self.trace = result, typename, message, trace
 
-    def run(self, tr=None):
-        """ Fake run() that produces the seeded result """
-        tr = tr or self.TR_CLASS()
-
-        tr.startTest(self)
-        if self.result == 'success':
-            tr.addSuccess(self)
-        elif self.result == 'skipped':
-            tr.addSkip(self, '%s: %s' % (self.typename, self._textMessage()))
-        elif self.result == 'error':
-            tr.addError(self, (self.typename, self._textMessage()))
-        elif self.result == 'failure':
-            tr.addFailure(self, (self.typename, self._textMessage()))
-        tr.stopTest(self)
-
-        return tr
-
     def _textMessage(self):
         msg = (e for e in (self.message, self.trace) if e)
         return '\n\n'.join(msg) or None
@@ -88,18 +70,6 @@ class TestCase(unittest.TestCase):
         txt = (e for e in (err, self.trace) if e)
         return '\n\n'.join(txt) or None
 
-    def setUp(self):
-        """ Dummy method so __init__ does not fail """
-        pass
-
-    def tearDown(self):
-        """ Dummy method so __init__ does not fail """
-        pass
-
-    def runTest(self):
-        """ Dummy method so __init__ does not fail """
-        self.run()
-
     @property
     def basename(self):
         return self.classname.rpartition('.')[2]
@@ -134,6 +104,59 @@ class TestCase(unittest.TestCase):
         return '\n'.join([out for out in (self.stdout, self.stderr) if out])
 
 
+class TestCase(TestCaseMixin, unittest.TestCase):
+    TR_CLASS = TestResult
+    stdout = None
+    stderr = None
+
+    def __init__(self, classname, methodname):
+        super(TestCase, self).__init__()
+        self.classname = classname
+        self.methodname = methodname
+
+    def run(self, tr=None):
+        """ Fake run() that produces the seeded result """
+        tr = tr or self.TR_CLASS()
+
+        tr.startTest(self)
+        if self.result == 'success':
+            tr.addSuccess(self)
+        elif self.result == 'skipped':
+            tr.addSkip(self, '%s: %s' % (self.typename, self._textMessage()))
+        elif self.result == 'error':
+            tr.addError(self, (self.typename, self._textMessage()))
+        elif self.result == 'failure':
+            tr.addFailure(self, (self.typename, self._textMessage()))
+        tr.stopTest(self)
+
+        return tr
+
+    def setUp(self):
+        """ Dummy method so __init__ does not fail """
+        pass
+
+    def tearDown(self):
+        """ Dummy method so __init__ does not fail """
+        pass
+
+    def runTest(self):
+        """ Dummy method so __init__ does not fail """
+        self.run()
+
+
+class TestCaseRecord(TestCaseMixin):
+    """
+    A lightweight alternative to `TestCase`, used by `CompactParser`. It has the same accessors but is not a
+    `unittest.TestCase`: all fields are stored in slots, with no per-instance `__dict__`.
+    """
+    __slots__ = ('classname', 'methodname', 'result', 'typename', 'message', 'trace', 'time', 'stdout', 'stderr')
+
+    def __init__(self, classname, methodname):
+        self.classname = classname
+        self.methodname = methodname
+        self.result = self.typename = self.message = self.trace = self.time = self.stdout = self.stderr = None
+
+
 class TestSuite(unittest.TestSuite):
     def __init__(self, *args, **kwargs):
         super(TestSuite, self).__init__(*args, **kwargs)
@@ -142,10 +165,54 @@ class TestSuite(unittest.TestSuite):
         self.stderr = None
 
 
+class TestRecords(list):
+    """ A lightweight alternative to `TestSuite`, used by `CompactParser`: a list of `TestCaseRecord` """
+    def __init__(self, *args, **kwargs):
+        super(TestRecords, self).__init__(*args, **kwargs)
+        self.properties = {}
+        self.stdout = None
+        self.stderr = None
+
+    def addTest(self, tc):
+        self.append(tc)
+
+    def run(self, tr):
+        for tc in self:
+            tr.addRecord(tc)
+        return tr
+
+
+class RecordsResult(object):
+    """
+    A lightweight alternative to `TestResult`, used by `CompactParser`. Note that `failures`, `errors` and `skipped`
+    contain the `TestCaseRecord` objects, not (test, text) tuples.
+    """
+    def __init__(self):
+        self.testsRun = 0
+        self.failures = []
+        self.errors = []
+        self.skipped = []
+        self.time = None
+
+    def addRecord(self, tc):
+        self.testsRun += 1
+        if tc.result == 'skipped':
+            self.skipped.append(tc)
+        elif tc.result == 'error':
+            self.errors.append(tc)
+        elif tc.result == 'failure':
+            self.failures.append(tc)
+
+    def wasSuccessful(self):
+        return not self.failures and not self.errors
+
+
 class Parser(object):
     TC_CLASS = TestCase
     TS_CLASS = TestSuite
     TR_CLASS = TestResult
+    # set to False to drop the captured output and traces of the test cases
+    keep_output = True
 
     def parse(self, source):
         xml = ElementTree.parse(source)
@@ -160,6 +227,10 @@ class Parser(object):
         else:
             self.parse_testsuite(root, ts)
 
+        return self.run_testsuite(root, ts)
+
+    def run_testsuite(self, root, ts):
+        """ Runs the parsed `ts` to get the results, and checks them against the totals in `root` """
         tr = ts.run(self.TR_CLASS())
 
         tr.time = to_timedelta(root.attrib.get('time'))
@@ -177,23 +248,32 @@ class Parser(object):
         return (ts, tr)
 
     def parse_testsuite(self, root, ts):
+        self.parse_testsuite_attrib(root, ts)
+        for el in root:
+            self.parse_testsuite_child(el, ts)
+
+    def parse_testsuite_attrib(self, root, ts):
         assert root.tag == 'testsuite'
         ts.name = root.attrib.get('name')
         ts.package = root.attrib.get('package')
-        for el in root:
-            if el.tag == 'testcase':
-                self.parse_testcase(el, ts)
-            if el.tag == 'properties':
-                self.parse_properties(el, ts)
-            if el.tag == 'system-out' and el.text:
-                ts.stdout = el.text.strip()
-            if el.tag == 'system-err' and el.text:
-                ts.stderr = el.text.strip()
+
+    def parse_testsuite_child(self, el, ts):
+        if el.tag == 'testcase':
+            self.parse_testcase(el, ts)
+        if el.tag == 'properties':
+            self.parse_properties(el, ts)
+        if not self.keep_output:
+            return
+        if el.tag == 'system-out' and el.text:
+            ts.stdout = el.text.strip()
+        if el.tag == 'system-err' and el.text:
+            ts.stderr = el.text.strip()
 
     def parse_testcase(self, el, ts):
+        keep_output = self.keep_output
         tc_classname = el.attrib.get('classname') or ts.name
         tc = self.TC_CLASS(tc_classname, el.attrib['name'])
-        tc.seed('success', trace=el.text or None)
+        tc.seed('success', trace=(el.text or None) if keep_output else None)
         tc.time = to_timedelta(el.attrib.get('time'))
         message = None
         text = None
@@ -206,10 +286,12 @@ class Parser(object):
 
                 # reuse old if empty
                 message = e.attrib.get('message') or message
-                text = e.text or text
+                text = (e.text or text) if keep_output else None
 
                 tc.seed(result, typename, message, text)
                 tc.time = to_timedelta(el.attrib.get('time'))
+            if not keep_output:
+                continue
             if e.tag == 'system-out' and e.text:
                 tc.stdout = e.text.strip()
             if e.tag == 'system-err' and e.text:
@@ -225,5 +307,73 @@ class Parser(object):
                 ts.properties[e.attrib['name']] = e.attrib['value']
 
 
-def parse(source):
-    return Parser().parse(source)
+class CompactParser(Parser):
+    """
+    A parser creating lightweight `TestCaseRecord` objects instead of `unittest.TestCase` objects, to reduce the memory
+    used for large test reports. Use `keep_output=False` to also drop the captured output and traces.
+    """
+    TC_CLASS = TestCaseRecord
+    TS_CLASS = TestRecords
+    TR_CLASS = RecordsResult
+
+    def __init__(self, keep_output=True):
+        self.keep_output = keep_output
+
+    def parse(self, source):
+        """
+        Streaming version of `Parser.parse`: each child of a <testsuite> is parsed and freed as soon as its end tag is
+        read, so that the xml tree is never fully built in memory.
+        """
+        ts = self.TS_CLASS()
+        root = None
+        # depth of the <testsuite> elements: 0 if root is a <testsuite>, 1 if it is a <testsuites>
+        ts_depth = 0
+
+        # the stack of currently open elements
+        stack = []
+        for event, el in ElementTree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = el
+                    ts_depth = 1 if root.tag == 'testsuites' else 0
+                if len(stack) == ts_depth:
+                    self.parse_testsuite_attrib(el, ts)
+                stack.append(el)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            if depth == ts_depth + 1:
+                self.parse_testsuite_child(el, ts)
+            if 0 < depth <= ts_depth + 1:
+                # free memory as we go: the element is not needed anymore. Deeper elements are kept until their
+                # ancestor child of <testsuite> is parsed.
+                el.clear()
+                stack[-1].remove(el)
+
+        return self.run_testsuite(root, ts)
+
+    def parse_testcase(self, el, ts):
+        super(CompactParser, self).parse_testcase(el, ts)
+        # many test cases share the same class name, error type or skip message: share the strings too
+        tc = ts[-1]
+        for attr in ('classname', 'typename', 'message'):
+            value = getattr(tc, attr)
+            if value is not None:
+                setattr(tc, attr, intern(value))
+
+
+def parse(source, compact=False, keep_output=True):
+    """
+    Parses the junit xml `source` and returns a tuple (test suite, test result).
+
+    By default `unittest` objects are created. With `compact=True` the lightweight `TestRecords`, `TestCaseRecord`
+    and `RecordsResult` are used instead, see `CompactParser`. With `keep_output=False` the captured output and traces
+    are not stored.
+    """
+    if compact:
+        return CompactParser(keep_output=keep_output).parse(source)
+
+    parser = Parser()
+    parser.keep_output = keep_output
+    return parser.parse(source)
@@ -1,8 +1,13 @@
 from __future__ import division
 
-import platform
-from distutils.version import LooseVersion
-import PIL
+import itertools
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
 
 import pytest
 
@@ -13,10 +18,17 @@ except ImportError:  # pragma: no cover
 
 
 from genbadge import Badge
-from genbadge.utils_badge import get_local_badge_template
-from genbadge.utils_coverage import parse_cov
+from genbadge import verdana_11_metrics
+from genbadge import utils_badge, utils_shields
+from genbadge.utils_badge import get_local_badge_template, get_font, metrics_width_of, get_svg_badge, compile_template, \
+    render_badges, write_svg, get_color
+from genbadge.utils_coverage import parse_cov, get_coverage_stats, detect_coverage_format
 from genbadge.utils_junit import get_test_stats
 from genbadge.utils_flake8 import get_flake8_stats
+from genbadge.utils_io import open_binary_source, iter_lines
+from genbadge.utils_manifest import BadgeManifest
+from genbadge.utils_timings import NO_TIMINGS, StageTimings
+from genbadge.utils_watch import InotifyWatcher, PollingWatcher, get_file_watcher, watch_files
 
 
 TESTS_FOLDER = Path(__file__).parent.absolute()
@@ -38,10 +50,8 @@ def test_genbadge(tmpdir, use_shields):
     assert repr(b) == "[ verytring | 1XYZ ]  color: green"
 
     # SVG representation
-    if platform.system() == "Windows" or LooseVersion(PIL.__version__) < "8.0":
-        ref_nbs = dict(left_width=63, right_width=41, tot_width=104, left_x=325.0, left_txt_length=530, right_x=825.0, right_txt_length=310)
-    else:
-        ref_nbs = dict(left_width=61, right_width=39, tot_width=100, left_x=315.0, left_txt_length=510, right_x=795.0, right_txt_length=290)
+    # text widths are computed from the precomputed font metrics, so they do not depend on the platform anymore
+    ref_nbs = dict(left_width=63, right_width=41, tot_width=104, left_x=325.0, left_txt_length=530, right_x=825.0, right_txt_length=310)
 
     refsvg_str = """
 <svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{tot_width}" height="20" role="img" aria-label="verytring: 1XYZ">
@@ -84,10 +94,8 @@ def test_genbadge_red(tmpdir, use_shields):
     assert repr(b) == "[ verytring | 1XYZ ]  color: red"
 
     # SVG representation
-    if platform.system() == "Windows" or LooseVersion(PIL.__version__) < "8.0":
-        ref_nbs = dict(left_width=63, right_width=41, tot_width=104, left_x=325.0, left_txt_length=530, right_x=825.0, right_txt_length=310)
-    else:
-        ref_nbs = dict(left_width=61, right_width=39, tot_width=100, left_x=315.0, left_txt_length=510, right_x=795.0, right_txt_length=290)
+    # text widths are computed from the precomputed font metrics, so they do not depend on the platform anymore
+    ref_nbs = dict(left_width=63, right_width=41, tot_width=104, left_x=325.0, left_txt_length=530, right_x=825.0, right_txt_length=310)
 
     refsvg_str = """
 <svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{tot_width}" height="20" role="img" aria-label="verytring: 1XYZ">
@@ -120,6 +128,128 @@ def test_genbadge_red(tmpdir, use_shields):
     assert standardize_xml("\n" + svgtxt) == standardize_xml(refsvg_str)
 
 
+def test_custom_template():
+    """Make sure that custom templates are compiled and rendered correctly"""
+    template = '<svg width="{{ total_width }}">{{ left_text }}|{{ right_text }}|{{ unknown }}</svg>'
+    assert get_svg_badge("foo", "bar", color="red", template=template) \
+        == '<svg width="58">foo|bar|{{ unknown }}</svg>'
+
+    # compiled templates are cached
+    assert compile_template(template) is compile_template(template)
+
+
+def test_render_badges(monkeypatch):
+    """Make sure that rendering badges in batch is equivalent to rendering them one by one"""
+    badges = [Badge("tests", "6/12", "red"), Badge("coverage", "98.12%", "brightgreen"), Badge("tests", "6/12", "red"),
+              Badge("tests", "7/12", "red")]
+    expected = [b.as_svg() for b in badges]
+
+    resolved = []
+
+    def _get_color(color_str):
+        resolved.append(color_str)
+        return get_color(color_str)
+
+    monkeypatch.setattr(utils_badge, "get_color", _get_color)
+    svgs = list(render_badges(badges))
+    assert svgs == expected
+
+    # identical badges are rendered only once, and each color is resolved only once (the label color is not cached)
+    assert svgs[0] is svgs[2]
+    assert sorted(c for c in resolved if c != "#555") == ["brightgreen", "red"]
+
+
+def test_shields_cache(tmpdir, monkeypatch):
+    """Make sure that the on-disk cache of shields.io badges avoids the network"""
+    downloads = []
+
+    def _download(url):
+        downloads.append(url)
+        return "<svg>%s</svg>" % url
+
+    monkeypatch.setattr(utils_shields, "_download", _download)
+
+    b = Badge(left_txt="tests", right_txt="6/12", color="red")
+    utils_shields.set_shields_cache(str(tmpdir))
+    try:
+        svg = b.as_svg(use_shields=True)
+        assert svg == "<svg>https://img.shields.io/badge/tests-6%2F12-red.svg</svg>"
+        assert b.as_svg(use_shields=True) == svg
+        assert len(downloads) == 1
+
+        # expired entries are downloaded again
+        utils_shields.set_shields_cache(str(tmpdir), ttl=-1)
+        assert b.as_svg(use_shields=True) == svg
+        assert len(downloads) == 2
+
+        # the oldest entries are removed when the cache is too large
+        utils_shields.set_shields_cache(str(tmpdir), max_size=100)
+        Badge(left_txt="tests", right_txt="12/12", color="brightgreen").as_svg(use_shields=True)
+        assert len(list(Path(str(tmpdir)).glob("*.svg"))) == 1
+
+        # concurrent writes of the same entry
+        cache = utils_shields.ShieldsCache(str(tmpdir / "concurrent"))
+        threads = [threading.Thread(target=cache.put, args=("url", "<svg>%s</svg>" % i)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert cache.get("url").startswith("<svg>")
+        assert [p.suffix for p in Path(str(tmpdir / "concurrent")).iterdir()] == [".svg"]
+
+        # a cache that can not be written only warns
+        not_a_dir = tmpdir / "not_a_dir"
+        not_a_dir.write_text(u"", encoding="utf-8")
+        utils_shields.set_shields_cache(str(not_a_dir))
+        with pytest.warns(UserWarning, match="Could not store the badge"):
+            assert b.as_svg(use_shields=True) == svg
+    finally:
+        utils_shields.set_shields_cache(None)
+
+
+def test_font_cache():
+    """Make sure that fonts are loaded only once per (name, size)"""
+    get_font.cache_clear()
+
+    font = get_font("Verdana", 11)
+    assert get_font("Verdana", 11) is font
+    assert get_font("Verdana", 12) is not font
+
+    info = get_font.cache_info()
+    assert info.hits == 1
+    assert info.misses == 2
+
+
+def test_font_metrics_table():
+    """Make sure that the precomputed font metrics match pillow's measurements pixel for pixel"""
+    features = pytest.importorskip("PIL.features")
+    if features.version("freetype2") != verdana_11_metrics.FREETYPE_VERSION:
+        pytest.skip("The metrics table was generated with FreeType %s, hinting may differ"
+                    % verdana_11_metrics.FREETYPE_VERSION)
+
+    font = get_font("Verdana", 11)
+    charset = sorted(verdana_11_metrics.ADVANCES)
+    texts = charset + ["".join(p) for p in itertools.product(charset, repeat=2)]
+    texts += ["", "98.12%", "6 C, 0 W, 5 I", "verytring", "Tea. To Yr., WAVE"]
+    for txt in texts:
+        assert metrics_width_of(txt) == font.getbbox(txt)[2], txt
+
+    # unknown characters
+    assert metrics_width_of("caf\xe9") is None
+
+
+def test_text_width_cache():
+    """Make sure that text widths are memoized, with the configured maximum size"""
+    utils_badge.set_text_width_cache_size(2)
+    try:
+        for txt in ("tests", "coverage", "tests", "flake8", "tests"):
+            utils_badge.preferred_width_of(txt, font_name="Verdana", font_size=11)
+        info = utils_badge.text_width_cache_info()
+        assert (info.hits, info.misses, info.currsize, info.maxsize) == (2, 3, 2, 2)
+    finally:
+        utils_badge.set_text_width_cache_size(utils_badge.TEXT_WIDTH_CACHE_SIZE)
+
+
 def standardize_xml(xmltxt):
     import xml.dom.minidom
     dom = xml.dom.minidom.parseString(xmltxt)  # or xml.dom.minidom.parseString(xml_string)
@@ -144,6 +274,94 @@ def test_parse_tests():
     assert res.success_percentage == res.success * 100 / res.total_without_skipped
 
 
+JUNIT_XML_SAMPLES = [
+    # testsuite root, with the "last result wins" semantics
+    """<testsuite tests="4"><testcase classname="a" name="ok"><system-out>foo</system-out></testcase>
+<testcase name="f_e"><failure message="f"/><error message="e"/></testcase>
+<testcase name="e_f"><error message="e"/><failure message="f">trace</failure></testcase>
+<testcase name="s"><skipped/><system-err>bar</system-err></testcase></testsuite>""",
+    # several testsuites, nested elements that are ignored
+    """<testsuites errors="1"><testsuite><properties><property name="a" value="b"/></properties>
+<testcase name="a"><error/></testcase><system-out>foo</system-out></testsuite>
+<testsuite><testcase name="b"><skipped/></testcase><testcase name="c"/>
+<testsuite><testcase name="nested"/></testsuite></testsuite></testsuites>""",
+]
+
+
+@pytest.mark.parametrize("xml", JUNIT_XML_SAMPLES, ids=["testsuite", "testsuites"])
+def test_parse_tests_streaming(xml):
+    """Check that the streaming parser counts the tests exactly as the xunitparser copy"""
+    from io import StringIO
+    from genbadge.xunitparser_copy import parse
+    from genbadge.utils_junit import parse_junit_stats
+
+    ts, tr = parse(StringIO(xml))
+    res = parse_junit_stats(StringIO(xml))
+    assert (res.runned, res.skipped, res.failed, res.errors) \
+           == (tr.testsRun, len(tr.skipped), len(tr.failures), len(tr.errors))
+
+
+@pytest.mark.parametrize("xml", JUNIT_XML_SAMPLES + [None], ids=["testsuite", "testsuites", "junit.xml"])
+def test_xunitparser_compact(xml):
+    """Check that the compact records have the same contents as the unittest test cases"""
+    from io import StringIO
+    from genbadge.xunitparser_copy import parse, TestCaseRecord
+
+    def _source():
+        return StringIO(xml) if xml is not None else str(TESTS_FOLDER / "reports/junit/junit.xml")
+
+    def _summary(tcs):
+        return [(tc.id(), str(tc), tc.result, tc.success, tc.skipped, tc.failed, tc.errored, tc.time, tc.alltext,
+                 tc.stdall) for tc in tcs]
+
+    ts, tr = parse(_source())
+    ts2, tr2 = parse(_source(), compact=True)
+    assert tr2.testsRun == tr.testsRun == len(ts2)
+    for attr in ("failures", "errors", "skipped"):
+        assert _summary(getattr(tr2, attr)) == _summary(tc for tc, _ in getattr(tr, attr))
+    assert tr2.wasSuccessful() == tr.wasSuccessful()
+    assert (ts2.stdout, ts2.properties) == (ts.stdout, ts.properties)
+
+    tc = ts2[0]
+    assert isinstance(tc, TestCaseRecord)
+    assert not hasattr(tc, "__dict__")
+
+    # the captured output can be dropped
+    ts3, tr3 = parse(_source(), compact=True, keep_output=False)
+    assert [(tc.id(), tc.result, tc.message) for tc in ts3] == [(tc.id(), tc.result, tc.message) for tc in ts2]
+    assert all(tc.stdout is None and tc.stderr is None and tc.trace is None for tc in ts3)
+
+
+def test_parse_tests_multiple_files(tmpdir):
+    """Check that several junit files (e.g. from sharded test runs) can be parsed at once, and summed"""
+    from genbadge.utils_junit import TestStats
+
+    junit_xml = TESTS_FOLDER / "reports/junit/junit.xml"
+    shards_dir = Path(str(tmpdir)) / "shards"
+    shards_dir.mkdir()
+    for i in range(8):
+        (shards_dir / ("junit-%s.xml" % i)).write_bytes(junit_xml.read_bytes())
+
+    one = get_test_stats(str(junit_xml))
+    assert (one + one + one).runned == 3 * one.runned
+    assert sum([one, one]).errors == 2 * one.errors
+    assert vars(sum([one])) == vars(one)
+
+    # glob, sequential or in a process pool
+    expected = sum([one] * 8, TestStats(0, 0, 0, 0))
+    for max_workers in (1, 2):
+        res = get_test_stats(str(shards_dir / "*.xml"), max_workers=max_workers)
+        assert vars(res) == vars(expected)
+
+    # mix of files, glob patterns and streams
+    with open(str(junit_xml), "rb") as stream:
+        res = get_test_stats([str(junit_xml), str(shards_dir / "junit-[01].xml"), stream], max_workers=2)
+    assert vars(res) == vars(one + one + one + one)
+
+    with pytest.raises(IOError, match="No file matches this pattern"):
+        get_test_stats(str(shards_dir / "*.txt"))
+
+
 def test_parse_cov():
     """Check that we can parse a coverage.xml file successfully"""
     res = parse_cov(str(TESTS_FOLDER / "reports/coverage/coverage.xml"))
@@ -163,6 +381,29 @@ def test_parse_cov():
     assert res.total_coverage == 100 * res.total_rate
 
 
+def test_parse_cov_root_only():
+    """Check that only the beginning of a large coverage.xml file is read"""
+    from io import BytesIO
+
+    class _ReadCountingStream(BytesIO):
+        nb_read = 0
+
+        def read(self, size=-1):
+            data = super(_ReadCountingStream, self).read(size)
+            self.nb_read += len(data)
+            return data
+
+    xml = (TESTS_FOLDER / "reports/coverage/coverage.xml").read_bytes()
+    root_start, rest = xml.split(b"\n\t<sources>", 1)
+    # a 10MB file
+    big_xml = root_start + b"<packages>" + b'<package name="foo" line-rate="1"/>' * 300000 + rest
+    stream = _ReadCountingStream(big_xml)
+
+    res = parse_cov(stream)
+    assert res.lines_covered == 13
+    assert stream.nb_read <= 64 * 1024
+
+
 def test_parse_cov_nobranch_issue_15():
     """Check that we can parse a coverage.xml file successfully with the no branch option"""
     res = parse_cov(str(TESTS_FOLDER / "reports/coverage/coverage_nobranch.xml"))
@@ -201,6 +442,230 @@ def test_parse_cov_branch_without_branches():
     assert res.total_coverage == 100 * res.total_rate
 
 
+def test_parse_cov_details():
+    """Check that the per-package and per-file stats are computed in the same pass"""
+    res = parse_cov(str(TESTS_FOLDER / "reports/coverage/coverage.xml"), details=True)
+    assert res.lines_covered == 13
+    assert list(res.packages) == ["genbadge"]
+    assert res.packages["genbadge"].lines_covered == 13
+    assert res.packages["genbadge"].lines_valid == 73
+    assert res.packages["genbadge"].branches_covered == 1
+    assert res.packages["genbadge"].branches_valid == 18
+
+    main_py = res.files["genbadge/main.py"]
+    assert (main_py.lines_covered, main_py.lines_valid, main_py.branches_covered, main_py.branches_valid) \
+        == (8, 18, 1, 6)
+    assert main_py.branch_option
+
+    # without details, only the root element is read
+    assert parse_cov(str(TESTS_FOLDER / "reports/coverage/coverage.xml")).packages is None
+
+    # several packages and classes in the same file, with duplicate <line> elements in <methods> (java)
+    from io import BytesIO
+    xml = b"""<?xml version="1.0" ?>
+<coverage branch-rate="0" branches-covered="0" branches-valid="0" complexity="0" line-rate="0.5" lines-covered="2"
+          lines-valid="4" timestamp="1618319767206" version="5.5">
+  <packages>
+    <package name="a"><classes>
+      <class filename="a/Foo.java" name="a.Foo">
+        <methods><method name="foo"><lines><line hits="1" number="2"/></lines></method></methods>
+        <lines><line hits="1" number="2"/><line hits="0" number="3"/></lines>
+      </class>
+      <class filename="a/Foo.java" name="a.Foo$Inner"><lines><line hits="0" number="5"/></lines></class>
+    </classes></package>
+    <package name="b"><classes>
+      <class filename="b/bar.py" name="bar.py"><lines><line hits="2" number="1"/></lines></class>
+    </classes></package>
+  </packages>
+</coverage>"""
+    res = parse_cov(BytesIO(xml), details=True)
+    assert {name: (c.lines_covered, c.lines_valid) for name, c in res.packages.items()} == {"a": (1, 3), "b": (1, 1)}
+    assert {name: (c.lines_covered, c.lines_valid) for name, c in res.files.items()} \
+        == {"a/Foo.java": (1, 3), "b/bar.py": (1, 1)}
+    assert res.packages["a"].branch_rate == 0
+
+    # a root element without the totals: they are computed from the classes
+    xml_no_totals = re.sub(rb'(branch|line)s?-(rate|covered|valid)="[^"]*"\s+', b"", xml)
+    assert b"lines-covered" not in xml_no_totals
+    for details in (False, True):
+        res = parse_cov(BytesIO(xml_no_totals), details=details)
+        assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid) == (2, 4, 0, 0)
+        assert res.total_coverage == 50.
+
+
+COV_SHARD_TMP = """<?xml version="1.0" ?>
+<coverage branch-rate="0" branches-covered="0" branches-valid="4" complexity="0" line-rate="0" lines-covered="0"
+          lines-valid="5" timestamp="1618319767206" version="5.5">
+  <packages><package name="a"><classes><class filename="a/foo.py" name="foo.py"><lines>
+    <line hits="%s" number="1"/>
+    <line hits="1" number="2"/>
+    <line branch="true" condition-coverage="50%% (1/2)" hits="1" missing-branches="%s" number="3"/>
+    <line hits="%s" number="4"/>
+    <line hits="%s" number="5"/>
+  </lines></class></classes></package>
+  <package name="b"><classes><class filename="b/Bar.java" name="b.Bar"><lines>
+    <line branch="true" condition-coverage="50%% (1/2)" hits="1" number="7"/>
+  </lines></class></classes></package></packages>
+</coverage>"""
+
+
+def test_merge_cov(tmpdir):
+    """Check that several coverage.xml files can be merged, with the union of the line and branch hits"""
+    cov_xml = str(TESTS_FOLDER / "reports/coverage/coverage.xml")
+    one = parse_cov(cov_xml)
+    for max_workers in (1, 2):
+        res = get_coverage_stats([cov_xml, cov_xml], max_workers=max_workers)
+        assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid, res.branch_option) \
+            == (one.lines_covered, one.lines_valid, one.branches_covered, one.branches_valid, one.branch_option)
+
+    # two shards covering different lines and branches
+    shards_dir = Path(str(tmpdir))
+    (shards_dir / "cov-1.xml").write_text(COV_SHARD_TMP % (1, "4", 0, 0))
+    (shards_dir / "cov-2.xml").write_text(COV_SHARD_TMP % (0, "5", 1, 0))
+
+    res = get_coverage_stats(str(shards_dir / "cov-*.xml"), details=True)
+    # line 5 is never covered
+    assert (res.lines_covered, res.lines_valid) == (5, 6)
+    # branches of line 3 are covered in one shard each. Line 7 has no destinations info, so only 1 branch is counted
+    assert (res.branches_covered, res.branches_valid) == (3, 4)
+    assert res.branch_option
+    assert (res.packages["a"].lines_covered, res.packages["a"].branches_covered) == (4, 2)
+    assert (res.files["b/Bar.java"].lines_covered, res.files["b/Bar.java"].branches_covered) == (1, 1)
+
+
+@pytest.mark.parametrize("as_text", [False, True], ids="as_text={}".format)
+def test_parse_lcov(as_text):
+    """Check that we can parse an lcov.info file successfully, from a binary or text stream"""
+    from io import StringIO
+    lcov_info = TESTS_FOLDER / "reports/coverage/lcov.info"
+    with lcov_info.open(mode="rt" if as_text else "rb") as f:
+        res = get_coverage_stats(f, details=True)
+
+    assert res.branch_option
+    assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid) == (6, 9, 3, 4)
+    assert res.total_coverage == 100 * 9 / 13
+    assert sorted(res.files) == ["src/app/index.js", "src/app/utils/math.js", "src/app/utils/strings.js"]
+    assert (res.files["src/app/utils/math.js"].lines_covered, res.files["src/app/utils/math.js"].lines_valid) == (1, 3)
+    assert sorted(res.packages) == ["src/app", "src/app/utils"]
+    utils = res.packages["src/app/utils"]
+    assert (utils.lines_covered, utils.lines_valid, utils.branches_covered, utils.branches_valid) == (3, 5, 2, 2)
+
+    # without branches
+    res = get_coverage_stats(StringIO("TN:\nSF:a.js\nDA:1,1\nDA:2,0\nLF:2\nLH:1\nend_of_record\n"))
+    assert not res.branch_option
+    assert res.total_coverage == 50
+
+
+def test_parse_jacoco():
+    """Check that we can parse a jacoco.xml file successfully"""
+    jacoco_xml = str(TESTS_FOLDER / "reports/coverage/jacoco.xml")
+    res = get_coverage_stats(jacoco_xml)
+
+    # the report-level counters
+    assert res.branch_option
+    assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid) == (13, 20, 5, 8)
+    assert res.complexity == 9
+    assert res.packages is None
+
+    res = get_coverage_stats(jacoco_xml, details=True)
+    assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid) == (13, 20, 5, 8)
+    assert sorted(res.packages) == ["org/example", "org/example/util"]
+    assert sorted(res.files) == ["org/example/App.java", "org/example/util/MathUtil.java"]
+    app = res.files["org/example/App.java"]
+    assert (app.lines_covered, app.lines_valid, app.branches_covered, app.branches_valid) == (8, 10, 3, 4)
+
+    with pytest.raises(ValueError, match="the root element is <coverage>"):
+        get_coverage_stats(str(TESTS_FOLDER / "reports/coverage/coverage.xml"), input_format="jacoco")
+
+
+def test_detect_coverage_format():
+    """Check that the coverage file format is detected from the first bytes"""
+    from io import BytesIO, StringIO
+    cov_folder = TESTS_FOLDER / "reports/coverage"
+    assert detect_coverage_format(str(cov_folder / "coverage.xml")) == "xml"
+    assert detect_coverage_format(str(cov_folder / "jacoco.xml")) == "jacoco"
+    assert detect_coverage_format(str(cov_folder / "lcov.info")) == "lcov"
+    assert detect_coverage_format(str(cov_folder / "*.info")) == "lcov"
+    assert detect_coverage_format(BytesIO(b"SQLite format 3\x00...")) == "coveragepy"
+
+    # streams are not consumed
+    with (cov_folder / "lcov.info").open("rt") as f:
+        assert detect_coverage_format(f) == "lcov"
+        assert f.readline() == "TN:\n"
+
+    with pytest.raises(ValueError, match="Unable to detect the format"):
+        detect_coverage_format(StringIO("hello"))
+
+    with pytest.raises(ValueError, match="can only be merged"):
+        get_coverage_stats([str(cov_folder / "lcov.info")] * 2)
+
+
+@pytest.mark.parametrize("branch", [True, False], ids="branch={}".format)
+def test_parse_coveragepy(tmpdir, monkeypatch, branch):
+    """Check that reading the coverage.py data files gives the same results as reading the coverage.xml"""
+    pytest.importorskip("coverage")
+    import genbadge
+    from genbadge.utils_coveragepy import get_coveragepy_stats
+
+    tmpdir = Path(str(tmpdir))
+    rcfile = tmpdir / "coveragerc"
+    rcfile.write_text(u"[run]\nbranch = %s\nsource = genbadge\nparallel = True\n[report]\nomit = */utils_badge.py\n"
+                      % branch)
+    python_path = os.pathsep.join([str(Path(genbadge.__file__).parent.parent), os.environ.get("PYTHONPATH", "")])
+    env = dict(os.environ, COVERAGE_RCFILE=str(rcfile), COVERAGE_FILE=str(tmpdir / ".coverage"), PYTHONPATH=python_path)
+
+    def _coverage(*args):
+        subprocess.check_call((sys.executable, "-m", "coverage") + args, env=env, cwd=str(tmpdir),
+                              stdout=subprocess.DEVNULL)
+
+    # two parallel runs of genbadge itself
+    _coverage("run", "-m", "genbadge.main", "tests", "-l", "-i", str(TESTS_FOLDER / "reports/junit/junit.xml"))
+    _coverage("run", "-m", "genbadge.main", "coverage", "-l", "-i", str(TESTS_FOLDER / "reports/coverage/coverage.xml"))
+    shards_dir = tmpdir / "shards"
+    shards_dir.mkdir()
+    for p in tmpdir.glob(".coverage.*"):
+        shutil.copy(str(p), str(shards_dir))
+    data_files = sorted(str(p) for p in shards_dir.glob(".coverage.*"))
+    assert len(data_files) == 2
+
+    # reference: coverage combine + coverage xml
+    _coverage("combine")
+    _coverage("xml", "-o", str(tmpdir / "coverage.xml"))
+    ref = get_coverage_stats(str(tmpdir / "coverage.xml"), details=True)
+    tmpdir_contents = sorted(p.name for p in tmpdir.iterdir())
+
+    # the file names are relative to the current directory
+    monkeypatch.chdir(str(tmpdir))
+    for data_file in (str(tmpdir / ".coverage"), data_files):
+        res = get_coveragepy_stats(data_file, config_file=str(rcfile), details=True)
+        assert (res.lines_covered, res.lines_valid, res.branches_covered, res.branches_valid, res.branch_option) \
+            == (ref.lines_covered, ref.lines_valid, ref.branches_covered, ref.branches_valid, ref.branch_option)
+        assert {f: vars(s) for f, s in res.files.items()} == {f: vars(s) for f, s in ref.files.items()}
+        assert {p: vars(s) for p, s in res.packages.items()} == {p: vars(s) for p, s in ref.packages.items()}
+
+    # the data files are left untouched, and nothing is left in the current directory
+    assert sorted(str(p) for p in shards_dir.glob(".coverage.*")) == data_files
+    assert sorted(p.name for p in tmpdir.iterdir()) == tmpdir_contents
+
+
+def test_coveragepy_path_mapper(tmpdir):
+    """Check that the source file paths are remapped with the [paths] option, as in `coverage combine`"""
+    from genbadge.utils_coveragepy import get_path_mapper
+
+    assert get_path_mapper(None) is None
+    src = Path(str(tmpdir)) / "src" / "pkg"
+    src.mkdir(parents=True)
+    (src / "mod.py").write_text(u"")
+    map_path = get_path_mapper({"source": [str(src.parent), "/ci/*/src", "C:\\ci\\src"]})
+
+    expected = os.path.join(str(src), "mod.py")
+    assert map_path("/ci/job1/src/pkg/mod.py") == expected
+    assert map_path("C:\\ci\\src\\pkg\\mod.py") == expected
+    # not matching, or leading to a file that does not exist
+    assert map_path("/other/src/pkg/mod.py") == "/other/src/pkg/mod.py"
+    assert map_path("/ci/job1/src/pkg/missing.py") == "/ci/job1/src/pkg/missing.py"
+
+
 def test_parse_flake8():
     """Check that we can parse a coverage.xml file successfully"""
     res = get_flake8_stats(str(TESTS_FOLDER / "reports/flake8/flake8stats.txt"))
@@ -210,3 +675,215 @@ def test_parse_flake8():
     assert res.nb_info == 5
 
     assert res.nb_total == res.nb_critical + res.nb_warning + res.nb_info
+
+
+FLAKE8_RAW_OUTPUT = """src/foo.py:1:1: F401 'os' imported but unused
+src/foo.py:12:121: E501 line too long (127 > 120 characters)
+src/bar.py:3:80: E501 line too long (121 > 120 characters)
+C:\\src\\baz.py:5:1: S101 Use of assert detected.
+"""
+
+
+def test_parse_flake8_raw(monkeypatch):
+    """Check that the raw flake8 output is tallied, and that the severity is looked up once per code"""
+    from io import BytesIO, StringIO
+    from genbadge import utils_flake8
+
+    utils_flake8.find_severity.cache_clear()
+    res = get_flake8_stats(StringIO(FLAKE8_RAW_OUTPUT))
+    # F401 is critical, E501 is a warning and S101 an info
+    assert (res.nb_critical, res.nb_warning, res.nb_info) == (1, 2, 1)
+    assert utils_flake8.find_severity.cache_info().misses == 3
+
+    # `flake8 --statistics --count` without --format: the statistics take precedence over the violations
+    stats_txt = FLAKE8_RAW_OUTPUT + "1     F401 'os' imported but unused\n2     E501 line too long\n4\n"
+    res = get_flake8_stats(BytesIO(stats_txt.encode("utf-8")))
+    assert (res.nb_critical, res.nb_warning, res.nb_info) == (1, 2, 0)
+
+    # progress is reported every PROGRESS_INTERVAL lines and at the end
+    monkeypatch.setattr(utils_flake8, "PROGRESS_INTERVAL", 2)
+    progress = []
+    get_flake8_stats(StringIO(FLAKE8_RAW_OUTPUT), progress=lambda *args: progress.append(args))
+    assert progress == [(2, False), (4, False), (4, True)]
+
+    with pytest.warns(UserWarning, match="does not match template"):
+        res = get_flake8_stats(StringIO(FLAKE8_RAW_OUTPUT + "    import os\n"))
+    assert res.nb_total == 4
+
+
+@pytest.mark.parametrize("kind", ["path", "empty_path", "binary", "text", "text_no_buffer", "pipe"])
+def test_open_binary_source(tmpdir, kind):
+    """Check that files are memory-mapped, and streams are read through their binary buffer if possible"""
+    import mmap
+    from io import BytesIO, StringIO
+
+    flake8_txt = TESTS_FOLDER / "reports/flake8/flake8stats.txt"
+    contents = flake8_txt.read_bytes()
+    expected_type = bytes
+    if kind == "path":
+        source = str(flake8_txt)
+    elif kind == "empty_path":
+        source = str(Path(str(tmpdir)) / "empty.txt")
+        Path(source).write_bytes(b"")
+        contents = b""
+    elif kind == "binary":
+        source = BytesIO(contents)
+    elif kind == "text":
+        source = flake8_txt.open("rt")
+    elif kind == "text_no_buffer":
+        source = StringIO(contents.decode("utf-8"))
+        expected_type = str
+    else:
+        # like stdin: a text stream that can not be seeked
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, contents)
+        os.close(write_fd)
+        source = os.fdopen(read_fd, "rt")
+
+    with open_binary_source(source) as f:
+        assert isinstance(f, mmap.mmap) == (kind == "path")
+        lines = list(iter_lines(f))
+        assert all(isinstance(line, expected_type) for line in lines)
+        assert len(lines) == contents.count(b"\n")
+
+    if kind in ("text", "pipe"):
+        source.close()
+
+    # the flake8 statistics are parsed line by line from the bytes or the text
+    if kind == "path":
+        stats = get_flake8_stats(source)
+    elif kind == "text_no_buffer":
+        stats = get_flake8_stats(StringIO(contents.decode("utf-8")))
+    else:
+        stats = get_flake8_stats(BytesIO(contents))
+    assert (stats.nb_critical, stats.nb_warning, stats.nb_info) == ((0, 0, 0) if kind == "empty_path" else (6, 9, 5))
+
+
+def test_badge_manifest(tmpdir):
+    """Test that the badge manifest detects the changes of the input files, options, version and badge"""
+    folder = Path(str(tmpdir))
+    input_path = (folder / "input.txt").as_posix()
+    badge_path = (folder / "badge.svg").as_posix()
+    Path(input_path).write_bytes(b"contents")
+
+    def new_manifest(options=None, version="1.0"):
+        return BadgeManifest(badge_path, "tests", options or dict(name="tests"), [input_path], version=version)
+
+    # no manifest yet
+    manifest = new_manifest()
+    assert not manifest.is_up_to_date()
+
+    # badge written only if changed
+    assert write_svg("<svg/>", badge_path, only_if_changed=True)
+    assert not write_svg("<svg/>", badge_path, only_if_changed=True)
+    manifest.save()
+    assert Path(badge_path + ".genbadge.json").exists()
+    assert new_manifest().is_up_to_date()
+
+    # the input file is touched but its contents do not change
+    st = os.stat(input_path)
+    os.utime(input_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert new_manifest().is_up_to_date()
+
+    # the options, the version or the badge change
+    assert not new_manifest(options=dict(name="other")).is_up_to_date()
+    assert not new_manifest(version="2.0").is_up_to_date()
+    Path(badge_path).write_bytes(b"<svg></svg>")
+    assert not new_manifest().is_up_to_date()
+    new_manifest().save()
+    assert new_manifest().is_up_to_date()
+
+    # the input file contents change, with the same size
+    Path(input_path).write_bytes(b"CONTENTS")
+    assert not new_manifest().is_up_to_date()
+
+    # invalid manifest
+    new_manifest().save()
+    Path(badge_path + ".genbadge.json").write_text(u"{")
+    assert not new_manifest().is_up_to_date()
+
+
+@pytest.mark.parametrize("polling", [False, True], ids=["inotify", "polling"])
+def test_watch_files(tmpdir, polling):
+    """Test that the changes of the watched files are detected and debounced"""
+    folder = Path(str(tmpdir))
+    (folder / "a.xml").write_text(u"a")
+    if not polling:
+        default_watcher = get_file_watcher([str(folder / "a.xml")])
+        default_watcher.close()
+        if not isinstance(default_watcher, InotifyWatcher):
+            pytest.skip("inotify is not available")
+
+    calls = []
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch_files, args=([str(folder / "a.xml"), str(folder / "*.txt")], calls.append),
+                               kwargs=dict(debounce=0.3, polling=polling, stop=stop))
+    watcher.start()
+    try:
+        time.sleep(0.2)
+
+        # a file written slowly, and another file matching a pattern: a single call
+        with (folder / "a.xml").open("wt") as f:
+            for _ in range(3):
+                f.write(u"b")
+                f.flush()
+                time.sleep(0.1)
+        (folder / "b.txt").write_text(u"b")
+        (folder / "c.log").write_text(u"c")
+        time.sleep(1.2)
+        assert calls == [[(folder / "*.txt").as_posix(), (folder / "a.xml").as_posix()]]
+
+        # a file replaced by a rename
+        (folder / "tmp").write_text(u"c")
+        os.replace(str(folder / "tmp"), str(folder / "a.xml"))
+        time.sleep(1.2)
+        assert calls[1:] == [[(folder / "a.xml").as_posix()]]
+    finally:
+        stop.set()
+        watcher.join()
+
+
+
+def test_watch_folder_wildcards(tmpdir):
+    """Test that the patterns with wildcards in their folder are polled, since inotify does not watch subfolders"""
+    folder = Path(str(tmpdir))
+    (folder / "a").mkdir()
+    (folder / "a" / "junit.xml").write_text(u"a")
+    pattern = str(folder / "*" / "junit.xml")
+
+    watcher = get_file_watcher([pattern, str(folder / "*.txt")])
+    try:
+        assert isinstance(watcher, PollingWatcher)
+        time.sleep(0.01)
+        (folder / "a" / "junit.xml").write_text(u"bb")
+        assert watcher.wait(1.0) == {(folder / "*" / "junit.xml").as_posix()}
+    finally:
+        watcher.close()
+
+    if sys.platform.startswith("linux"):
+        with pytest.raises(ValueError):
+            InotifyWatcher([pattern])
+
+def test_stage_timings():
+    """Test that the stages are recorded in order, summed when repeated, and not recorded with NO_TIMINGS"""
+    timings = StageTimings()
+    timings.lap("parse")
+    time.sleep(0.01)
+    timings.lap("render")
+    timings.restart()
+    time.sleep(0.01)
+    timings.lap("write")
+    timings.add("parse", 1.)
+    assert list(timings.stages) == ["parse", "render", "write"]
+    assert timings.stages["parse"] >= 1. and timings.stages["render"] >= 0.01
+
+    job_timings = timings.child()
+    job_timings.lap("parse")
+    timings.update(job_timings, "tests")
+    assert list(timings.as_dict()["stages"]) == ["parse", "render", "write", "parse (tests)"]
+    assert timings.as_dict()["total"] >= 0.02
+    assert timings.format().splitlines()[-1].startswith(" - total:")
+
+    # nothing is recorded when the timings are not requested
+    NO_TIMINGS.lap("parse")
+    assert NO_TIMINGS.child() is NO_TIMINGS
@@ -1,4 +1,7 @@
+import os
 import platform
+import re
+import subprocess
 import sys
 from shutil import copy
 
@@ -48,6 +51,7 @@ Test statistics parsed successfully from %r
  - Nb tests: Total (6) = Success (2) + Skipped (1) + Failed (2) + Errors (1)
  - Success percentage: 40.00%% (2 / 5) (Skipped tests are excluded)
 
+Text width cache: <stats>
 SUCCESS - Tests badge created: %r
 """,
         help_msg="""Usage: genbadge tests [OPTIONS]
@@ -58,7 +62,10 @@ SUCCESS - Tests badge created: %r
 
   By default the input file is the relative `./reports/junit/junit.xml` and the
   output file is `./tests-badge.svg`. You can change these settings with the
-  `-i/--input_file` and `-o/--output-file` options.
+  `-i/--input_file` and `-o/--output-file` options. Several input files can be
+  provided, by repeating `-i` or with a glob pattern such as `-i
+  "reports/junit/*.xml"`: they are parsed in parallel and their results are
+  combined into a single badge.
 
   By default the badge will have the name "tests" as the left-hand side text.
   You can change these settings with the `-n/--name` option. The left-hand side
@@ -81,7 +88,11 @@ SUCCESS - Tests badge created: %r
 
 Options:
   -i, --input-file FILENAME       An alternate test results XML file to read.
-                                  '-' is supported and means <stdin>.
+                                  '-' is supported and means <stdin>. Glob
+                                  patterns such as 'reports/junit/*.xml' are
+                                  supported, and this option can be repeated:
+                                  the results of all files are then combined
+                                  into a single badge.
   -o, --output-file FILENAME      An alternate SVG badge file to write to. '-'
                                   is supported and means <stdout>. Note that in
                                   this case no other message will be printed to
@@ -98,6 +109,40 @@ Options:
   -w, --webshields / -l, --local  Indicates if badges should be generated using
                                   the shields.io HTTP API (default) or the local
                                   SVG file template included.
+  --shields-cache DIRECTORY       An optional directory where to cache the
+                                  badges downloaded from shields.io, so that
+                                  identical badges are not downloaded again. The
+                                  cache time-to-live (in seconds, default one
+                                  day) and maximum size (in bytes, default 10MB)
+                                  can be set with the GENBADGE_SHIELDS_CACHE_TTL
+                                  and GENBADGE_SHIELDS_CACHE_MAX_SIZE
+                                  environment variables.
+  --incremental                   Only generate the badge if the input file(s),
+                                  the options or the genbadge version changed
+                                  since the previous run, and only rewrite the
+                                  badge file if its contents changed. A manifest
+                                  is stored next to the badge
+                                  ('<badge>.svg.genbadge.json') for this. Not
+                                  available when reading from <stdin> or writing
+                                  to <stdout>.
+  --watch                         Keep running after the badge is generated, and
+                                  generate it again each time the input file(s)
+                                  change. Press Ctrl+C to stop. Not available
+                                  when reading from <stdin> or writing to
+                                  <stdout>.
+  --timings                       Print the duration of each stage of the
+                                  command on <stderr> when it ends: input files
+                                  resolution, parsing, statistics, badge
+                                  rendering (or download from shields.io) and
+                                  writing.
+  --timings-json FILENAME         A JSON file where to write the duration of
+                                  each stage of the command, in seconds, when it
+                                  ends (see --timings). '-' is supported and
+                                  means <stdout>.
+  --profile FILE                  Run the command with the cProfile profiler,
+                                  and write the profiling statistics to this
+                                  file. They can be read with the `pstats`
+                                  module or a viewer such as snakeviz.
   -v, --verbose                   Use this flag to print details to stdout
                                   during the badge generation process. Note that
                                   this flag has no effect when '-' is used as
@@ -122,6 +167,7 @@ Coverage results parsed successfully from %r
  - Line coverage: 17.81%% (13/73)
  - Total coverage: 15.38%% ((1+13)/(18+73))
 
+Text width cache: <stats>
 SUCCESS - Coverage badge created: %r
 """,
         help_msg="""Usage: genbadge coverage [OPTIONS]
@@ -132,7 +178,11 @@ SUCCESS - Coverage badge created: %r
 
   By default the input file is the relative `./reports/coverage/coverage.xml`
   and the output file is `./coverage-badge.svg`. You can change these settings
-  with the `-i/--input_file` and `-o/--output-file` options.
+  with the `-i/--input_file` and `-o/--output-file` options. Several input files
+  can be provided, by repeating `-i` or with a glob pattern such as `-i
+  "reports/coverage/*.xml"`: they are read in parallel and merged as `coverage
+  combine` would do, so that lines covered in several files are only counted
+  once.
 
   By default the badge will have the name "coverage" as the left-hand side text.
   You can change these settings with the `-n/--name` option. The left-hand side
@@ -150,9 +200,34 @@ SUCCESS - Coverage badge created: %r
 
   and multiplying this by 100.
 
+  LCOV tracefiles (e.g. lcov.info) and JaCoCo xml reports are also supported.
+  The format of the input file is detected automatically, or can be set with
+  `--format`. Instead of a coverage.xml file, the coverage.py data file
+  (`.coverage`) can also be read directly with `--format coveragepy`: the
+  executed lines are read from the data file(s), and only the statements and
+  branches of the source files are analyzed with coverage.py, so that `coverage
+  combine` and `coverage xml` do not need to be run first. The coverage.py
+  configuration files are used.
+
 Options:
-  -i, --input-file FILENAME       An alternate coverage results XML file to
-                                  read. '-' is supported and means <stdin>.
+  -i, --input-file FILENAME       An alternate coverage results file to read.
+                                  '-' is supported and means <stdin>. Glob
+                                  patterns such as 'reports/coverage/*.xml' are
+                                  supported, and this option can be repeated:
+                                  the results of all files are then combined
+                                  into a single badge.
+  --format [auto|xml|lcov|jacoco|coveragepy]
+                                  The format of the input file(s): 'xml' for a
+                                  coverage.xml file, 'lcov' for an LCOV
+                                  tracefile (e.g. lcov.info), 'jacoco' for a
+                                  JaCoCo xml report, or 'coveragepy' for a
+                                  coverage.py data file, whose executed lines
+                                  are read directly so that `coverage combine`
+                                  and `coverage xml` do not need to be run
+                                  first. By default ('auto') the format is
+                                  detected from the first bytes of the file.
+                                  With 'coveragepy' the default input file is
+                                  './.coverage'.
   -o, --output-file FILENAME      An alternate SVG badge file to write to. '-'
                                   is supported and means <stdout>. Note that in
                                   this case no other message will be printed to
@@ -165,6 +240,40 @@ Options:
   -w, --webshields / -l, --local  Indicates if badges should be generated using
                                   the shields.io HTTP API (default) or the local
                                   SVG file template included.
+  --shields-cache DIRECTORY       An optional directory where to cache the
+                                  badges downloaded from shields.io, so that
+                                  identical badges are not downloaded again. The
+                                  cache time-to-live (in seconds, default one
+                                  day) and maximum size (in bytes, default 10MB)
+                                  can be set with the GENBADGE_SHIELDS_CACHE_TTL
+                                  and GENBADGE_SHIELDS_CACHE_MAX_SIZE
+                                  environment variables.
+  --incremental                   Only generate the badge if the input file(s),
+                                  the options or the genbadge version changed
+                                  since the previous run, and only rewrite the
+                                  badge file if its contents changed. A manifest
+                                  is stored next to the badge
+                                  ('<badge>.svg.genbadge.json') for this. Not
+                                  available when reading from <stdin> or writing
+                                  to <stdout>.
+  --watch                         Keep running after the badge is generated, and
+                                  generate it again each time the input file(s)
+                                  change. Press Ctrl+C to stop. Not available
+                                  when reading from <stdin> or writing to
+                                  <stdout>.
+  --timings                       Print the duration of each stage of the
+                                  command on <stderr> when it ends: input files
+                                  resolution, parsing, statistics, badge
+                                  rendering (or download from shields.io) and
+                                  writing.
+  --timings-json FILENAME         A JSON file where to write the duration of
+                                  each stage of the command, in seconds, when it
+                                  ends (see --timings). '-' is supported and
+                                  means <stdout>.
+  --profile FILE                  Run the command with the cProfile profiler,
+                                  and write the profiling statistics to this
+                                  file. They can be read with the `pstats`
+                                  module or a viewer such as snakeviz.
   -v, --verbose                   Use this flag to print details to stdout
                                   during the badge generation process. Note that
                                   this flag has no effect when '-' is used as
@@ -186,14 +295,17 @@ FLAKE8_CMD = CmdReference(
         example_output_msg_long="""
 Flake8 statistics parsed successfully from %r
  - Total (20) = Critical (6) + Warning (9) + Info (5)
+ - Read 11 lines in <time>
 
+Text width cache: <stats>
 SUCCESS - Flake8 badge created: %r
 """,
         help_msg="""Usage: genbadge flake8 [OPTIONS]
 
   This command generates a badge for the flake8 results, from a flake8stats.txt
   file. Such a file can be generated from python `flake8` using the --statistics
-  flag.
+  flag. The raw flake8 output (one line per violation, in the default format) is
+  also accepted, and tallied in constant memory.
 
   By default the input file is the relative `./reports/flake8/flake8stats.txt`
   and the output file is `./flake8-badge.svg`. You can change these settings
@@ -228,6 +340,40 @@ Options:
   -w, --webshields / -l, --local  Indicates if badges should be generated using
                                   the shields.io HTTP API (default) or the local
                                   SVG file template included.
+  --shields-cache DIRECTORY       An optional directory where to cache the
+                                  badges downloaded from shields.io, so that
+                                  identical badges are not downloaded again. The
+                                  cache time-to-live (in seconds, default one
+                                  day) and maximum size (in bytes, default 10MB)
+                                  can be set with the GENBADGE_SHIELDS_CACHE_TTL
+                                  and GENBADGE_SHIELDS_CACHE_MAX_SIZE
+                                  environment variables.
+  --incremental                   Only generate the badge if the input file(s),
+                                  the options or the genbadge version changed
+                                  since the previous run, and only rewrite the
+                                  badge file if its contents changed. A manifest
+                                  is stored next to the badge
+                                  ('<badge>.svg.genbadge.json') for this. Not
+                                  available when reading from <stdin> or writing
+                                  to <stdout>.
+  --watch                         Keep running after the badge is generated, and
+                                  generate it again each time the input file(s)
+                                  change. Press Ctrl+C to stop. Not available
+                                  when reading from <stdin> or writing to
+                                  <stdout>.
+  --timings                       Print the duration of each stage of the
+                                  command on <stderr> when it ends: input files
+                                  resolution, parsing, statistics, badge
+                                  rendering (or download from shields.io) and
+                                  writing.
+  --timings-json FILENAME         A JSON file where to write the duration of
+                                  each stage of the command, in seconds, when it
+                                  ends (see --timings). '-' is supported and
+                                  means <stdout>.
+  --profile FILE                  Run the command with the cProfile profiler,
+                                  and write the profiling statistics to this
+                                  file. They can be read with the `pstats`
+                                  module or a viewer such as snakeviz.
   -v, --verbose                   Use this flag to print details to stdout
                                   during the badge generation process. Note that
                                   this flag has no effect when '-' is used as
@@ -264,10 +410,12 @@ Options:
   --help  Show this message and exit.
 
 Commands:
+  all       Generate the tests, coverage and flake8 badges at once.
   coverage  Generate a badge for the coverage results (e.g. from a
             coverage.xml).%s
   flake8    Generate a badge for the flake8 results (e.g. from a flake8stats.txt
             file).%s
+  serve     Serve the badges over HTTP, generated on demand from the reports.
   tests     Generate a badge for the test results (e.g. from a junit.xml).
 """
     if LooseVersion(click.__version__) < "8.":
@@ -381,7 +529,8 @@ def test_any_command(monkeypatch, cmd, tmpdir, variant, outstream, silent, verbo
         if silent:
             assert result.output == ""
         elif verbose:
-            assert "\n" + result.output == cmd.example_output_msg_long % (infile_path_for_msg, outfile_path_for_msg)
+            assert "\n" + _mask_cache_stats(result.output) \
+                   == cmd.example_output_msg_long % (infile_path_for_msg, outfile_path_for_msg)
         else:
             assert result.output == cmd.example_output_msg % outfile_path_for_msg
         assert outfile.exists()
@@ -423,7 +572,8 @@ Error: Success percentage 40.0% is strictly lower than required threshold {}%
         assert result.exit_code == 0
 
         # verify the output message
-        assert "\n" + result.output == TEST_CMD.example_output_msg_long % (str(TEST_CMD.example_input_file), str(badge_path.as_posix()))
+        assert "\n" + _mask_cache_stats(result.output) \
+            == TEST_CMD.example_output_msg_long % (str(TEST_CMD.example_input_file), str(badge_path.as_posix()))
 
         assert badge_path.exists()
 
@@ -452,11 +602,342 @@ def test_local_remote(use_shields, shortarg, tmpdir):
     assert result.exit_code == 0
 
     # verify the output message
-    assert "\n" + result.output == TEST_CMD.example_output_msg_long % (str(TEST_CMD.example_input_file), str(badge_path.as_posix()))
+    assert "\n" + _mask_cache_stats(result.output) \
+        == TEST_CMD.example_output_msg_long % (str(TEST_CMD.example_input_file), str(badge_path.as_posix()))
 
     assert badge_path.exists()
 
 
+def test_text_width_cache_stats(tmpdir):
+    """Test that the text width cache statistics are displayed in verbose mode"""
+    args = ["tests", "-l", "-v", "-i", str(TEST_CMD.example_input_file), "-o", str(Path(str(tmpdir)) / "badge.svg")]
+    _invoke_genbadge(args)
+
+    # the second time, the texts widths are read from the cache
+    result = _invoke_genbadge(args)
+    assert result.exit_code == 0
+    hits, misses, currsize, maxsize = map(int, re.search(TEXT_WIDTH_CACHE_PATTERN, result.output).groups())
+    assert hits >= 2
+    assert currsize <= maxsize
+
+
+def test_tests_multiple_files(monkeypatch, tmpdir):
+    """Test that `genbadge tests` accepts several input files and glob patterns, and combines them in a single badge"""
+    currentfolder = Path(str(tmpdir))
+    monkeypatch.chdir(str(currentfolder))
+    (currentfolder / "shards").mkdir()
+    for i in range(3):
+        copy(str(TEST_CMD.example_input_file), str(currentfolder / "shards" / ("junit-%s.xml" % i)))
+
+    result = _invoke_genbadge(["tests", "-l", "-v", "-i", "shards/*.xml", "-i", TEST_CMD.example_input_file])
+    assert result.exit_code == 0
+    assert " - Nb tests: Total (24) = Success (8) + Skipped (4) + Failed (8) + Errors (4)" in result.output
+
+    # a pattern matching no file
+    result = _invoke_genbadge(["tests", "-l", "-i", "shards/*.txt", "-i", TEST_CMD.example_input_file])
+    assert result.exit_code == 1
+    assert "Could not open file" in result.output and "shards/*.txt" in result.output
+
+
+def test_coverage_multiple_files(tmpdir):
+    """Test that `genbadge coverage` merges several input files into a single badge"""
+    result = _invoke_genbadge(["coverage", "-l", "-v", "-i", COV_CMD.example_input_file, "-i",
+                               COV_CMD.example_input_file, "-o", str(Path(str(tmpdir)) / "badge.svg")])
+    assert result.exit_code == 0
+    # the same lines are not counted twice
+    assert " - Total coverage: 15.38% ((1+13)/(18+73))" in result.output
+
+
+@pytest.mark.parametrize("input_format", [None, "lcov", "jacoco"])
+def test_coverage_formats(tmpdir, input_format):
+    """Test that `genbadge coverage` reads the LCOV and JaCoCo files, with an explicit or detected format"""
+    cov_folder = Path(COV_CMD.example_input_file).parent
+    args = ["coverage", "-l", "-v", "-o", str(Path(str(tmpdir)) / "badge.svg")]
+    if input_format is None:
+        args += ["-i", str(cov_folder / "lcov.info"), "-i", str(cov_folder / "jacoco.xml")]
+        result = _invoke_genbadge(args)
+        assert result.exit_code == 2
+        assert "can only be merged with the 'xml' and 'coveragepy' formats, not 'lcov'" in result.output
+
+        args[-4:] = ["-i", str(cov_folder / "jacoco.xml")]
+        expected = " - Line coverage: 65.00% (13/20)"
+    elif input_format == "lcov":
+        args += ["--format", "lcov", "-i", str(cov_folder / "lcov.info")]
+        expected = " - Line coverage: 66.67% (6/9)"
+    else:
+        args += ["--format", "jacoco", "-i", str(cov_folder / "jacoco.xml")]
+        expected = " - Branch coverage: 62.50% (5/8)"
+
+    result = _invoke_genbadge(args)
+    assert result.exit_code == 0
+    assert expected in result.output
+
+
+def test_coverage_coveragepy_format(monkeypatch, tmpdir):
+    """Test that `genbadge coverage --format coveragepy` reads the coverage.py data file directly"""
+    monkeypatch.chdir(str(tmpdir))
+
+    # stdin is not supported
+    result = _invoke_genbadge(["coverage", "--format", "coveragepy", "-i", "-"])
+    assert result.exit_code == 2
+    assert "<stdin> is not supported with --format coveragepy" in result.output
+
+    # the default input file is .coverage
+    result = _invoke_genbadge(["coverage", "--format", "coveragepy"])
+    assert result.exit_code == 1
+    assert "Error: Could not open file '.coverage': File not found" in result.output
+
+    # a data file with 2 of the 3 statements of a module executed
+    coverage = pytest.importorskip("coverage")
+    Path("mod.py").write_text(u"a = 1\nif a > 1:\n    a = 2\n")
+    data = coverage.CoverageData(".coverage")
+    data.add_lines({str(Path("mod.py").absolute()): [1, 2]})
+    data.write()
+
+    result = _invoke_genbadge(["coverage", "--format", "coveragepy", "-l", "-v"])
+    assert result.exit_code == 0
+    assert " - Line coverage: 66.67% (2/3)" in result.output
+    assert Path("coverage-badge.svg").exists()
+
+
+def test_all_command(monkeypatch, tmpdir):
+    """Test that `genbadge all` generates all badges, and reports errors without aborting the others"""
+    currentfolder = Path(str(tmpdir))
+    monkeypatch.chdir(str(currentfolder))
+
+    # a) no input file
+    result = _invoke_genbadge(["all", "-l"])
+    assert result.exit_code == 1
+    assert result.output.startswith("Error: No input file found.")
+
+    # b) any subset of the default input files
+    for cmd in (TEST_CMD, FLAKE8_CMD):
+        infile = currentfolder / cmd.default_infile
+        infile.parent.mkdir(parents=True, exist_ok=True)
+        copy(str(cmd.example_input_file), str(infile))
+
+    result = _invoke_genbadge(["all", "-l"])
+    assert result.exit_code == 0
+    assert result.output == "".join(cmd.example_output_msg % (currentfolder / cmd.default_outfile).as_posix()
+                                    for cmd in (TEST_CMD, FLAKE8_CMD))
+    for cmd in (TEST_CMD, FLAKE8_CMD):
+        assert (currentfolder / cmd.default_outfile).read_text() \
+               == _invoke_genbadge([cmd.name, "-l", "-o", "-"]).output
+
+    # c) a badge can not be generated: the others are still generated
+    result = _invoke_genbadge(["all", "-l", "-o", "out", "--coverage-input", "unknown.xml"])
+    assert result.exit_code == 1
+    assert "ERROR - Coverage badge could not be generated from %r: File not found" \
+           % (currentfolder / "unknown.xml").as_posix() in result.output
+    assert result.output.endswith("Error: 1 badge(s) could not be generated\n")
+    assert (currentfolder / "out" / TEST_CMD.default_outfile).exists()
+    assert (currentfolder / "out" / FLAKE8_CMD.default_outfile).exists()
+    assert not (currentfolder / "out" / COV_CMD.default_outfile).exists()
+
+    # d) incremental generation: the badges are left as is, and then not generated at all
+    result = _invoke_genbadge(["all", "-l", "--incremental"])
+    assert result.exit_code == 0
+    assert result.output == "".join("SUCCESS - %s badge unchanged: %r\n"
+                                    % (cmd.name.capitalize(), (currentfolder / cmd.default_outfile).as_posix())
+                                    for cmd in (TEST_CMD, FLAKE8_CMD))
+    result = _invoke_genbadge(["all", "-l", "--incremental"])
+    assert result.exit_code == 0
+    assert result.output == "".join("SUCCESS - %s badge is up to date: %r\n"
+                                    % (cmd.name.capitalize(), (currentfolder / cmd.default_outfile).as_posix())
+                                    for cmd in (TEST_CMD, FLAKE8_CMD))
+
+
+@pytest.mark.parametrize("cmd", [TEST_CMD, COV_CMD, FLAKE8_CMD], ids=str)
+def test_incremental(tmpdir, cmd):
+    """Test that with `--incremental` the badge is only generated when the input file or the options change"""
+    currentfolder = Path(str(tmpdir))
+    infile = currentfolder / Path(cmd.example_input_file).name
+    copy(str(cmd.example_input_file), str(infile))
+    outfile = currentfolder / "badge.svg"
+    args = [cmd.name, "-l", "--incremental", "-i", str(infile), "-o", str(outfile)]
+
+    # a) the badge and its manifest are created
+    result = _invoke_genbadge(args)
+    assert result.exit_code == 0
+    assert result.output == cmd.example_output_msg % outfile.as_posix()
+    assert (currentfolder / "badge.svg.genbadge.json").exists()
+
+    # b) nothing changed, even if the input file was touched: the input file is not parsed again
+    st = infile.stat()
+    os.utime(str(infile), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    result = _invoke_genbadge(args)
+    assert result.exit_code == 0
+    assert result.output == "SUCCESS - %s badge is up to date: %r\n" % (cmd.name.capitalize(), outfile.as_posix())
+
+    # c) the input file changed but not the badge: the badge file is not rewritten
+    badge_mtime = outfile.stat().st_mtime_ns
+    with infile.open("at") as f:
+        f.write(u"\n")
+    result = _invoke_genbadge(args)
+    assert result.exit_code == 0
+    assert result.output == "SUCCESS - %s badge unchanged: %r\n" % (cmd.name.capitalize(), outfile.as_posix())
+    assert outfile.stat().st_mtime_ns == badge_mtime
+
+    # d) the options changed
+    result = _invoke_genbadge(args + ["-n", "other"])
+    assert result.exit_code == 0
+    assert result.output == cmd.example_output_msg % outfile.as_posix()
+    assert ">other<" in outfile.read_text()
+
+
+@pytest.mark.parametrize("cmd", [TEST_CMD, COV_CMD, FLAKE8_CMD], ids=str)
+def test_timings(tmpdir, cmd):
+    """Test the --timings, --timings-json and --profile options"""
+    import json
+    import pstats
+
+    currentfolder = Path(str(tmpdir))
+    timings_json = currentfolder / "timings.json"
+    profile = currentfolder / "genbadge.prof"
+    result = _invoke_genbadge([cmd.name, "-l", "-s", "-i", str(cmd.example_input_file),
+                               "-o", str(currentfolder / "badge.svg"), "--timings", "--timings-json",
+                               str(timings_json), "--profile", str(profile)])
+    assert result.exit_code == 0
+
+    # the stages are printed on stderr, and saved as json
+    stages = ["imports", "infiles", "parse", "stats", "render", "write"]
+    assert result.output.startswith("Timings of 'genbadge %s':\n" % cmd.name)
+    assert re.findall(r" - (\w+): +[\d.]+ ms", result.output) == stages + ["total"]
+    timings = json.loads(timings_json.read_text())
+    assert timings["command"] == cmd.name
+    assert list(timings["stages"]) == stages
+    assert sum(timings["stages"].values()) <= timings["total"]
+
+    # the command was profiled
+    functions = {f[2] for f in pstats.Stats(str(profile)).stats}
+    assert "get_%s_stats" % ("test" if cmd.name == "tests" else cmd.name) in functions
+
+
+def test_timings_stdout():
+    """Test that the timings do not corrupt the badge when both are written to <stdout>"""
+    result = _invoke_genbadge(["tests", "-l", "-i", str(TEST_CMD.example_input_file), "-o", "-",
+                               "--timings-json", "-"])
+    assert result.exit_code == 0
+    assert result.stdout.startswith("<svg") and result.stdout.rstrip().endswith("</svg>")
+
+
+def test_timings_all(tmpdir):
+    """Test the --timings-json option of the all command, with the stages of each job"""
+    import json
+
+    currentfolder = Path(str(tmpdir))
+    result = _invoke_genbadge(["all", "-l", "-s", "--tests-input", str(TEST_CMD.example_input_file),
+                               "--flake8-input", str(FLAKE8_CMD.example_input_file), "-o", str(currentfolder),
+                               "--timings-json", "-"])
+    assert result.exit_code == 0
+    timings = json.loads(result.output)
+    assert timings["command"] == "all"
+    assert list(timings["stages"]) == ["imports", "infiles", "parse", "parse (tests)", "stats (tests)",
+                                       "parse (flake8)", "stats (flake8)", "render", "write"]
+
+
+def test_watch(monkeypatch, tmpdir):
+    """Test that with `--watch` the badges are generated again when their input file changes"""
+    import genbadge.utils_watch
+
+    currentfolder = Path(str(tmpdir))
+    monkeypatch.chdir(str(currentfolder))
+    for cmd in (TEST_CMD, FLAKE8_CMD):
+        infile = currentfolder / cmd.default_infile
+        infile.parent.mkdir(parents=True, exist_ok=True)
+        copy(str(cmd.example_input_file), str(infile))
+
+    # the files are not really watched: `changes` is a list of (new contents, changed input file)
+    changes = []
+    watched = []
+
+    def _watch_files(patterns, callback):
+        watched[:] = patterns
+        for contents, changed in changes:
+            (currentfolder / changed).write_text(contents)
+            callback([(currentfolder / changed).as_posix()])
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(genbadge.utils_watch, "watch_files", _watch_files)
+
+    # stdin and stdout are not supported
+    result = _invoke_genbadge(["tests", "--watch", "-i", "-"])
+    assert result.exit_code == 2
+    assert "<stdin> is not supported with --watch" in result.output
+    result = _invoke_genbadge(["tests", "--watch", "-o", "-"])
+    assert result.exit_code == 2
+    assert "<stdout> is not supported with --watch" in result.output
+
+    # a single badge, generated again when its input file changes
+    changes[:] = [(Path(TEST_CMD.example_input_file).read_text(), TEST_CMD.default_infile)]
+    result = _invoke_genbadge(["tests", "-l", "--watch", "-i", TEST_CMD.default_infile])
+    assert result.exit_code == 0
+    created_msg = TEST_CMD.example_output_msg % (currentfolder / TEST_CMD.default_outfile).as_posix()
+    assert result.output == created_msg + "Watching %r for changes. Press Ctrl+C to stop.\n" \
+        % (currentfolder / TEST_CMD.default_infile).as_posix() + created_msg
+    assert watched == [(currentfolder / TEST_CMD.default_infile).as_posix()]
+
+    # with `all` only the badge whose input file changed is generated again, and errors do not stop the watch
+    changes[:] = [(Path(FLAKE8_CMD.example_input_file).read_text(), FLAKE8_CMD.default_infile),
+                  (u"<testsuite", TEST_CMD.default_infile)]
+    result = _invoke_genbadge(["all", "-l", "--watch"])
+    assert result.exit_code == 0
+    assert watched == sorted((currentfolder / cmd.default_infile).as_posix() for cmd in (TEST_CMD, FLAKE8_CMD))
+    lines = result.output.splitlines()
+    assert len(lines) == 5
+    assert lines[3] == "SUCCESS - Flake8 badge created: %r" % (currentfolder / FLAKE8_CMD.default_outfile).as_posix()
+    assert lines[4].startswith("ERROR - ParseError")
+
+
+# The dependencies of the commands, that should only be imported when a command needs them
+HEAVY_MODULES = ('PIL', 'requests', 'defusedxml', 'flake8', 'flake8_html', 'unittest')
+
+
+def test_cli_startup_imports():
+    """Test that importing the cli does not import the dependencies of the commands"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    code = "import sys, genbadge.main; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    proc = subprocess.run([sys.executable, "-c", code], env=env, check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True)
+    assert proc.stdout.strip() == ""
+
+
+# Maximum cold-start import time of `genbadge.main`, relative to the import time of `click` so that it does not depend
+# on the speed of the machine
+IMPORT_TIME_BUDGET_RATIO = 3
+
+
+def test_cli_startup_time():
+    """Test that importing the cli stays within a time budget, measured with `python -X importtime`"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    # click is imported first, so that it is not counted in the import time of genbadge.main
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import click, genbadge.main"], env=env,
+                          check=True, stderr=subprocess.PIPE, universal_newlines=True)
+
+    cumulative_us = dict()
+    excluded_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative_us[name.strip()] = int(cumulative)
+        if name.strip() == "setuptools_scm":
+            # version resolution when running from the sources - not the case when installed
+            excluded_us += int(cumulative)
+
+    assert cumulative_us["genbadge.main"] - excluded_us < IMPORT_TIME_BUDGET_RATIO * cumulative_us["click"]
+
+
+TEXT_WIDTH_CACHE_PATTERN = r"Text width cache: (\d+) hits, (\d+) misses \((\d+)/(\d+) entries\)"
+TIMING_PATTERN = r"in \d+\.\d+s"
+
+
+def _mask_cache_stats(output):
+    """The text width cache statistics depend on the previous tests, and timings vary, so we mask them"""
+    output = re.sub(TIMING_PATTERN, "in <time>", output)
+    return re.sub(TEXT_WIDTH_CACHE_PATTERN, "Text width cache: <stats>", output)
+
+
 def _invoke_genbadge(args):
     runner = CliRunner()
     print("\n> genbadge %s" % (" ".join(args),))
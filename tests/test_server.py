@@ -0,0 +1,159 @@
+import asyncio
+import http.client
+import re
+import shutil
+import threading
+
+import pytest
+
+try:
+    from pathlib import Path
+except ImportError:  # pragma: no cover
+    from pathlib2 import Path  # python 2
+
+from genbadge import utils_server
+from genbadge.utils_server import BadgeServer, LRUCache
+
+
+TESTS_FOLDER = Path(__file__).parent.absolute()
+
+
+@pytest.fixture
+def server(tmpdir):
+    """A badge server serving tmpdir, with a junit report at the root and a coverage report in a `repo` subfolder"""
+    root = Path(str(tmpdir))
+    (root / "reports" / "junit").mkdir(parents=True)
+    shutil.copy(str(TESTS_FOLDER / "reports" / "junit" / "junit.xml"), str(root / "reports" / "junit" / "junit.xml"))
+    (root / "repo" / "reports" / "coverage").mkdir(parents=True)
+    shutil.copy(str(TESTS_FOLDER / "reports" / "coverage" / "coverage.xml"),
+                str(root / "repo" / "reports" / "coverage" / "coverage.xml"))
+
+    badge_server = BadgeServer(str(root), cache_size=10)
+    loop = asyncio.new_event_loop()
+    asyncio_server = loop.run_until_complete(badge_server.start("127.0.0.1", 0))
+    badge_server.address = asyncio_server.sockets[0].getsockname()[:2]
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    yield badge_server
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    asyncio_server.close()
+    loop.run_until_complete(asyncio_server.wait_closed())
+    loop.close()
+
+
+def _request(server, path, method="GET", conn=None, **headers):
+    """Sends a request to the server and returns the (response, body)"""
+    new_conn = conn is None
+    if new_conn:
+        conn = http.client.HTTPConnection(*server.address)
+    conn.request(method, path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    if new_conn:
+        conn.close()
+    return response, body
+
+
+def _get_width(svg):
+    """Returns the width of a SVG badge"""
+    return int(re.search(rb'<svg [^>]*width="(\d+)"', svg).group(1))
+
+
+def test_static_badge(server):
+    """Test the static badges, and the conditional requests"""
+    response, body = _request(server, "/badge/hello%20world/a%2Fb/green.svg")
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "image/svg+xml; charset=utf-8"
+    assert response.getheader("Cache-Control") == utils_server.STATIC_CACHE_CONTROL
+    assert b"hello world: a/b" in body
+    etag = response.getheader("ETag")
+
+    # a conditional request, on the same keep-alive connection
+    conn = http.client.HTTPConnection(*server.address)
+    response, body = _request(server, "/badge/hello%20world/a%2Fb/green.svg", conn=conn, **{"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+    assert response.getheader("ETag") == etag
+    response, body = _request(server, "/badge/hello%20world/a%2Fb/green.svg", conn=conn, **{"If-None-Match": '"a"'})
+    assert response.status == 200
+    conn.close()
+
+    # HEAD requests, hexadecimal colors and escaped texts
+    response, body = _request(server, "/badge/a/%3Cb%3E/4c1", method="HEAD")
+    assert response.status == 200 and body == b""
+    _, body = _request(server, "/badge/a/%3Cb%3E/4c1")
+    assert int(response.getheader("Content-Length")) == len(body)
+    assert b"#4c1" in body and b"&lt;b&gt;" in body and b"<b>" not in body
+
+    # errors
+    assert _request(server, "/badge/a/b/javascript:")[0].status == 400
+    assert _request(server, "/badge/a/b")[0].status == 404
+    assert _request(server, "/unknown")[0].status == 404
+    assert _request(server, "/badge/a/b/green", method="POST")[0].status == 405
+    assert _request(server, "foo")[0].status == 400
+
+    # the texts are measured unescaped
+    _, body = _request(server, "/badge/a%26b/c/green")
+    assert b">a&amp;b<" in body
+    assert _get_width(body) == _get_width(_request(server, "/badge/a+b/c/green")[1])
+
+
+def test_report_badges(server, monkeypatch):
+    """Test the badges of the reports, that are only parsed again when they change"""
+    nb_parsed = []
+    render_report_badge = utils_server.render_report_badge
+
+    def _render_report_badge(*args):
+        nb_parsed.append(args)
+        return render_report_badge(*args)
+
+    monkeypatch.setattr(utils_server, "render_report_badge", _render_report_badge)
+
+    response, body = _request(server, "/tests")
+    assert response.status == 200
+    assert response.getheader("Cache-Control") == "no-cache"
+    assert b">tests<" in body
+    etag = response.getheader("ETag")
+    response, body = _request(server, "/tests", **{"If-None-Match": etag})
+    assert response.status == 304
+    assert len(nb_parsed) == 1
+
+    # name and subfolder
+    response, body = _request(server, "/coverage/repo?name=cov")
+    assert response.status == 200
+    assert b">cov<" in body
+    assert len(nb_parsed) == 2
+
+    # a modified report is parsed again
+    junit_xml = Path(server.root) / "reports" / "junit" / "junit.xml"
+    junit_xml.write_text(u'<testsuite tests="1"><testcase classname="a" name="b"/></testsuite>')
+    response, body = _request(server, "/tests", **{"If-None-Match": etag})
+    assert response.status == 200
+    assert response.getheader("ETag") != etag
+    assert len(nb_parsed) == 3
+
+    # missing or invalid reports, and folders outside of the root
+    assert _request(server, "/coverage")[0].status == 404
+    assert _request(server, "/flake8/repo")[0].status == 404
+    assert _request(server, "/tests/..%2F..")[0].status == 404
+    assert _request(server, "/tests/../..")[0].status == 404
+    junit_xml.write_text(u"<testsuite")
+    response, body = _request(server, "/tests")
+    assert response.status == 500
+    assert b"Error" in body and b"ParseError" not in body
+
+
+def test_lru_cache():
+    """Test that the least recently used entries are removed first"""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:  # pragma: no cover
+    pytest.skip("ThreadingHTTPServer is not available", allow_module_level=True)
+
+from genbadge import Badge, utils_shields
+from genbadge.utils_badge import render_badges
+from genbadge.utils_shields import ShieldsError
+
+
+class StubShieldsHandler(BaseHTTPRequestHandler):
+    """A local stand-in for shields.io. The color in the url is used to trigger special behaviours."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.nb_requests += 1
+            nb_requests = server.nb_requests
+
+        if self.path.endswith("-slow.svg"):
+            time.sleep(server.latency * 10)
+        elif self.path.endswith("-flaky.svg") and nb_requests == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        time.sleep(server.latency)
+        body = ("<svg>%s</svg>" % self.path).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/svg+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def shields_server(monkeypatch):
+    """Starts a local shields.io stand-in server, and configures genbadge to use it"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubShieldsHandler)
+    server.lock = threading.Lock()
+    server.nb_requests = 0
+    server.latency = 0.1
+    # do not print the broken pipe errors when the client times out
+    server.handle_error = lambda request, client_address: None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(utils_shields, "SHIELDS_URL_TEMPLATE",
+                        "http://127.0.0.1:%s/badge/%%s-%%s-%%s.svg" % server.server_address[1])
+    utils_shields.set_shields_session_options(read_timeout=0.5, retries=1, backoff_factor=0)
+    try:
+        yield server
+    finally:
+        utils_shields.set_shields_session_options()
+        server.shutdown()
+        server.server_close()
+
+
+def test_shields_session(shields_server):
+    """Test that badges are downloaded with the pooled session"""
+    svg = Badge("tests", "6/12", "red").as_svg(use_shields=True)
+    assert svg == "<svg>/badge/tests-6%2F12-red.svg</svg>"
+
+    # the session is reused
+    session = utils_shields.get_shields_session()
+    Badge("tests", "12/12", "green").as_svg(use_shields=True)
+    assert utils_shields.get_shields_session() is session
+
+
+def test_shields_session_concurrent(monkeypatch):
+    """Test that a single session is created when it is first used by concurrent workers"""
+    created = []
+
+    class SlowSession(object):
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            created.append(self)
+
+        def close(self):
+            pass
+
+    utils_shields.set_shields_session_options()
+    monkeypatch.setattr(utils_shields, "ShieldsSession", SlowSession)
+    try:
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(utils_shields.get_shields_session()))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(created) == 1
+        assert all(session is created[0] for session in sessions)
+    finally:
+        utils_shields.set_shields_session_options()
+
+
+def test_shields_retry(shields_server):
+    """Test that failed requests are retried"""
+    svg = Badge("tests", "6/12", "flaky").as_svg(use_shields=True, fallback_to_local=False)
+    assert svg == "<svg>/badge/tests-6%2F12-flaky.svg</svg>"
+    assert shields_server.nb_requests == 2
+
+
+def test_shields_timeout_fallback(shields_server):
+    """Test that the local template is used when the request times out"""
+    b = Badge("tests", "6/12", "slow")
+    with pytest.raises(ShieldsError):
+        b.as_svg(use_shields=True, fallback_to_local=False)
+
+    with pytest.warns(UserWarning, match="Using the local SVG template instead"):
+        svg = b.as_svg(use_shields=True)
+    assert svg == b.as_svg(use_shields=False)
+
+
+def test_concurrent_download(shields_server):
+    """Test that several badges are downloaded concurrently, and returned in order"""
+    specs = [("tests", "%s/12" % i, "green") for i in range(8)]
+
+    start = time.perf_counter()
+    sequential = [utils_shields.get_shields_svg(*spec) for spec in specs]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = utils_shields.get_shields_svgs(specs, max_workers=8)
+    concurrent_time = time.perf_counter() - start
+
+    assert concurrent == sequential
+    # 8 requests with 0.1s latency each
+    assert sequential_time >= 0.8
+    assert concurrent_time < sequential_time / 2
+
+
+def test_render_badges_shields(shields_server):
+    """Test that render_badges downloads badges concurrently and falls back to the local template"""
+    badges = [Badge("tests", "6/12", "red"), Badge("tests", "6/12", "slow"), Badge("tests", "6/12", "red")]
+
+    with pytest.warns(UserWarning, match="Using the local SVG template instead"):
+        svgs = list(render_badges(badges, use_shields=True))
+
+    assert svgs[0] == "<svg>/badge/tests-6%2F12-red.svg</svg>"
+    assert svgs[1] == badges[1].as_svg(use_shields=False)
+    assert svgs[2] is svgs[0]
+    # identical badges are downloaded only once
+    assert shields_server.nb_requests == 1 + 2